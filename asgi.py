@@ -0,0 +1,213 @@
+# asgi.py
+#
+# Alternative ASGI entry point. Serves the same Flask app (every blueprint,
+# unchanged) from an asyncio server:
+#
+#     uvicorn asgi:application --host 0.0.0.0 --port 5000
+#     gunicorn -k uvicorn.workers.UvicornWorker --bind 0.0.0.0:5000 asgi:application
+#
+# The event loop does the network I/O. It reads each request body in full
+# before a thread is involved, and it writes responses out to the client
+# after the thread is done. The Flask view runs on one of ASGI_THREADS
+# threads. A slow client therefore ties up a socket, not a thread, a
+# process, or a database connection. Responses larger than
+# ASGI_RESPONSE_BUFFER (streamed exports) are handed to the loop chunk by
+# chunk instead, so their thread stays busy until the client has read them.
+#
+# GET /api/projects and /api/users don't use a thread at all: they are
+# answered on the loop through the async engine (utils/async_views.py,
+# utils/async_db.py), which lifespan startup creates. Without lifespan
+# events, or with ASGI_ASYNC_VIEWS off, Flask answers them like the rest.
+
+import asyncio
+import logging
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import SpooledTemporaryFile
+from flask import Response
+from werkzeug.datastructures import Headers
+from werkzeug.sansio.request import Request
+from main import app as flask_app
+from metrics.metrics_http import record_request, track_queries
+from utils import async_views
+from utils.async_db import async_db
+from utils.compression import CompressionMiddleware
+import projects.projects_async  # noqa: F401  (registers the async views)
+import users.users_async  # noqa: F401
+
+log = logging.getLogger(__name__)
+
+
+class _ResponseStreamed(Exception):
+    """The worker thread has already sent the whole response itself."""
+
+
+class WsgiBridge:
+    def __init__(self, wsgi_app, config):
+        self.wsgi_app = wsgi_app  # the Flask app; the async views use it for its config and JSON settings
+        self.config = config
+        self.executor = None
+        self.compression = CompressionMiddleware(None, config) if config['COMPRESSION_ENABLED'] else None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            view = async_views.find(scope['method'], scope['path'])
+            if view is not None and async_db.running:  # started by lifespan unless ASGI_ASYNC_VIEWS is off
+                await self._async_view(view, scope, send)
+            else:
+                await self._http(scope, receive, send)
+        # websockets are not supported
+
+    # --- Lifespan ---
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    self.executor = ThreadPoolExecutor(self.config['ASGI_THREADS'], thread_name_prefix='asgi-wsgi')
+                    if self.config['ASGI_ASYNC_VIEWS']:
+                        async_db.start(self.config)
+                except Exception as e:
+                    log.exception("ASGI startup failed.")
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await async_db.stop()
+                self.executor.shutdown(wait=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    # --- Async views (on the loop) ---
+
+    async def _async_view(self, view, scope, send):
+        started = time.perf_counter()
+        request = _request(scope)
+        with track_queries() as queries:
+            try:
+                response = await async_views.dispatch(self.wsgi_app, view, request)
+            except Exception:
+                log.exception("Async view %s failed.", view.endpoint)
+                response = Response('Internal Server Error', 500, mimetype='text/plain')
+        if self.compression is not None:
+            response = self.compression.compress_response(response, request.headers.get('Accept-Encoding', ''))
+        record_request(view.endpoint, request.method, response, started, queries)
+        headers = [(name.lower().encode('latin1'), value.encode('latin1'))
+                   for name, value in response.headers.to_wsgi_list()]
+        await _send_response(send, response.status_code, headers, [response.get_data()])
+
+    # --- Flask (WSGI) requests ---
+
+    async def _http(self, scope, receive, send):
+        loop = asyncio.get_running_loop()
+        with SpooledTemporaryFile(max_size=1024 * 1024) as body:
+            while True:
+                message = await receive()
+                if message['type'] == 'http.disconnect':
+                    return
+                body.write(message.get('body', b''))
+                if not message.get('more_body'):
+                    break
+            size = body.tell()
+            body.seek(0)
+            try:
+                status, headers, chunks = await loop.run_in_executor(
+                    self.executor, self._run_wsgi, _environ(scope, body, size), loop, send)
+            except _ResponseStreamed:
+                return
+        await _send_response(send, status, headers, chunks)
+
+    def _run_wsgi(self, environ, loop, send):
+        """Runs in a worker thread. Returns the buffered response, or streams it and raises _ResponseStreamed."""
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = [(name.lower().encode('latin1'), value.encode('latin1'))
+                                   for name, value in headers]
+
+        def send_from_thread(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        result = self.wsgi_app(environ, start_response)
+        try:
+            chunks, size, streaming = [], 0, False
+            for chunk in result:
+                if not chunk:
+                    continue
+                if streaming:
+                    send_from_thread({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                    continue
+                chunks.append(chunk)
+                size += len(chunk)
+                if size > self.config['ASGI_RESPONSE_BUFFER']:
+                    # Too big to hold: send what we have and stream the rest from this thread
+                    streaming = True
+                    send_from_thread({'type': 'http.response.start',
+                                      'status': response['status'], 'headers': response['headers']})
+                    send_from_thread({'type': 'http.response.body', 'body': b''.join(chunks), 'more_body': True})
+                    chunks = None
+            if streaming:
+                send_from_thread({'type': 'http.response.body', 'body': b''})
+                raise _ResponseStreamed()
+            return response['status'], response['headers'], chunks
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+
+
+async def _send_response(send, status, headers, chunks):
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': b''.join(chunks)})
+
+
+def _request(scope):
+    """A werkzeug request for an async view; GET only, so there is no body to read."""
+    headers = Headers([(name.decode('latin1'), value.decode('latin1')) for name, value in scope['headers']])
+    return Request(scope['method'], scope.get('scheme', 'http'), scope.get('server'), scope.get('root_path', ''),
+                   scope['path'], scope['query_string'], headers, (scope.get('client') or ('', 0))[0])
+
+
+def _environ(scope, body, size):
+    """Builds the WSGI environ for a request whose body has been read in full (size bytes)."""
+    server_name, server_port = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf8').decode('latin1'),
+        'PATH_INFO': scope['path'].encode('utf8').decode('latin1'),
+        'QUERY_STRING': scope['query_string'].decode('latin1'),
+        'SERVER_NAME': server_name,
+        'SERVER_PORT': str(server_port),
+        'SERVER_PROTOCOL': f"HTTP/{scope['http_version']}",
+        'REMOTE_ADDR': client[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        # Complete and seekable, so a chunked upload (no Content-Length) can be read to EOF
+        'wsgi.input_terminated': True,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin1').upper().replace('-', '_')
+        value = value.decode('latin1')
+        if name in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            environ[name] = value
+            continue
+        key = f'HTTP_{name}'
+        if key in environ:
+            value = environ[key] + ('; ' if key == 'HTTP_COOKIE' else ',') + value
+        environ[key] = value
+    if 'CONTENT_LENGTH' not in environ and size:
+        environ['CONTENT_LENGTH'] = str(size)
+    return environ
+
+
+application = WsgiBridge(flask_app, flask_app.config)
@@ -0,0 +1,133 @@
+# assets/assets_build.py
+#
+# Builds the static assets into static/dist/:
+#
+#     python -m assets.assets_build
+#
+# - css/app.css: Tailwind compiled from assets/tailwind.css. Purged to the
+#   classes found in templates/ and static/js/, and minified.
+# - js/projects.js: the page scripts in BUNDLES, concatenated in order.
+#
+# Each output gets a content hash in its file name (css/app.3f2a9c1b7d4e.css),
+# plus .gz and .br variants when they are smaller. The logical names are
+# mapped to the hashed files in static/dist/manifest.json, which
+# assets/assets_manifest.py reads at startup.
+#
+# The Tailwind CLI is the standalone binary or npm package
+# (https://tailwindcss.com/blog/standalone-cli). TAILWIND_BIN overrides the
+# command. The default is `tailwindcss` if it is on PATH, otherwise
+# `npx --yes tailwindcss@3.4.17` (Node comes from the nodejs-20 module in
+# .replit). Brotli variants need the optional `brotli` package and are
+# skipped without it.
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import shlex
+import shutil
+import subprocess
+import sys
+import tempfile
+
+try:
+    import brotli
+except ImportError:  # optional: only needed for the .br variants
+    brotli = None
+
+log = logging.getLogger(__name__)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STATIC_DIR = os.path.join(ROOT, 'static')
+DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+MANIFEST = 'manifest.json'
+TAILWIND_VERSION = '3.4.17'
+
+# Logical name -> source files under static/, concatenated in order
+BUNDLES = {
+    'js/projects.js': ['js/projects.js'],
+}
+
+
+def tailwind_command():
+    if os.environ.get('TAILWIND_BIN'):
+        return shlex.split(os.environ['TAILWIND_BIN'])
+    if shutil.which('tailwindcss'):
+        return ['tailwindcss']
+    return ['npx', '--yes', f'tailwindcss@{TAILWIND_VERSION}']
+
+
+def build_css():
+    with tempfile.TemporaryDirectory() as workdir:
+        output = os.path.join(workdir, 'app.css')
+        subprocess.run(tailwind_command() + [
+            '--config', os.path.join(ROOT, 'tailwind.config.js'),
+            '--input', os.path.join(ROOT, 'assets', 'tailwind.css'),
+            '--output', output,
+            '--minify',
+        ], cwd=ROOT, check=True)
+        with open(output, 'rb') as f:
+            return f.read()
+
+
+def build_bundle(sources):
+    parts = []
+    for source in sources:
+        with open(os.path.join(STATIC_DIR, source), 'rb') as f:
+            parts.append(f.read().strip())
+    return b'\n;\n'.join(parts) + b'\n'
+
+
+def hashed_name(name, content):
+    stem, extension = os.path.splitext(name)
+    return f'{stem}.{hashlib.sha256(content).hexdigest()[:12]}{extension}'
+
+
+def write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(content)
+
+
+def write_variants(path, content):
+    """Writes the file plus any pre-compressed variant that is smaller than it."""
+    write(path, content)
+    variants = {'.gz': gzip.compress(content, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['.br'] = brotli.compress(content, quality=11)
+    for suffix, compressed in variants.items():
+        if len(compressed) < len(content):
+            write(path + suffix, compressed)
+
+
+def build(dist_dir=DIST_DIR):
+    """Builds every asset and writes the manifest last. Returns the manifest."""
+    outputs = {'css/app.css': build_css()}
+    for name, sources in BUNDLES.items():
+        outputs[name] = build_bundle(sources)
+
+    manifest = {}
+    for name, content in outputs.items():
+        manifest[name] = hashed_name(name, content)
+        write_variants(os.path.join(dist_dir, manifest[name]), content)
+        log.info("Built %s -> %s (%d bytes)", name, manifest[name], len(content))
+    if brotli is None:
+        log.warning("brotli is not installed; skipped the .br variants.")
+
+    # Written last and atomically, so a failed build keeps serving the previous assets
+    fd, temporary = tempfile.mkstemp(dir=dist_dir, suffix='.json')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.chmod(temporary, 0o644)
+    os.replace(temporary, os.path.join(dist_dir, MANIFEST))
+    return manifest
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    try:
+        build()
+    except (OSError, subprocess.CalledProcessError) as e:
+        log.error("Asset build failed: %s", e)
+        sys.exit(1)
@@ -0,0 +1,84 @@
+# assets/assets_manifest.py
+#
+# Serves the fingerprinted assets built by assets/assets_build.py.
+#
+# asset_url('css/app.css') takes the same file name as
+# url_for('static', filename=...). It returns /assets/css/app.<hash>.css when
+# the manifest lists the file, and the plain static URL otherwise. Hashed
+# files never change, so they are sent with a year-long immutable
+# Cache-Control, and a client that accepts br or gzip gets the
+# pre-compressed variant.
+#
+# Without a manifest (a checkout that was never built) assets_built is False
+# and the templates fall back to the Tailwind Play CDN (templates/assets.html).
+
+import json
+import logging
+import mimetypes
+import os
+from flask import Blueprint, abort, current_app, request, send_from_directory, url_for
+
+log = logging.getLogger(__name__)
+
+# Checked in this order against Accept-Encoding
+_ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+class Assets:
+    def __init__(self, app=None):
+        self.manifest = {}
+        self.directory = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('ASSETS_DIR', os.path.join(app.static_folder, 'dist'))
+        app.config.setdefault('ASSETS_MAX_AGE', 365 * 24 * 3600)
+        self.directory = app.config['ASSETS_DIR']
+        self.manifest = self._load_manifest(os.path.join(self.directory, 'manifest.json'))
+
+        blueprint = Blueprint('assets', __name__)
+        blueprint.add_url_rule('/assets/<path:filename>', 'serve', self.serve)
+        app.register_blueprint(blueprint)
+        app.add_template_global(self.asset_url)
+        app.context_processor(lambda: {'assets_built': bool(self.manifest)})
+        app.extensions['assets'] = self
+
+    @staticmethod
+    def _load_manifest(path):
+        try:
+            with open(path) as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            log.info("No asset manifest at %s; templates use the Tailwind CDN.", path)
+            return {}
+        log.info("Loaded %d built assets from %s.", len(manifest), path)
+        return manifest
+
+    def asset_url(self, filename):
+        hashed = self.manifest.get(filename)
+        if hashed is None:
+            return url_for('static', filename=filename)
+        return url_for('assets.serve', filename=hashed)
+
+    def serve(self, filename):
+        if filename.endswith(('.br', '.gz')):
+            abort(404)  # variants are only served through content negotiation
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        max_age = current_app.config['ASSETS_MAX_AGE']
+        for encoding, suffix in _ENCODINGS:
+            if encoding in request.accept_encodings and os.path.isfile(
+                    os.path.join(self.directory, filename + suffix)):
+                response = send_from_directory(self.directory, filename + suffix, mimetype=mimetype,
+                                               max_age=max_age)
+                response.content_encoding = encoding
+                del response.headers['Content-Disposition']  # would name the .gz/.br file
+                break
+        else:
+            response = send_from_directory(self.directory, filename, mimetype=mimetype, max_age=max_age)
+        response.vary.add('Accept-Encoding')
+        response.cache_control.immutable = True
+        return response
+
+
+assets = Assets()
@@ -0,0 +1,115 @@
+# benchmarks/cold_start.py
+#
+# Measures cold start: the time from a fresh interpreter importing the app to
+# the first 200 response. Each run uses a new process, like a new gunicorn
+# worker or a Cloud Run cold start.
+#
+#     python benchmarks/cold_start.py --runs 10
+#     python benchmarks/cold_start.py --gunicorn --runs 5 --json cold_start.json
+#
+# DATABASE_URL must point at a database that has been bootstrapped
+# (python bootstrap.py). Defaults to a throwaway SQLite file.
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in the child process. Prints import and first-response times in seconds.
+IN_PROCESS_PROBE = """
+import time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+response = main.app.test_client().get({path!r})
+assert response.status_code == 200, response.status_code
+done = time.perf_counter()
+print(imported - start, done - start)
+"""
+
+
+def run_in_process(path, env):
+    output = subprocess.run(
+        [sys.executable, '-c', IN_PROCESS_PROBE.format(path=path)],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    import_seconds, first_response_seconds = map(float, output.strip().splitlines()[-1].split())
+    return {'import': import_seconds, 'first_response': first_response_seconds}
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def run_gunicorn(path, env, timeout=60):
+    port = _free_port()
+    url = f'http://127.0.0.1:{port}{path}'
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}', '--workers', '1', 'main:app'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(url, timeout=5) as response:
+                    if response.status == 200:
+                        return {'first_response': time.perf_counter() - start}
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.01)
+        raise RuntimeError(f'No 200 from {url} within {timeout}s')
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def summarize(samples):
+    summary = {}
+    for key in samples[0]:
+        values = sorted(sample[key] for sample in samples)
+        summary[key] = {
+            'min': values[0],
+            'median': statistics.median(values),
+            'max': values[-1],
+        }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--path', default='/users_login', help='URL requested after startup')
+    parser.add_argument('--gunicorn', action='store_true', help='time a real gunicorn worker over HTTP')
+    parser.add_argument('--json', help='write samples and summary to this file')
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault('DATABASE_URL', 'sqlite:////tmp/contextwindow_cold_start.db')
+    env.setdefault('SECRET_KEY', 'benchmark')
+    env['MAIL_OUTBOX_WORKERS'] = '0'
+
+    runner = run_gunicorn if args.gunicorn else run_in_process
+    samples = [runner(args.path, env) for _ in range(args.runs)]
+    summary = summarize(samples)
+
+    for key, stats in summary.items():
+        print(f"{key:>15}: min {stats['min'] * 1000:8.1f} ms  "
+              f"median {stats['median'] * 1000:8.1f} ms  max {stats['max'] * 1000:8.1f} ms")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'mode': 'gunicorn' if args.gunicorn else 'in-process',
+                       'path': args.path, 'samples': samples, 'summary': summary}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
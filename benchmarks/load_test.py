@@ -0,0 +1,374 @@
+# benchmarks/load_test.py
+#
+# Scripted load test for the main user flows, with results saved as JSON so
+# runs can be compared.
+#
+#     python benchmarks/load_test.py --json baseline.json
+#     python benchmarks/load_test.py --database sqlite:////tmp/bench.db \
+#         --database postgresql://localhost/contextwindow_bench --json run.json
+#     python benchmarks/load_test.py --compare baseline.json --threshold 10
+#     python benchmarks/load_test.py --url http://localhost:5000 --scenario list_projects
+#
+# Scenarios:
+#   list_projects  GET / and /api/projects, alternately
+#   add_project    POST /add
+#   list_users     GET /users
+#   login_link     POST /send-login-link for seeded users; the outbox workers
+#                  deliver the emails to a local SMTP sink
+#   token_login    GET /login/<token> with a valid passwordless token
+#
+# The database is seeded first (benchmarks/seed.py) up to --projects,
+# --users and --roles rows, so the numbers are for a known data size. Each
+# scenario runs --requests requests from --concurrency client threads and
+# reports throughput, p50/p95/p99 latency and failed requests. Requests go
+# through the app in-process (Flask test client), or to a running server
+# with --url; that server must share DATABASE_URL and SECRET_KEY with this
+# script, and its mail settings decide where login emails go.
+#
+# Rate limits and login-link coalescing are turned off, since the point is
+# to load the flows rather than the limiter (see login_burst.py for that).
+# With several --database options, each database is run in its own
+# subprocess. --compare flags scenarios whose p95 latency rose or whose
+# throughput fell by more than --threshold percent, and exits with status 1.
+
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import socketserver
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlencode, urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('DATABASE_URL', 'sqlite:////tmp/contextwindow_bench.db')
+os.environ.setdefault('SECRET_KEY', 'benchmark')
+os.environ.setdefault('MAIL_DEFAULT_SENDER', 'benchmark@example.com')
+os.environ.setdefault('LOG_LEVEL', 'ERROR')
+os.environ.update(LOGIN_LINK_RATE_LIMIT_IP='', LOGIN_LINK_RATE_LIMIT_EMAIL='', LOGIN_LINK_COALESCE_SECONDS='0')
+
+SCENARIOS = ('list_projects', 'add_project', 'list_users', 'login_link', 'token_login')
+
+
+# --- SMTP sink ---
+
+class SmtpSink(socketserver.ThreadingTCPServer):
+    """Minimal SMTP server that accepts every message and only counts it."""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), _SmtpHandler)
+        self.delivered = 0
+        self.lock = threading.Lock()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+
+class _SmtpHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        self.reply('220 sink ready')
+        while line := self.rfile.readline():
+            command = line[:4].upper()
+            if command == b'DATA':
+                self.reply('354 end with <CRLF>.<CRLF>')
+                while (line := self.rfile.readline()) and line != b'.\r\n':
+                    pass
+                with self.server.lock:
+                    self.server.delivered += 1
+                self.reply('250 queued')
+            elif command == b'QUIT':
+                self.reply('221 bye')
+                return
+            elif command == b'EHLO':
+                self.reply('250 sink')
+            else:
+                self.reply('250 ok')
+
+    def reply(self, text):
+        self.wfile.write(text.encode() + b'\r\n')
+
+
+# --- Clients ---
+
+class LocalClient:
+    """Calls the app in-process. Cookies are off, so every request is anonymous."""
+
+    def __init__(self, app):
+        self.client = app.test_client(use_cookies=False)
+
+    def request(self, method, path, form=None):
+        response = self.client.open(path, method=method, data=form)
+        response.close()
+        return response.status_code, response.headers.get('Location')
+
+
+class HttpClient:
+    """Talks to a running server over one keep-alive connection."""
+
+    def __init__(self, base_url):
+        parts = urlsplit(base_url)
+        connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.connection = connection_class(parts.netloc, timeout=30)
+
+    def request(self, method, path, form=None):
+        body = urlencode(form) if form is not None else None
+        headers = {'Content-Type': 'application/x-www-form-urlencoded'} if form is not None else {}
+        try:
+            self.connection.request(method, path, body=body, headers=headers)
+            response = self.connection.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            self.connection.close()  # reconnects on the next request
+            return 0, None
+        return response.status, response.getheader('Location')
+
+
+# --- Scenarios ---
+# Each takes (client, rng, context) and returns True if the request succeeded.
+
+def list_projects(client, rng, context):
+    status, _ = client.request('GET', rng.choice(('/', '/api/projects')))
+    return status == 200
+
+
+def add_project(client, rng, context):
+    status, _ = client.request('POST', '/add', {
+        'name': f'Load test project {rng.randrange(10 ** 9)}',
+        'short_description': 'Added by the load test',
+        'background': '',
+        'start_date': '2024-01-01',
+        'end_date': '',
+    })
+    return status == 302
+
+
+def list_users(client, rng, context):
+    status, _ = client.request('GET', '/users')
+    return status == 200
+
+
+def login_link(client, rng, context):
+    status, _ = client.request('POST', '/send-login-link', {'email': rng.choice(context['emails'])})
+    return status == 200
+
+
+def token_login(client, rng, context):
+    status, location = client.request('GET', f"/login/{rng.choice(context['tokens'])}")
+    # Flask-Security redirects both ways: to the post-login view, or back to /login with an error
+    return status == 302 and not urlsplit(location or '').path.rstrip('/').endswith('/login')
+
+
+def percentile(samples, fraction):
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def run_scenario(scenario, make_client, context, requests, concurrency):
+    remaining = iter(range(requests))
+    lock = threading.Lock()
+    latencies, failures = [], 0
+
+    def worker(number):
+        nonlocal failures
+        client, rng = make_client(), random.Random(number)
+        while True:
+            with lock:
+                if next(remaining, None) is None:
+                    return
+            start = time.perf_counter()
+            ok = scenario(client, rng, context)
+            latency = time.perf_counter() - start
+            with lock:
+                latencies.append(latency)
+                failures += not ok
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'failures': failures,
+        'seconds': elapsed,
+        'throughput': len(latencies) / elapsed,
+        'latency_p50_ms': percentile(latencies, 0.50) * 1000,
+        'latency_p95_ms': percentile(latencies, 0.95) * 1000,
+        'latency_p99_ms': percentile(latencies, 0.99) * 1000,
+    }
+
+
+def wait_for_outbox(sink, expected, timeout=60):
+    deadline = time.monotonic() + timeout
+    while sink.delivered < expected and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return sink.delivered
+
+
+# --- Runs ---
+
+def run(args):
+    """Seeds the database named by DATABASE_URL and runs the scenarios against it."""
+    sink = SmtpSink()
+    threading.Thread(target=sink.serve_forever, name='smtp-sink', daemon=True).start()
+    os.environ.update(MAIL_SERVER='127.0.0.1', MAIL_PORT=str(sink.port), MAIL_USE_TLS='false',
+                      MAIL_USERNAME='', MAIL_PASSWORD='', PAGE_CACHE_BACKEND=args.page_cache)
+
+    # Imported here: the app reads its mail and cache settings at import time
+    from main import app
+    from bootstrap import bootstrap
+    from extensions import db
+    from flask_security.passwordless import generate_login_token
+    from sqlalchemy import func, select
+    from projects.projects_model import Project
+    from users.users_model import User
+    from seed import EMAIL_DOMAIN, seed
+
+    with app.app_context():
+        bootstrap()
+        counts = {
+            'projects': db.session.scalar(select(func.count()).select_from(Project)),
+            'users': db.session.scalar(select(func.count()).select_from(User)),
+        }
+        seed(projects=max(0, args.projects - counts['projects']),
+             users=max(0, args.users - counts['users']),
+             roles=args.roles)
+        users = db.session.scalars(
+            select(User).where(User.email.like(f'%@{EMAIL_DOMAIN}')).order_by(User.id).limit(1000)).all()
+        context = {
+            'emails': [user.email for user in users],
+            'tokens': [generate_login_token(user) for user in users],
+        }
+        database = {
+            'dialect': db.engine.dialect.name,
+            'projects': db.session.scalar(select(func.count()).select_from(Project)),
+            'users': db.session.scalar(select(func.count()).select_from(User)),
+        }
+        db.session.remove()
+
+    if args.url:
+        make_client = lambda: HttpClient(args.url)
+    else:
+        make_client = lambda: LocalClient(app)
+
+    results = {}
+    for name in args.scenario or SCENARIOS:
+        delivered_before = sink.delivered
+        result = run_scenario(globals()[name], make_client, context, args.requests, args.concurrency)
+        if name == 'login_link' and not args.url and app.config['MAIL_OUTBOX_WORKERS']:
+            expected = delivered_before + result['requests'] - result['failures']
+            result['emails_delivered'] = wait_for_outbox(sink, expected) - delivered_before
+        results[name] = result
+        print(f"{database['dialect']:>10} {name:>14}: {result['throughput']:8.1f} req/s  "
+              f"p50 {result['latency_p50_ms']:7.1f} ms  p95 {result['latency_p95_ms']:7.1f} ms  "
+              f"p99 {result['latency_p99_ms']:7.1f} ms  failures {result['failures']}", flush=True)
+    sink.shutdown()
+    return {'database': database, 'results': results}
+
+
+def run_databases(args):
+    """Runs each --database in a child process (the app binds DATABASE_URL at import)."""
+    runs = {}
+    for url in args.database:
+        with tempfile.NamedTemporaryFile(suffix='.json') as output:
+            command = [sys.executable, os.path.abspath(__file__), '--json', output.name,
+                       '--requests', str(args.requests), '--concurrency', str(args.concurrency),
+                       '--projects', str(args.projects), '--users', str(args.users),
+                       '--roles', str(args.roles), '--page-cache', args.page_cache]
+            for name in args.scenario or ():
+                command += ['--scenario', name]
+            subprocess.run(command, env={**os.environ, 'DATABASE_URL': url}, check=True)
+            with open(output.name) as f:
+                runs.update(json.load(f)['runs'])
+    return runs
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(report, baseline, threshold):
+    """Returns a line per scenario that got slower than the baseline by more than threshold percent."""
+    regressions = []
+    for label, current in report['runs'].items():
+        previous = baseline.get('runs', {}).get(label)
+        if not previous:
+            continue
+        for name, result in current['results'].items():
+            before = previous['results'].get(name)
+            if not before:
+                continue
+            p95_change = (result['latency_p95_ms'] / before['latency_p95_ms'] - 1) * 100
+            throughput_change = (result['throughput'] / before['throughput'] - 1) * 100
+            if p95_change > threshold or -throughput_change > threshold:
+                regressions.append(f"{label} {name}: p95 {before['latency_p95_ms']:.1f} -> "
+                                   f"{result['latency_p95_ms']:.1f} ms ({p95_change:+.0f}%), throughput "
+                                   f"{before['throughput']:.1f} -> {result['throughput']:.1f} req/s "
+                                   f"({throughput_change:+.0f}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenario', action='append', choices=SCENARIOS, help='repeatable; default: all')
+    parser.add_argument('--requests', type=int, default=2000, help='requests per scenario')
+    parser.add_argument('--concurrency', type=int, default=8, help='client threads')
+    parser.add_argument('--projects', type=int, default=10000, help='seed the database up to this many')
+    parser.add_argument('--users', type=int, default=1000, help='seed the database up to this many')
+    parser.add_argument('--roles', type=int, default=5, help='generated roles to assign to seeded users')
+    parser.add_argument('--page-cache', default='memory', choices=('memory', 'sqlite', 'none'))
+    parser.add_argument('--database', action='append', help='database URL; repeatable (default: DATABASE_URL)')
+    parser.add_argument('--url', help='load a running server at this base URL instead of the in-process app')
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('--compare', help='earlier --json results to check for regressions')
+    parser.add_argument('--threshold', type=float, default=10, help='regression threshold in percent')
+    args = parser.parse_args()
+
+    if args.database:
+        runs = run_databases(args)
+    else:
+        current = run(args)
+        runs = {current['database']['dialect']: current}
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'started': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'args': {key: value for key, value in vars(args).items() if key not in ('database', 'json', 'compare')},
+        },
+        'runs': runs,
+    }
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions over {args.threshold:g}% against {args.compare}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+# benchmarks/logging_overhead.py
+#
+# Per-request cost of diagnostic output in a handler like send_login_link,
+# which used to print ~30 f-string lines per request.
+#
+#     python benchmarks/logging_overhead.py --requests 20000
+#
+# Compares, per simulated request of MESSAGES_PER_REQUEST messages:
+#   print        f-string print() to a line-buffered stdout (the old code)
+#   log-off      log.debug() with DEBUG disabled (production default)
+#   log-on       log.debug() with DEBUG enabled, through the queue pipeline
+# Output goes to /dev/null, so this is the cost paid by the request thread.
+
+import argparse
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from utils.log import configure_logging
+
+MESSAGES_PER_REQUEST = 30
+EMAIL = 'someone@example.com'
+TOKEN = 'InRva2VuIg.ZxYz.abcdefghijklmnop'
+
+log = logging.getLogger('benchmark.users')
+
+
+def request_with_print(out):
+    for step in range(MESSAGES_PER_REQUEST):
+        print(f"DEBUG: step {step} for {EMAIL} with token {TOKEN[:10]}...", file=out)
+
+
+def request_with_logging():
+    for step in range(MESSAGES_PER_REQUEST):
+        log.debug("step %s for %s with token %s...", step, EMAIL, TOKEN[:10])
+
+
+def measure(fn, requests):
+    start = time.perf_counter()
+    for _ in range(requests):
+        fn()
+    return (time.perf_counter() - start) / requests * 1e6  # microseconds per request
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=20000)
+    args = parser.parse_args()
+
+    devnull = open(os.devnull, 'w', buffering=1)  # line-buffered, like PYTHONUNBUFFERED stdout
+    real_stdout, sys.stdout = sys.stdout, devnull
+
+    app = Flask('benchmark')
+    app.config.update(LOG_LEVEL='INFO', LOG_LEVELS={}, LOG_FORMAT='json')
+    configure_logging(app)
+
+    results = {'print': measure(lambda: request_with_print(devnull), args.requests)}
+    results['log-off'] = measure(request_with_logging, args.requests)
+    log.setLevel(logging.DEBUG)
+    results['log-on'] = measure(request_with_logging, args.requests)
+
+    sys.stdout = real_stdout
+    for name, micros in results.items():
+        print(f"{name:>8}: {micros:8.1f} us/request ({MESSAGES_PER_REQUEST} messages)")
+
+
+if __name__ == '__main__':
+    main()
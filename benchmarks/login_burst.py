@@ -0,0 +1,130 @@
+# benchmarks/login_burst.py
+#
+# Load test for /send-login-link under a burst: many concurrent clients
+# hammering a few addresses from a few IPs, as a retry-happy client or an
+# abusive script would.
+#
+#     python benchmarks/login_burst.py --requests 3000 --threads 16
+#     python benchmarks/login_burst.py --json login_burst.json
+#
+# Runs the burst twice, with rate limiting and coalescing off and then on,
+# and reports throughput per time slice, latency percentiles, response codes
+# and the number of emails that were actually queued. Outbox workers are
+# disabled, so nothing is sent. DATABASE_URL defaults to a throwaway SQLite
+# file.
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DATABASE_URL', 'sqlite:////tmp/contextwindow_login_burst.db')
+os.environ.setdefault('SECRET_KEY', 'benchmark')
+os.environ['MAIL_OUTBOX_WORKERS'] = '0'
+os.environ.setdefault('MAIL_DEFAULT_SENDER', 'benchmark@example.com')
+os.environ.setdefault('LOG_LEVEL', 'ERROR')
+
+from main import app
+from bootstrap import bootstrap
+from extensions import db, rate_limiter
+from outbox.outbox_model import OutboxMessage
+
+SLICE_SECONDS = 0.25
+
+
+def run_burst(requests, threads, emails, ips):
+    targets = [(f'burst{n}@example.com', f'10.0.0.{n % ips + 1}') for n in range(emails)]
+    remaining = iter(range(requests))
+    lock = threading.Lock()
+    results = []  # (finished_at, latency, status)
+
+    def client():
+        http = app.test_client()
+        while True:
+            with lock:
+                if next(remaining, None) is None:
+                    return
+            email, ip = random.choice(targets)
+            start = time.perf_counter()
+            response = http.post('/send-login-link', data={'email': email},
+                                 environ_base={'REMOTE_ADDR': ip})
+            finished = time.perf_counter()
+            with lock:
+                results.append((finished, finished - start, response.status_code))
+
+    with app.app_context():
+        queued_before = db.session.query(OutboxMessage).count()
+        db.session.remove()
+    workers = [threading.Thread(target=client) for _ in range(threads)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+    with app.app_context():
+        queued = db.session.query(OutboxMessage).count() - queued_before
+        db.session.remove()
+
+    slices = Counter(int((finished - started) / SLICE_SECONDS) for finished, _, _ in results)
+    per_slice = [slices.get(n, 0) / SLICE_SECONDS for n in range(max(slices) + 1)]
+    latencies = sorted(latency for _, latency, _ in results)
+    return {
+        'requests': len(results),
+        'seconds': elapsed,
+        'throughput': len(results) / elapsed,
+        'throughput_per_slice': per_slice,
+        'throughput_stdev': statistics.pstdev(per_slice),
+        'latency_p50_ms': latencies[len(latencies) // 2] * 1000,
+        'latency_p95_ms': latencies[int(len(latencies) * 0.95)] * 1000,
+        'statuses': dict(Counter(status for _, _, status in results)),
+        'emails_queued': queued,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=3000)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--emails', type=int, default=20, help='distinct addresses in the burst')
+    parser.add_argument('--ips', type=int, default=4, help='distinct client IPs in the burst')
+    parser.add_argument('--json', help='write the results to this file')
+    args = parser.parse_args()
+
+    with app.app_context():
+        bootstrap()
+
+    limits = {
+        'LOGIN_LINK_RATE_LIMIT_IP': app.config['LOGIN_LINK_RATE_LIMIT_IP'],
+        'LOGIN_LINK_RATE_LIMIT_EMAIL': app.config['LOGIN_LINK_RATE_LIMIT_EMAIL'],
+        'LOGIN_LINK_COALESCE_SECONDS': app.config['LOGIN_LINK_COALESCE_SECONDS'],
+    }
+    results = {}
+    for mode in ('unlimited', 'limited'):
+        if mode == 'unlimited':
+            app.config.update(LOGIN_LINK_RATE_LIMIT_IP='', LOGIN_LINK_RATE_LIMIT_EMAIL='',
+                              LOGIN_LINK_COALESCE_SECONDS=0)
+        else:
+            app.config.update(limits)
+        if rate_limiter.backend is not None:
+            rate_limiter.backend.clear()
+        results[mode] = run_burst(args.requests, args.threads, args.emails, args.ips)
+
+    for mode, result in results.items():
+        print(f"{mode:>9}: {result['throughput']:8.1f} req/s (stdev per {SLICE_SECONDS}s slice "
+              f"{result['throughput_stdev']:7.1f})  p50 {result['latency_p50_ms']:6.1f} ms  "
+              f"p95 {result['latency_p95_ms']:6.1f} ms  emails queued {result['emails_queued']:5d}  "
+              f"statuses {result['statuses']}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'args': vars(args), 'limits': limits, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
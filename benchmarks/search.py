@@ -0,0 +1,129 @@
+# benchmarks/search.py
+#
+# Project search over a generated corpus: indexed full-text search
+# (projects/projects_search.py) against the unindexed LIKE scan it replaces.
+#
+#     python benchmarks/search.py --projects 1000000
+#     DATABASE_URL=postgresql://... python benchmarks/search.py --json search.json
+#
+# The corpus is random text over a Zipf-like vocabulary, so there are both
+# very common and rare words. It is generated once (with the search triggers
+# or generated column active) and reused on later runs against the same
+# database. DATABASE_URL defaults to a throwaway SQLite file.
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from itertools import accumulate
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DATABASE_URL', 'sqlite:////tmp/contextwindow_search.db')
+os.environ.setdefault('SECRET_KEY', 'benchmark')
+os.environ['MAIL_OUTBOX_WORKERS'] = '0'
+os.environ.setdefault('LOG_LEVEL', 'ERROR')
+os.environ['PAGE_CACHE_BACKEND'] = 'none'  # measure the queries, not the page cache
+
+from datetime import datetime
+from sqlalchemy import insert
+from main import app
+from bootstrap import bootstrap
+from extensions import db
+from projects.projects_model import Project
+from projects.projects_search import search_projects, _like_query
+
+SYLLABLES = ['ka', 'lo', 'mi', 'ne', 'ru', 'sa', 'ti', 'vo', 'ze', 'po', 'da', 'fi', 'gu', 'he', 'jo']
+CHUNK = 10000
+
+
+def vocabulary(size, rng):
+    words = set()
+    while len(words) < size:
+        words.add(''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def generate(count, words, rng):
+    cumulative = list(accumulate(1 / (rank + 1) for rank in range(len(words))))  # Zipf-like
+    now = datetime.utcnow()
+
+    def text(length):
+        return ' '.join(rng.choices(words, cum_weights=cumulative, k=length))
+
+    for start in range(0, count, CHUNK):
+        yield [{
+            'name': text(rng.randint(2, 4)).title(),
+            'short_description': text(rng.randint(6, 12)),
+            'background': text(rng.randint(20, 60)),
+            'created_at': now,
+            'updated_at': now,
+        } for _ in range(min(CHUNK, count - start))]
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return {'p50_ms': samples[len(samples) // 2] * 1000,
+            'p95_ms': samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--projects', type=int, default=1000000)
+    parser.add_argument('--vocabulary', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--skip-baseline', action='store_true', help="don't time the LIKE scan")
+    parser.add_argument('--json', help='write the results to this file')
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    words = vocabulary(args.vocabulary, rng)
+    results = {}
+
+    with app.app_context():
+        results['database'] = db.engine.dialect.name
+        bootstrap()
+        existing = db.session.query(Project).count()
+        if existing < args.projects:
+            start = time.perf_counter()
+            for rows in generate(args.projects - existing, words, rng):
+                db.session.execute(insert(Project), rows)
+                db.session.commit()
+            results['load_seconds'] = time.perf_counter() - start
+            print(f"Loaded {args.projects - existing} projects in {results['load_seconds']:.1f} s")
+        results['projects'] = db.session.query(Project).count()
+
+        queries = {
+            'common word': words[0],
+            'mid-frequency word': words[len(words) // 50],
+            'rare word': words[-1],
+            'two words': f'{words[3]} {words[200]}',
+            'prefix': words[100][:4],
+        }
+        results['queries'] = {}
+        for label, query in queries.items():
+            entry = {'query': query,
+                     'search': timed(lambda: search_projects(query, limit=20), args.repeat)}
+            if not args.skip_baseline:
+                terms = query.split()
+                entry['like_scan'] = timed(
+                    lambda: db.session.execute(_like_query(terms).limit(21)).all(), max(1, args.repeat // 4))
+            results['queries'][label] = entry
+            baseline = entry.get('like_scan')
+            print(f"{label:>20} {query!r:>16}: search p50 {entry['search']['p50_ms']:8.2f} ms "
+                  f"p95 {entry['search']['p95_ms']:8.2f} ms"
+                  + (f"   LIKE scan p50 {baseline['p50_ms']:8.2f} ms" if baseline else ''))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+# benchmarks/seed.py
+#
+# Seeds a database with generated projects, users and roles for the
+# benchmarks. Rows are inserted in chunks with executemany, so a million
+# projects load in minutes rather than hours.
+#
+#     python benchmarks/seed.py --projects 100000 --users 10000 --roles 10
+#
+# Generated users have addresses like user123@bench.example and are given
+# one or two random roles. Seeding is additive; pass --reset to empty the
+# projects, users and roles tables first. Uses DATABASE_URL like the app.
+
+import argparse
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DATABASE_URL', 'sqlite:////tmp/contextwindow_bench.db')
+os.environ.setdefault('SECRET_KEY', 'benchmark')
+os.environ['MAIL_OUTBOX_WORKERS'] = '0'
+os.environ.setdefault('LOG_LEVEL', 'ERROR')
+
+from sqlalchemy import delete, insert, select
+
+CHUNK = 5000
+WORDS = ('alpha', 'beacon', 'cobalt', 'delta', 'ember', 'falcon', 'granite', 'harbor', 'ion', 'juniper',
+         'kepler', 'lumen', 'meridian', 'nimbus', 'orbit', 'prism', 'quartz', 'raven', 'summit', 'tundra')
+EMAIL_DOMAIN = 'bench.example'
+
+
+def _chunks(count):
+    for start in range(0, count, CHUNK):
+        yield start, min(CHUNK, count - start)
+
+
+def _sentence(rng, length):
+    return ' '.join(rng.choice(WORDS) for _ in range(length))
+
+
+def seed(projects=0, users=0, roles=0, seed_value=42):
+    """Inserts the requested rows and returns the elapsed seconds per table. Needs an app context."""
+    from projects.projects_model import db, Project
+    from users.users_model import User, Role, roles_users
+
+    rng = random.Random(seed_value)
+    timings = {}
+    now = datetime.utcnow()
+
+    start = time.perf_counter()
+    existing = set(db.session.scalars(select(Role.name)))
+    new_roles = [f'bench-role-{n}' for n in range(roles) if f'bench-role-{n}' not in existing]
+    if new_roles:
+        db.session.execute(insert(Role), [
+            {'name': name, 'description': 'Benchmark role', 'created_at': now} for name in new_roles])
+        db.session.commit()
+    timings['roles'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _, size in _chunks(projects):
+        rows = []
+        for _ in range(size):
+            begins = now - timedelta(days=rng.randint(0, 1500))
+            rows.append({
+                'name': _sentence(rng, 3).title(),
+                'short_description': _sentence(rng, 10),
+                'background': _sentence(rng, 40),
+                'start_date': begins,
+                'end_date': begins + timedelta(days=rng.randint(1, 400)) if rng.random() < 0.7 else None,
+                'created_at': now,
+                'updated_at': now,
+            })
+        db.session.execute(insert(Project), rows)
+        db.session.commit()
+    timings['projects'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    role_ids = list(db.session.scalars(select(Role.id)))
+    first = (db.session.query(db.func.max(User.id)).scalar() or 0) + 1
+    for offset, size in _chunks(users):
+        numbers = range(first + offset, first + offset + size)
+        db.session.execute(insert(User), [{
+            'email': f'user{number}@{EMAIL_DOMAIN}',
+            'name': f'User {number}',
+            'active': True,
+            'fs_uniquifier': uuid.uuid4().hex,
+            'confirmed_at': now,
+            'created_at': now,
+        } for number in numbers])
+        ids = dict(db.session.execute(
+            select(User.email, User.id).where(User.email.in_([f'user{n}@{EMAIL_DOMAIN}' for n in numbers]))).all())
+        if role_ids:
+            db.session.execute(insert(roles_users), [
+                {'user_id': user_id, 'role_id': role_id}
+                for user_id in ids.values()
+                for role_id in rng.sample(role_ids, min(len(role_ids), rng.randint(1, 2)))
+            ])
+        db.session.commit()
+    timings['users'] = time.perf_counter() - start
+    return timings
+
+
+def reset():
+    """Deletes all projects, users and role assignments, and the generated roles."""
+    from projects.projects_model import db, Project
+    from users.users_model import User, Role, roles_users
+
+    db.session.execute(delete(roles_users))
+    db.session.execute(delete(User))
+    db.session.execute(delete(Project))
+    db.session.execute(delete(Role).where(Role.name.like('bench-role-%')))
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--projects', type=int, default=10000)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--roles', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42, help='random seed, for reproducible data')
+    parser.add_argument('--reset', action='store_true', help='empty the tables first')
+    args = parser.parse_args()
+
+    from main import app
+    from bootstrap import bootstrap
+    with app.app_context():
+        bootstrap()
+        if args.reset:
+            reset()
+        timings = seed(args.projects, args.users, args.roles, args.seed)
+    for table, seconds in timings.items():
+        print(f"{table:>9}: {seconds:6.1f} s")
+
+
+if __name__ == '__main__':
+    main()
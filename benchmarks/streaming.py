@@ -0,0 +1,93 @@
+# benchmarks/streaming.py
+#
+# Time to first byte, peak memory and bytes on the wire for the long listing
+# pages, rendered in full before sending (render_template) and streamed while
+# the rows are read (utils/streaming.py), with and without gzip.
+#
+#     python benchmarks/streaming.py --projects 20000 --users 5000 --limit 500
+#
+# Seeds the database with benchmarks/seed.py if it has fewer rows than asked
+# for. DATABASE_URL defaults to a throwaway SQLite file. The page cache is
+# off, so every request renders.
+
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DATABASE_URL', 'sqlite:////tmp/contextwindow_bench.db')
+os.environ.setdefault('SECRET_KEY', 'benchmark')
+os.environ['MAIL_OUTBOX_WORKERS'] = '0'
+os.environ.setdefault('LOG_LEVEL', 'ERROR')
+os.environ['PAGE_CACHE_BACKEND'] = 'none'  # measure rendering, not the page cache
+
+from sqlalchemy import func, select
+from main import create_app
+from bootstrap import bootstrap
+from extensions import db
+from projects.projects_model import Project
+from users.users_model import User
+from seed import seed
+
+
+def measure(app, path, encoding, repeat):
+    client = app.test_client()
+    samples = []
+    for _ in range(repeat):
+        tracemalloc.start()
+        start = time.perf_counter()
+        response = client.get(path, headers={'Accept-Encoding': encoding}, buffered=False)
+        chunks = iter(response.response)
+        first = next(chunks)
+        first_byte = time.perf_counter() - start
+        size = len(first) + sum(len(chunk) for chunk in chunks)
+        total = time.perf_counter() - start
+        response.close()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        samples.append((first_byte, total, peak, size))
+    samples.sort()
+    first_byte, total, peak, size = samples[len(samples) // 2]
+    return {'ttfb_ms': first_byte * 1000, 'total_ms': total * 1000, 'peak_kib': peak / 1024, 'bytes': size}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--projects', type=int, default=20000)
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--limit', type=int, default=500, help='rows per page (at most PAGE_SIZE_MAX)')
+    parser.add_argument('--repeat', type=int, default=9)
+    parser.add_argument('--json', help='write the results to this file')
+    args = parser.parse_args()
+
+    modes = {
+        'buffered': create_app({'STREAM_MIN_PAGE_SIZE': sys.maxsize}),
+        'streamed': create_app({'STREAM_MIN_PAGE_SIZE': 1}),
+    }
+    with modes['buffered'].app_context():
+        bootstrap()
+        projects = db.session.scalar(select(func.count()).select_from(Project))
+        users = db.session.scalar(select(func.count()).select_from(User))
+        seed(projects=max(0, args.projects - projects), users=max(0, args.users - users), roles=5)
+        db.session.remove()
+
+    results = {}
+    for path in (f'/?limit={args.limit}', f'/users?limit={args.limit}'):
+        for mode, app in modes.items():
+            for encoding in ('identity', 'gzip'):
+                result = measure(app, path, encoding, args.repeat)
+                results[f'{path} {mode} {encoding}'] = result
+                print(f"{path:>18} {mode:>8} {encoding:>8}: TTFB {result['ttfb_ms']:7.1f} ms  "
+                      f"total {result['total_ms']:7.1f} ms  peak {result['peak_kib']:8.0f} KiB  "
+                      f"{result['bytes']:8d} bytes")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'args': vars(args), 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
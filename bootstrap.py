@@ -0,0 +1,67 @@
+# bootstrap.py
+#
+# Creates the schema and seeds the default roles. Run once per deploy (the
+# Replit deployment runs it as its build step), not on every worker boot:
+#     python bootstrap.py
+#     flask --app main bootstrap
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy.schema import CreateIndex
+from projects.projects_model import db, Project, ProjectMonthlyStats
+from users.users_model import Role
+from projects.projects_search import install_search
+from projects.projects_dates import install_date_indexes
+from projects.projects_stats import rebuild_project_stats
+import outbox.outbox_model  # noqa: F401  (registers the mail_outbox table)
+
+DEFAULT_ROLES = ['admin', 'pending', 'analyst']
+
+
+def bootstrap():
+    """Idempotently creates missing tables, indexes and default roles. Needs an app context."""
+    db.create_all()
+
+    # create_all() skips tables that already exist, so add any new indexes explicitly. IF NOT EXISTS
+    # rather than checkfirst, which can't see expression indexes (ix_users_email_lower) on SQLite.
+    with db.engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            for index in table.indexes:
+                connection.execute(CreateIndex(index, if_not_exists=True))
+
+    # Full-text search column/indexes (Postgres) or FTS5 table and triggers (SQLite),
+    # and the GiST date range index (Postgres)
+    with db.engine.begin() as connection:
+        install_search(connection)
+        install_date_indexes(connection)
+
+    # The stats table is maintained incrementally from here on; fill it if it is new
+    if db.session.query(ProjectMonthlyStats.month).first() is None and \
+            db.session.query(Project.id).filter(Project.start_date.isnot(None)).first() is not None:
+        rebuild_project_stats()
+        db.session.commit()
+
+    existing = {
+        name for (name,) in
+        db.session.query(Role.name).filter(Role.name.in_(DEFAULT_ROLES))
+    }
+    missing = [name for name in DEFAULT_ROLES if name not in existing]
+    for role_name in missing:
+        db.session.add(Role(name=role_name, description=f"{role_name.capitalize()} role"))
+    db.session.commit()
+    return missing
+
+
+@click.command('bootstrap')
+@with_appcontext
+def bootstrap_command():
+    """Create the database schema and seed the default roles."""
+    created = bootstrap()
+    click.echo(f"Schema up to date. Created roles: {', '.join(created) or 'none'}")
+
+
+if __name__ == '__main__':
+    from main import app
+    with app.app_context():
+        created = bootstrap()
+    print(f"Schema up to date. Created roles: {', '.join(created) or 'none'}")
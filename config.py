@@ -0,0 +1,222 @@
+# config.py
+
+import os
+import tempfile
+from urllib.parse import urlsplit, urlunsplit
+from metrics.metrics_pool import InstrumentedNullPool, InstrumentedQueuePool
+from utils.log import parse_levels
+
+
+def _env_bool(environ, name, default):
+    return environ.get(name, str(default)).lower() in ('1', 'true', 'yes', 'on')
+
+
+def provider_pooler_url(database_url, mode='auto'):
+    """
+    Points the URL at the provider's pooled endpoint (Neon: "<endpoint>-pooler.<region>...").
+
+    mode is 'auto' (rewrite Neon hosts, and any host with ".us-east-2" as
+    this app always has), 'on' (always rewrite) or 'off'.
+    """
+    parts = urlsplit(database_url)
+    host = parts.hostname or ''  # lowercased
+    if mode == 'off' or not host or '-pooler' in host:
+        return database_url
+    if '.us-east-2' in host:
+        # The original rule, so deployments that relied on it keep their pooled endpoint
+        pooled = host.replace('.us-east-2', '-pooler.us-east-2', 1)
+    elif mode == 'on' or host.endswith('.neon.tech'):
+        endpoint, _, rest = host.partition('.')
+        pooled = f'{endpoint}-pooler.{rest}' if rest else f'{endpoint}-pooler'
+    else:
+        return database_url
+    userinfo, at, _ = parts.netloc.rpartition('@')
+    netloc = f"{userinfo}{at}{pooled}{f':{parts.port}' if parts.port else ''}"
+    return urlunsplit(parts._replace(netloc=netloc))
+
+
+def engine_options(environ):
+    """
+    SQLAlchemy engine options for this environment.
+
+    DB_POOL_MODE=queue (default) keeps a per-worker pool. Each gunicorn worker
+    can open up to DB_POOL_SIZE + DB_MAX_OVERFLOW connections, so size
+    workers * (pool size + overflow) below the database's connection limit.
+    DB_POOL_MODE=null opens a connection per checkout and closes it after;
+    use it behind an external pgbouncer, which does the pooling instead.
+    """
+    if environ.get('DB_POOL_MODE', 'queue') == 'null':
+        return {'poolclass': InstrumentedNullPool}
+    return {
+        'poolclass': InstrumentedQueuePool,
+        'pool_size': int(environ.get('DB_POOL_SIZE', 5)),
+        'max_overflow': int(environ.get('DB_MAX_OVERFLOW', 10)),
+        'pool_recycle': int(environ.get('DB_POOL_RECYCLE', 280)),
+        'pool_timeout': float(environ.get('DB_POOL_TIMEOUT', 20)),
+        'pool_pre_ping': _env_bool(environ, 'DB_POOL_PRE_PING', True),
+        # LIFO lets surplus idle connections age out (useful with serverless Postgres)
+        'pool_use_lifo': _env_bool(environ, 'DB_POOL_USE_LIFO', False),
+    }
+
+
+def load_config(app):
+    """Reads the app configuration from the environment."""
+
+    # --- Database Configuration ---
+    database_url = os.environ.get('DATABASE_URL')
+    if not database_url:
+        raise RuntimeError("Database URL is required (DATABASE_URL environment variable not set).")
+
+    app.config['SQLALCHEMY_DATABASE_URI'] = provider_pooler_url(
+        database_url, os.environ.get('DB_PROVIDER_POOLER', 'auto'))
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(os.environ)
+
+    # --- Read Replicas (utils/db_routing.py) ---
+    # Comma-separated URLs; each becomes a 'replica_<n>' bind that read-only views may query
+    replica_urls = [url.strip() for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+    app.config['SQLALCHEMY_BINDS'] = {
+        f'replica_{number}': provider_pooler_url(url, os.environ.get('DB_PROVIDER_POOLER', 'auto'))
+        for number, url in enumerate(replica_urls)
+    }
+    # After a write, that client's reads go to the primary for this long, so it sees its own change
+    app.config['DATABASE_REPLICA_STICKY_SECONDS'] = int(os.environ.get('DATABASE_REPLICA_STICKY_SECONDS', 10))
+    app.config['DATABASE_REPLICA_HEALTH_INTERVAL'] = float(os.environ.get('DATABASE_REPLICA_HEALTH_INTERVAL', 5))
+    app.config['DATABASE_REPLICA_MAX_LAG'] = float(os.environ.get('DATABASE_REPLICA_MAX_LAG', 30))  # seconds
+
+    # --- Async Serving (asgi.py) ---
+    # Threads running Flask views per worker; keep at or below DB_POOL_SIZE + DB_MAX_OVERFLOW
+    app.config['ASGI_THREADS'] = int(os.environ.get('ASGI_THREADS', 15))
+    # Responses up to this size are buffered so the thread is freed before a slow client reads them
+    app.config['ASGI_RESPONSE_BUFFER'] = int(os.environ.get('ASGI_RESPONSE_BUFFER', 1024 * 1024))
+    # Serve the JSON listings on the event loop through the async engine instead of a Flask thread
+    app.config['ASGI_ASYNC_VIEWS'] = _env_bool(os.environ, 'ASGI_ASYNC_VIEWS', True)
+    # Default: derived from DATABASE_URL. Must be the primary: the pages it reads are cached as current.
+    app.config['ASYNC_DATABASE_URL'] = os.environ.get('ASYNC_DATABASE_URL')
+    app.config['ASYNC_DB_POOL_SIZE'] = int(os.environ.get('ASYNC_DB_POOL_SIZE', 5))
+    app.config['ASYNC_DB_MAX_OVERFLOW'] = int(os.environ.get('ASYNC_DB_MAX_OVERFLOW', 5))
+
+    # --- Logging ---
+    # LOG_LEVELS takes per-logger overrides, e.g. "users=DEBUG,sqlalchemy.engine=WARNING"
+    app.config['LOG_LEVEL'] = os.environ.get('LOG_LEVEL', 'INFO').upper()
+    app.config['LOG_LEVELS'] = parse_levels(os.environ.get('LOG_LEVELS'))
+    app.config['LOG_FORMAT'] = os.environ.get('LOG_FORMAT', 'json')
+
+    # --- Pagination ---
+    app.config['PAGE_SIZE'] = int(os.environ.get('PAGE_SIZE', 50))
+    app.config['PAGE_SIZE_MAX'] = int(os.environ.get('PAGE_SIZE_MAX', 500))
+    app.config['PROJECTS_PAGE_SIZE'] = int(os.environ.get('PROJECTS_PAGE_SIZE', app.config['PAGE_SIZE']))
+    app.config['SEARCH_PAGE_SIZE'] = int(os.environ.get('SEARCH_PAGE_SIZE', 20))
+    # Ranked results are paged with OFFSET, so stop after this many
+    app.config['SEARCH_MAX_RESULTS'] = int(os.environ.get('SEARCH_MAX_RESULTS', 1000))
+    app.config['USERS_PAGE_SIZE'] = int(os.environ.get('USERS_PAGE_SIZE', app.config['PAGE_SIZE']))
+    # Listing pages at least this long are rendered while their rows are read (utils/streaming.py)
+    app.config['STREAM_MIN_PAGE_SIZE'] = int(os.environ.get('STREAM_MIN_PAGE_SIZE', 200))
+    app.config['STREAM_BATCH_SIZE'] = int(os.environ.get('STREAM_BATCH_SIZE', 100))  # rows per fetch
+    app.config['STREAM_CHUNK_SIZE'] = int(os.environ.get('STREAM_CHUNK_SIZE', 16384))  # bytes per write
+
+    # --- Bulk Import / Export ---
+    app.config['PROJECTS_IMPORT_CHUNK_SIZE'] = int(os.environ.get('PROJECTS_IMPORT_CHUNK_SIZE', 1000))
+    app.config['PROJECTS_EXPORT_BATCH_SIZE'] = int(os.environ.get('PROJECTS_EXPORT_BATCH_SIZE', 1000))
+    # /projects/import is for users with this role, or requests with "Authorization: Bearer <PROJECTS_IMPORT_TOKEN>"
+    app.config['PROJECTS_IMPORT_ROLE'] = os.environ.get('PROJECTS_IMPORT_ROLE', 'admin')
+    app.config['PROJECTS_IMPORT_TOKEN'] = os.environ.get('PROJECTS_IMPORT_TOKEN')
+    app.config['USERS_IMPORT_CHUNK_SIZE'] = int(os.environ.get('USERS_IMPORT_CHUNK_SIZE', 500))  # users per transaction
+    # /users/bulk is for users with this role, or requests with "Authorization: Bearer <USERS_BULK_TOKEN>"
+    app.config['USERS_BULK_ROLE'] = os.environ.get('USERS_BULK_ROLE', 'admin')
+    app.config['USERS_BULK_TOKEN'] = os.environ.get('USERS_BULK_TOKEN')
+    # Invitation emails per provisioner; a chunk whose invitations don't fit is not created
+    app.config['USERS_BULK_INVITE_RATE_LIMIT'] = os.environ.get('USERS_BULK_INVITE_RATE_LIMIT', '2000/hour')
+
+    # --- Caching ---
+    app.config['ROLE_CACHE_TTL'] = int(os.environ.get('ROLE_CACHE_TTL', 300))  # seconds
+    # Logged-in user snapshots (see users/users_cache.py): 'memory', 'sqlite' or 'none'
+    app.config['IDENTITY_CACHE_BACKEND'] = os.environ.get('IDENTITY_CACHE_BACKEND', 'memory').lower()
+    app.config['IDENTITY_CACHE_TTL'] = int(os.environ.get('IDENTITY_CACHE_TTL', 300))  # seconds
+    app.config['IDENTITY_CACHE_MAX_ENTRIES'] = int(os.environ.get('IDENTITY_CACHE_MAX_ENTRIES', 10000))
+    app.config['IDENTITY_CACHE_PATH'] = os.environ.get(
+        'IDENTITY_CACHE_PATH', os.path.join(tempfile.gettempdir(), 'contextwindow-identity.sqlite3'))
+    # Rendered page cache: 'memory' (per worker), 'sqlite' (shared by the workers on a host) or 'none'
+    app.config['PAGE_CACHE_BACKEND'] = os.environ.get('PAGE_CACHE_BACKEND', 'memory').lower()
+    app.config['PAGE_CACHE_TTL'] = int(os.environ.get('PAGE_CACHE_TTL', 60))  # seconds
+    app.config['PAGE_CACHE_MAX_ENTRIES'] = int(os.environ.get('PAGE_CACHE_MAX_ENTRIES', 512))
+    app.config['PAGE_CACHE_PATH'] = os.environ.get(
+        'PAGE_CACHE_PATH', os.path.join(tempfile.gettempdir(), 'contextwindow-cache.sqlite3'))
+
+    # --- Static Assets ---
+    # Built by `python -m assets.assets_build`; without its manifest the pages use the Tailwind CDN
+    app.config['ASSETS_DIR'] = os.environ.get('ASSETS_DIR', os.path.join(app.static_folder, 'dist'))
+    app.config['ASSETS_MAX_AGE'] = int(os.environ.get('ASSETS_MAX_AGE', 365 * 24 * 3600))  # seconds
+
+    # --- Response Compression (utils/compression.py) ---
+    app.config['COMPRESSION_ENABLED'] = _env_bool(os.environ, 'COMPRESSION_ENABLED', True)
+    app.config['COMPRESSION_MIN_SIZE'] = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))  # bytes
+    app.config['COMPRESSION_GZIP_LEVEL'] = int(os.environ.get('COMPRESSION_GZIP_LEVEL', 6))
+    app.config['COMPRESSION_BROTLI_QUALITY'] = int(os.environ.get('COMPRESSION_BROTLI_QUALITY', 4))
+
+    # --- Rate Limiting ---
+    # Token buckets: 'memory' enforces limits per worker, 'sqlite' across the workers on a host
+    app.config['RATE_LIMIT_BACKEND'] = os.environ.get('RATE_LIMIT_BACKEND', 'memory').lower()
+    app.config['RATE_LIMIT_PATH'] = os.environ.get(
+        'RATE_LIMIT_PATH', os.path.join(tempfile.gettempdir(), 'contextwindow-ratelimit.sqlite3'))
+    app.config['LOGIN_LINK_RATE_LIMIT_EMAIL'] = os.environ.get('LOGIN_LINK_RATE_LIMIT_EMAIL', '5/hour')
+    app.config['LOGIN_LINK_RATE_LIMIT_IP'] = os.environ.get('LOGIN_LINK_RATE_LIMIT_IP', '30/minute')
+    # Repeat requests for the same email within this many seconds reuse the pending link email
+    app.config['LOGIN_LINK_COALESCE_SECONDS'] = int(os.environ.get('LOGIN_LINK_COALESCE_SECONDS', 60))
+    # Number of proxies in front of the app (Replit/Cloud Run: 1); 0 trusts no X-Forwarded-For
+    app.config['TRUSTED_PROXY_COUNT'] = int(os.environ.get('TRUSTED_PROXY_COUNT', 0))
+
+    # --- Metrics ---
+    # When set, metrics endpoints require "Authorization: Bearer <METRICS_TOKEN>"
+    app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+    # Each worker writes its metrics here for /metrics to merge; all workers must share it
+    app.config['METRICS_DIR'] = os.environ.get('METRICS_DIR')
+    app.config['METRICS_FLUSH_INTERVAL'] = float(os.environ.get('METRICS_FLUSH_INTERVAL', 5))
+    # Files of exited workers are deleted after this many seconds (their counts then leave the totals)
+    app.config['METRICS_RETENTION'] = float(os.environ.get('METRICS_RETENTION', 3600))
+
+    # --- Profiling ---
+    # Off: no profiling hooks are installed at all. On: admins (or METRICS_TOKEN holders) profile a
+    # request with an "X-Profile: 1" header or ?_profile=1, and PROFILER_SAMPLE_RATE of all requests
+    # are profiled at random. Profiles are listed at /admin/profiles (see metrics/metrics_profiler.py).
+    app.config['PROFILER_ENABLED'] = _env_bool(os.environ, 'PROFILER_ENABLED', False)
+    app.config['PROFILER_SAMPLE_RATE'] = float(os.environ.get('PROFILER_SAMPLE_RATE', 0.0))  # 0.01 = 1%
+    app.config['PROFILER_INTERVAL'] = float(os.environ.get('PROFILER_INTERVAL', 0.005))  # seconds between samples
+    app.config['PROFILER_ADMIN_ROLE'] = os.environ.get('PROFILER_ADMIN_ROLE', 'admin')
+    # Shared by the workers on a host, like METRICS_DIR
+    app.config['PROFILER_DIR'] = os.environ.get('PROFILER_DIR')
+    app.config['PROFILER_MAX_PROFILES'] = int(os.environ.get('PROFILER_MAX_PROFILES', 50))
+    app.config['PROFILER_MAX_STATEMENTS'] = int(os.environ.get('PROFILER_MAX_STATEMENTS', 500))  # per profile
+
+    # --- Secret Key ---
+    app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY')
+    if not app.config['SECRET_KEY']:
+        app.logger.warning("SECRET_KEY environment variable not set. Using default (insecure).")
+        app.config['SECRET_KEY'] = 'super-secret-default-key-CHANGE-ME' # Use a default only for debugging if absolutely necessary
+
+    # --- Mail Settings ---
+    app.config['MAIL_SERVER'] = os.environ.get('MAIL_SERVER', 'smtp.gmail.com')
+    app.config['MAIL_PORT'] = int(os.environ.get('MAIL_PORT', 587))
+    app.config['MAIL_USE_TLS'] = os.environ.get('MAIL_USE_TLS', 'true').lower() == 'true'
+    app.config['MAIL_USERNAME'] = os.environ.get('MAIL_USERNAME')
+    app.config['MAIL_PASSWORD'] = os.environ.get('MAIL_PASSWORD')
+    app.config['MAIL_DEFAULT_SENDER'] = os.environ.get('MAIL_DEFAULT_SENDER')
+
+    # --- Mail Outbox Settings ---
+    # Set MAIL_OUTBOX_WORKERS=0 to disable in-process sending and run `python -m outbox.outbox_worker` instead
+    app.config['MAIL_OUTBOX_WORKERS'] = int(os.environ.get('MAIL_OUTBOX_WORKERS', 2))
+    # Threads in the standalone worker; independent of MAIL_OUTBOX_WORKERS so both can share an environment
+    app.config['MAIL_OUTBOX_STANDALONE_WORKERS'] = int(os.environ.get('MAIL_OUTBOX_STANDALONE_WORKERS', 2))
+    app.config['MAIL_OUTBOX_BATCH_SIZE'] = int(os.environ.get('MAIL_OUTBOX_BATCH_SIZE', 20))
+    app.config['MAIL_OUTBOX_MAX_ATTEMPTS'] = int(os.environ.get('MAIL_OUTBOX_MAX_ATTEMPTS', 6))
+    app.config['MAIL_OUTBOX_BACKOFF_BASE'] = float(os.environ.get('MAIL_OUTBOX_BACKOFF_BASE', 30))
+
+    # --- Security Settings ---
+    # Make sure these are set BEFORE security.init_app()
+    app.config['SECURITY_REGISTERABLE'] = True  # Or False if you don't want public registration
+    app.config['SECURITY_CONFIRMABLE'] = True   # Requires email confirmation for registration if not passwordless
+    app.config['SECURITY_PASSWORDLESS'] = True  # **** THIS IS THE KEY SETTING ****
+    app.config['SECURITY_LOGIN_WITHOUT_CONFIRMATION'] = False # Good practice if confirmable is True
+    app.config['SECURITY_EMAIL_SENDER'] = os.environ.get('MAIL_DEFAULT_SENDER') # Ensure this matches MAIL_DEFAULT_SENDER or is set
+    app.config['SECURITY_LOGIN_WITHIN'] = '24 hours'  # Login link validity duration
+    app.config['SECURITY_TOKEN_MAX_AGE'] = 86400  # 24 hours in seconds for tokens (like confirmation, password reset)
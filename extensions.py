@@ -0,0 +1,20 @@
+# extensions.py
+#
+# Extension objects shared by the whole app. They are created unbound here and
+# attached to an app in main.create_app(), so blueprints can import them
+# without importing main.
+
+from flask_mail import Mail
+from flask_security import Security, SQLAlchemyUserDatastore
+from assets.assets_manifest import assets
+from projects.projects_model import db
+from users.users_model import User, Role
+from outbox.outbox_worker import OutboxWorkerPool
+from utils.page_cache import page_cache
+from utils.rate_limit import RateLimiter
+
+mail = Mail()
+security = Security()
+outbox = OutboxWorkerPool(mail) # Background sender for queued mail (see outbox/outbox_worker.py)
+user_datastore = SQLAlchemyUserDatastore(db, User, Role)
+rate_limiter = RateLimiter()
@@ -0,0 +1,153 @@
+# metrics/metrics_http.py
+#
+# Request and query instrumentation: per-endpoint latency, response size and
+# status counts from Flask request hooks, and per-request SQL query count and
+# DB time from SQLAlchemy cursor events on the shared engine(s).
+
+import contextlib
+import contextvars
+import os
+import tempfile
+import time
+from flask import g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from .metrics_pool import pool_snapshot
+from .metrics_registry import registry, Counter, Gauge, Histogram
+
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+REQUESTS = Counter(registry, 'http_requests_total', 'HTTP requests by endpoint, method and status.',
+                   ('endpoint', 'method', 'status'))
+LATENCY = Histogram(registry, 'http_request_duration_seconds', 'Time spent handling a request.',
+                    ('endpoint',))
+RESPONSE_SIZE = Histogram(registry, 'http_response_size_bytes', 'Response body size (when known up front).',
+                          ('endpoint',), buckets=SIZE_BUCKETS)
+QUERIES_PER_REQUEST = Histogram(registry, 'db_queries_per_request', 'SQL statements executed per request.',
+                                ('endpoint',), buckets=QUERY_COUNT_BUCKETS)
+DB_TIME = Histogram(registry, 'db_time_per_request_seconds', 'Total time in SQL execution per request.',
+                    ('endpoint',))
+QUERIES = Counter(registry, 'db_queries_total', 'SQL statements executed, by endpoint.', ('endpoint',))
+
+POOL_COUNTERS = {
+    name: Counter(registry, f'db_pool_{name}_total', help_text, ('bind',))
+    for name, help_text in [
+        ('checkouts', 'Connections checked out of the pool.'),
+        ('checkout_timeouts', 'Checkouts that gave up waiting for a connection.'),
+        ('connects', 'New DBAPI connections opened.'),
+        ('invalidations', 'Connections invalidated (e.g. after a disconnect).'),
+        ('pre_ping_failures', 'Pre-ping checks that found a dead connection.'),
+    ]
+}
+POOL_WAIT_SECONDS = Counter(registry, 'db_pool_checkout_wait_seconds_total',
+                            'Total time spent waiting for a pooled connection.', ('bind',))
+POOL_GAUGES = {
+    name: Gauge(registry, f'db_pool_{name}', help_text, ('bind',))
+    for name, help_text in [
+        ('size', 'Configured pool size.'),
+        ('checked_out', 'Connections currently in use.'),
+        ('overflow', 'Connections open beyond the pool size.'),
+    ]
+}
+
+# Query stats of the request being served on this thread/task, or None
+_current_request = contextvars.ContextVar('metrics_current_request', default=None)
+
+
+class _QueryStats:
+    __slots__ = ('count', 'seconds')
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+
+# --- SQLAlchemy events (registered once, for every engine) ---
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context.metrics_query_start = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current_request.get()
+    if stats is None or context is None:
+        return
+    stats.count += 1
+    stats.seconds += time.perf_counter() - context.metrics_query_start
+
+
+# --- Flask hooks ---
+
+def _before_request():
+    registry.start_flusher()
+    g.metrics_started = time.perf_counter()
+    g.metrics_queries = _QueryStats()
+    g.metrics_token = _current_request.set(g.metrics_queries)
+
+
+def _after_request(response):
+    started = g.pop('metrics_started', None)
+    if started is None:
+        return response
+    record_request(request.endpoint or 'unmatched', request.method, response, started, g.pop('metrics_queries'))
+    return response
+
+
+def _teardown_request(exc):
+    token = g.pop('metrics_token', None)
+    if token is not None:
+        _current_request.reset(token)
+
+
+# --- Requests served outside Flask (asgi.py's async views) ---
+
+@contextlib.contextmanager
+def track_queries():
+    """Counts the SQL run by this thread or asyncio task inside the block, like a Flask request's."""
+    registry.start_flusher()
+    queries = _QueryStats()
+    token = _current_request.set(queries)
+    try:
+        yield queries
+    finally:
+        _current_request.reset(token)
+
+
+def record_request(endpoint, method, response, started, queries):
+    """Records a finished request; started is its time.perf_counter() and queries its _QueryStats."""
+    REQUESTS.inc(endpoint=endpoint, method=method, status=response.status_code)
+    LATENCY.observe(time.perf_counter() - started, endpoint=endpoint)
+    if response.content_length is not None:
+        RESPONSE_SIZE.observe(response.content_length, endpoint=endpoint)
+
+    QUERIES_PER_REQUEST.observe(queries.count, endpoint=endpoint)
+    DB_TIME.observe(queries.seconds, endpoint=endpoint)
+    if queries.count:
+        QUERIES.inc(queries.count, endpoint=endpoint)
+
+
+def _collect_pool_metrics():
+    for bind, stats in pool_snapshot().items():
+        for name, counter in POOL_COUNTERS.items():
+            counter.set_total(stats[name], bind=bind)
+        POOL_WAIT_SECONDS.set_total(stats['checkout_wait_seconds_total'], bind=bind)
+        for name, gauge in POOL_GAUGES.items():
+            if name in stats:
+                gauge.set(stats[name], bind=bind)
+
+
+def init_app(app):
+    directory = app.config.get('METRICS_DIR') or os.path.join(tempfile.gettempdir(), 'contextwindow-metrics')
+    if app.config.get('METRICS_MULTIPROCESS', True):
+        registry.enable_multiprocess(directory, app.config.get('METRICS_FLUSH_INTERVAL', 5),
+                                     app.config.get('METRICS_RETENTION', 3600))
+    if _collect_pool_metrics not in registry.collectors:
+        registry.collectors.append(_collect_pool_metrics)
+
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
@@ -0,0 +1,137 @@
+# metrics/metrics_pool.py
+#
+# Connection pool instrumentation. The pool classes below time how long each
+# checkout waits for a connection; pool and engine events count checkouts,
+# timeouts, new connections, invalidations and failed pre-pings. Stats are
+# per process, as is the pool itself (each gunicorn worker has its own).
+
+import threading
+import time
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import NullPool, QueuePool
+
+# Upper bounds (seconds) of the checkout wait histogram buckets
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, float('inf'))
+
+
+class PoolStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.checkout_timeouts = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.pre_ping_failures = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.wait_buckets = [0] * len(WAIT_BUCKETS)
+
+    def record_wait(self, seconds):
+        with self._lock:
+            self.wait_seconds_total += seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+            for position, bound in enumerate(WAIT_BUCKETS):
+                if seconds <= bound:
+                    self.wait_buckets[position] += 1
+                    break
+
+    def increment(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+
+class _InstrumentedPoolMixin:
+    """Times _do_get(), i.e. the wait for a free (or new) connection."""
+
+    stats = None  # set by register_engines()
+
+    def _do_get(self):
+        if self.stats is None:
+            return super()._do_get()
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            self.stats.increment('checkout_timeouts')
+            raise
+        finally:
+            self.stats.record_wait(time.perf_counter() - start)
+
+    def recreate(self):
+        # engine.dispose() swaps in a fresh pool; keep counting into the same stats
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+
+class InstrumentedQueuePool(_InstrumentedPoolMixin, QueuePool):
+    pass
+
+
+class InstrumentedNullPool(_InstrumentedPoolMixin, NullPool):
+    pass
+
+
+# --- Registration ---
+
+_engines = {}
+
+
+def register_engines(engines):
+    """Starts collecting stats for the app's engines ({bind_key: engine})."""
+    for key, engine in engines.items():
+        name = key or 'default'
+        if _engines.get(name) is engine:
+            continue
+        _engines[name] = engine
+        stats = PoolStats()
+        engine.pool.stats = stats  # read by _InstrumentedPoolMixin._do_get
+
+        # Listeners on the pool instance survive engine.dispose() (recreate() reuses its dispatch)
+        event.listen(engine.pool, 'checkout', lambda *args, stats=stats: stats.increment('checkouts'))
+        event.listen(engine.pool, 'connect', lambda *args, stats=stats: stats.increment('connects'))
+        event.listen(engine.pool, 'invalidate', lambda *args, stats=stats: stats.increment('invalidations'))
+
+
+@event.listens_for(Engine, 'handle_error')
+def _on_engine_error(context):
+    # Failed pre-pings are reported through the dialect, without an engine attached
+    if not context.is_pre_ping:
+        return
+    for engine in _engines.values():
+        if engine.dialect is context.dialect:
+            engine.pool.stats.increment('pre_ping_failures')
+
+
+# --- Snapshot ---
+
+def pool_snapshot():
+    """Current gauges and counters for every registered pool, keyed by bind name."""
+    snapshot = {}
+    for name, engine in _engines.items():
+        pool = engine.pool
+        stats = getattr(pool, 'stats', None) or PoolStats()
+        entry = {
+            'pool_class': type(pool).__name__,
+            'checkouts': stats.checkouts,
+            'checkout_timeouts': stats.checkout_timeouts,
+            'connects': stats.connects,
+            'invalidations': stats.invalidations,
+            'pre_ping_failures': stats.pre_ping_failures,
+            'checkout_wait_seconds_total': stats.wait_seconds_total,
+            'checkout_wait_seconds_max': stats.wait_seconds_max,
+            'checkout_wait_buckets': {
+                ('+Inf' if bound == float('inf') else str(bound)): count
+                for bound, count in zip(WAIT_BUCKETS, stats.wait_buckets)
+            },
+        }
+        if isinstance(pool, QueuePool):
+            entry.update(
+                size=pool.size(),
+                checked_in=pool.checkedin(),
+                checked_out=pool.checkedout(),
+                overflow=max(pool.overflow(), 0),
+            )
+        snapshot[name] = entry
+    return snapshot
@@ -0,0 +1,411 @@
+# metrics/metrics_profiler.py
+#
+# On-demand sampling profiler for single requests.
+#
+# A request is profiled when either holds:
+# - it carries an "X-Profile: 1" header or a "_profile=1" query parameter,
+#   and comes from an admin (PROFILER_ADMIN_ROLE) or bears METRICS_TOKEN;
+# - it falls in the random PROFILER_SAMPLE_RATE fraction of requests.
+#
+# While a profiled request runs, one background thread per process reads its
+# stack from sys._current_frames() every PROFILER_INTERVAL seconds, with the
+# interpreter's switch interval lowered so samples aren't biased towards
+# code that releases the GIL. Profiling
+# ends when the response body is closed, so streamed pages are covered up to
+# their last chunk. The SQL statements the request ran, with timings, are
+# recorded alongside.
+#
+# Login pages are never profiled, and a profile records the route (e.g.
+# /login/<token>) and query parameter names rather than the URL, which can
+# carry login tokens.
+#
+# Each profile is a JSON file in PROFILER_DIR (mode 0700, files 0600),
+# shared by the workers on a host; only the newest PROFILER_MAX_PROFILES are
+# kept. The admin pages in metrics/metrics_routes.py list them and export
+# them as collapsed stacks (flamegraph.pl, speedscope) or speedscope JSON.
+#
+# With PROFILER_ENABLED off (the default) no hook or event listener is
+# installed, so requests pay nothing.
+
+import contextvars
+import glob
+import hmac
+import json
+import logging
+import os
+import random
+import stat
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from functools import partial
+from flask import current_app, g, request
+from flask_security import current_user
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+log = logging.getLogger(__name__)
+
+TRIGGER_HEADER = 'X-Profile'
+TRIGGER_ARG = '_profile'
+
+# The profile pages themselves, static files, and the login flow (whose URLs carry login tokens)
+_UNPROFILED_BLUEPRINTS = ('profiles.', 'assets.', 'security.')
+_UNPROFILED_ENDPOINTS = {'users.login', 'users.send_login_link', 'users.login_with_token'}
+
+# Profile of the request being served on this thread/task, or None
+_current_profile = contextvars.ContextVar('profiler_current_profile', default=None)
+
+
+def is_profiler_admin():
+    """True if the current request may trigger profiles and read them."""
+    token = current_app.config.get('METRICS_TOKEN')
+    if token:
+        supplied = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+        if supplied and hmac.compare_digest(supplied, token):
+            return True
+    return bool(current_user and current_user.is_authenticated
+                and current_user.has_role(current_app.config['PROFILER_ADMIN_ROLE']))
+
+
+class Profile:
+    """Stack samples and SQL statements of one request."""
+
+    def __init__(self, trigger, max_statements):
+        self.id = uuid.uuid4().hex[:12]
+        self.trigger = trigger
+        self.started_at = time.time()
+        self.start = self.last_sample = time.perf_counter()
+        self.frames = []      # [(code object)], by frame index
+        self._frame_ids = {}  # code object -> frame index
+        self.stacks = []      # unique stacks, as tuples of frame indexes from the root
+        self._stack_ids = {}
+        self.samples = []     # stack index per sample
+        self.weights = []     # seconds each sample stands for
+        self.queries = []
+        self.query_count = 0
+        self.query_seconds = 0.0
+        self.max_statements = max_statements
+
+    def add_sample(self, frame, now):
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            index = self._frame_ids.get(code)
+            if index is None:
+                index = self._frame_ids[code] = len(self.frames)
+                self.frames.append(code)
+            stack.append(index)
+            frame = frame.f_back
+        stack = tuple(reversed(stack))
+        stack_id = self._stack_ids.get(stack)
+        if stack_id is None:
+            stack_id = self._stack_ids[stack] = len(self.stacks)
+            self.stacks.append(stack)
+        self.samples.append(stack_id)
+        self.weights.append(now - self.last_sample)
+        self.last_sample = now
+
+    def add_query(self, statement, executemany, started, seconds):
+        self.query_count += 1
+        self.query_seconds += seconds
+        if len(self.queries) < self.max_statements:
+            self.queries.append({
+                'start_ms': round((started - self.start) * 1000, 3),
+                'duration_ms': round(seconds * 1000, 3),
+                'statement': statement,
+                'executemany': executemany,
+            })
+
+    def to_dict(self, root_path, **request_info):
+        return {
+            'id': self.id,
+            'pid': os.getpid(),
+            'trigger': self.trigger,
+            'started_at': datetime.fromtimestamp(self.started_at, timezone.utc).isoformat(),
+            'duration_ms': round((time.perf_counter() - self.start) * 1000, 3),
+            **request_info,
+            'frames': [{'name': code.co_qualname, 'file': _short_path(code.co_filename, root_path),
+                        'line': code.co_firstlineno} for code in self.frames],
+            'stacks': [list(stack) for stack in self.stacks],
+            'samples': self.samples,
+            'weights': [round(weight, 6) for weight in self.weights],
+            'sql': {
+                'count': self.query_count,
+                'ms': round(self.query_seconds * 1000, 3),
+                'statements': self.queries,
+            },
+        }
+
+
+def _short_path(filename, root_path):
+    if filename.startswith(root_path + os.sep):
+        return os.path.relpath(filename, root_path)
+    _, marker, rest = filename.rpartition('site-packages' + os.sep)
+    return rest if marker else filename
+
+
+class _Sampler:
+    """One background thread per process that samples the stacks of the threads being profiled."""
+
+    def __init__(self):
+        self.interval = 0.005
+        self._targets = {}  # thread id -> Profile
+        self._wakeup = threading.Event()
+        self._thread = None  # (pid, thread)
+        self._lock = threading.Lock()
+
+    def add(self, thread_id, profile):
+        self._start()
+        self._targets[thread_id] = profile
+        self._wakeup.set()
+
+    def remove(self, thread_id):
+        self._targets.pop(thread_id, None)
+
+    def _start(self):
+        pid = os.getpid()
+        if self._thread is not None and self._thread[0] == pid:
+            return
+        with self._lock:
+            if self._thread is not None and self._thread[0] == pid:
+                return
+            thread = threading.Thread(target=self._run, name='profiler-sampler', daemon=True)
+            self._thread = (pid, thread)
+            thread.start()
+
+    def _run(self):
+        switch_interval = None  # the interpreter's own, while lowered
+        while True:
+            if not self._targets:
+                if switch_interval is not None:
+                    sys.setswitchinterval(switch_interval)
+                    switch_interval = None
+                self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+            if switch_interval is None:
+                # The sampler needs the GIL to read a stack. At the default 5 ms switch interval it mostly
+                # gets it when the request releases it for I/O, so every sample lands in a database call.
+                switch_interval = sys.getswitchinterval()
+                sys.setswitchinterval(min(switch_interval, self.interval / 10))
+            time.sleep(self.interval)
+            now = time.perf_counter()
+            frames = sys._current_frames()
+            for thread_id, profile in list(self._targets.items()):
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    profile.add_sample(frame, now)
+            frames = frame = None  # don't keep the sampled threads' frames alive until the next round
+
+
+# --- SQL capture (registered only when the profiler is enabled) ---
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and _current_profile.get() is not None:
+        context.profiler_query_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current_profile.get()
+    started = getattr(context, 'profiler_query_start', None)
+    if profile is not None and started is not None:
+        profile.add_query(statement, executemany, started, time.perf_counter() - started)
+
+
+class Profiler:
+    def __init__(self, app=None):
+        self.app = None
+        self.sampler = _Sampler()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('PROFILER_ENABLED', False)
+        app.config.setdefault('PROFILER_SAMPLE_RATE', 0.0)
+        app.config.setdefault('PROFILER_INTERVAL', 0.005)
+        app.config.setdefault('PROFILER_DIR', None)
+        app.config.setdefault('PROFILER_MAX_PROFILES', 50)
+        app.config.setdefault('PROFILER_MAX_STATEMENTS', 500)
+        app.config.setdefault('PROFILER_ADMIN_ROLE', 'admin')
+        self.app = app
+        app.extensions['profiler'] = self
+        if not app.config['PROFILER_ENABLED']:
+            return
+
+        self.sampler.interval = app.config['PROFILER_INTERVAL']
+        if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+
+    @property
+    def directory(self):
+        return self.app.config['PROFILER_DIR'] or os.path.join(tempfile.gettempdir(), 'contextwindow-profiles')
+
+    # --- Request hooks ---
+
+    def _trigger(self):
+        endpoint = request.endpoint or ''
+        if endpoint.startswith(_UNPROFILED_BLUEPRINTS) or endpoint in _UNPROFILED_ENDPOINTS:
+            return None
+        if request.headers.get(TRIGGER_HEADER) or request.args.get(TRIGGER_ARG):
+            if is_profiler_admin():
+                return 'requested'
+        rate = self.app.config['PROFILER_SAMPLE_RATE']
+        if rate > 0 and random.random() < rate:
+            return 'sampled'
+        return None
+
+    def _before_request(self):
+        trigger = self._trigger()
+        if trigger is None:
+            return
+        profile = Profile(trigger, self.app.config['PROFILER_MAX_STATEMENTS'])
+        g.profile = (profile, _current_profile.set(profile), threading.get_ident())
+        self.sampler.add(threading.get_ident(), profile)
+
+    def _after_request(self, response):
+        active = g.pop('profile', None)
+        if active is None:
+            return response
+        response.headers['X-Profile-Id'] = active[0].id
+        # Streamed bodies are still being produced; stop when the server closes the response
+        response.call_on_close(partial(self._finish, *active, status=response.status_code, **self._request_info()))
+        return response
+
+    def _teardown_request(self, exc):
+        active = g.pop('profile', None)
+        if active is not None:  # no response was made
+            self._finish(*active, status=500, **self._request_info())
+
+    @staticmethod
+    def _request_info():
+        # The route and the names of the query parameters, not their values: URLs can carry secrets
+        path = request.url_rule.rule if request.url_rule is not None else '<unmatched>'
+        if request.args:
+            path += '?' + '&'.join(sorted(set(request.args)))
+        return {'method': request.method, 'path': path, 'endpoint': request.endpoint}
+
+    def _finish(self, profile, token, thread_id, **request_info):
+        self.sampler.remove(thread_id)
+        try:
+            _current_profile.reset(token)
+        except ValueError:  # closed from another context
+            _current_profile.set(None)
+        try:
+            self.save(profile.to_dict(self.app.root_path, **request_info))
+        except Exception:
+            log.exception("Failed to save profile %s.", profile.id)
+
+    # --- Storage ---
+
+    def save(self, document):
+        self._make_directory()
+        started = int(time.time() * 1000)
+        path = os.path.join(self.directory, f"{started:013d}-{document['id']}.json")
+        temporary = f'{path}.{os.getpid()}.tmp'
+        with os.fdopen(os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w') as f:
+            json.dump(document, f, separators=(',', ':'))
+        os.replace(temporary, path)
+        for old in self._paths()[self.app.config['PROFILER_MAX_PROFILES']:]:
+            try:
+                os.remove(old)
+            except FileNotFoundError:
+                pass  # pruned by another worker
+        log.info("Saved profile %s (%s ms, %s samples).",
+                 document['id'], document['duration_ms'], len(document['samples']))
+
+    def _make_directory(self):
+        """Creates PROFILER_DIR readable by this user only; profiles show code, SQL and routes."""
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        if stat.S_IMODE(os.stat(self.directory).st_mode) & 0o077:
+            os.chmod(self.directory, 0o700)  # created before, or by an older version
+
+    def _paths(self):
+        """Profile files, newest first."""
+        return sorted(glob.glob(os.path.join(self.directory, '*.json')), reverse=True)
+
+    def recent(self):
+        """Summaries of the stored profiles, newest first."""
+        summaries = []
+        for path in self._paths():
+            try:
+                with open(path) as f:
+                    document = json.load(f)
+            except (OSError, ValueError):
+                continue
+            summaries.append({key: document.get(key) for key in (
+                'id', 'pid', 'trigger', 'started_at', 'duration_ms', 'method', 'path', 'endpoint', 'status')}
+                | {'samples': len(document.get('samples', ())), 'sql': {
+                    key: document.get('sql', {}).get(key) for key in ('count', 'ms')}})
+        return summaries
+
+    def load(self, profile_id):
+        if not profile_id.isalnum():
+            return None
+        for path in glob.glob(os.path.join(self.directory, f'*-{profile_id}.json')):
+            with open(path) as f:
+                return json.load(f)
+        return None
+
+
+# --- Export formats ---
+
+def _frame_label(frame):
+    return f"{frame['name']} ({frame['file']}:{frame['line']})"
+
+
+def to_collapsed(document):
+    """Brendan Gregg's collapsed stacks: 'root;...;leaf <microseconds>' per line."""
+    totals = {}
+    for stack_id, weight in zip(document['samples'], document['weights']):
+        totals[stack_id] = totals.get(stack_id, 0) + weight
+    labels = [_frame_label(frame).replace(';', ':') for frame in document['frames']]
+    lines = []
+    for stack_id, seconds in sorted(totals.items()):
+        stack = ';'.join(labels[index] for index in document['stacks'][stack_id])
+        lines.append(f"{stack} {max(1, round(seconds * 1_000_000))}")
+    return '\n'.join(lines) + '\n'
+
+
+def to_speedscope(document):
+    """A speedscope 'sampled' profile (https://www.speedscope.app/file-format-schema.json)."""
+    name = f"{document.get('method')} {document.get('path')} ({document['id']})"
+    return {
+        '$schema': 'https://www.speedscope.app/file-format-schema.json',
+        'name': name,
+        'exporter': 'contextwindow-profiler',
+        'shared': {'frames': document['frames']},
+        'profiles': [{
+            'type': 'sampled',
+            'name': name,
+            'unit': 'seconds',
+            'startValue': 0,
+            'endValue': round(sum(document['weights']), 6),
+            'samples': [document['stacks'][stack_id] for stack_id in document['samples']],
+            'weights': document['weights'],
+        }],
+    }
+
+
+def top_functions(document, limit=25):
+    """[(label, self_seconds, total_seconds)] for the functions with the most self time."""
+    self_time, total_time = {}, {}
+    for stack_id, weight in zip(document['samples'], document['weights']):
+        stack = document['stacks'][stack_id]
+        if not stack:
+            continue
+        self_time[stack[-1]] = self_time.get(stack[-1], 0) + weight
+        for index in set(stack):
+            total_time[index] = total_time.get(index, 0) + weight
+    ranked = sorted(self_time.items(), key=lambda item: item[1], reverse=True)[:limit]
+    return [(_frame_label(document['frames'][index]), seconds, total_time[index]) for index, seconds in ranked]
+
+
+profiler = Profiler()
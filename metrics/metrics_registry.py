@@ -0,0 +1,274 @@
+# metrics/metrics_registry.py
+#
+# A small, dependency-free metrics registry with Prometheus text exposition.
+#
+# Every gunicorn worker keeps its own counters in memory and a background
+# thread writes them to METRICS_DIR/<pid>-<start>.json every few seconds
+# (write to a temp file, then rename, so readers never see half a file).
+# /metrics merges the files of all workers: counters and histograms are
+# summed, gauges are reported per worker (label pid) and only for workers
+# whose file is still being refreshed. The file of a worker that has exited
+# is kept for METRICS_RETENTION seconds and then deleted; its counts leave
+# the totals then, which Prometheus treats as a counter reset.
+
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, registry, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+        registry.register(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def samples(self):
+        with self._lock:
+            return [[list(key), value] for key, value in self._values.items()]
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set_total(self, value, **labels):
+        """Mirrors a cumulative count that is kept elsewhere (e.g. pool stats)."""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, registry, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        super().__init__(registry, name, documentation, labelnames)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                # per-bucket counts (not cumulative), then sum and count
+                entry = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for position, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[position] += 1
+                    break
+            entry[-2] += value
+            entry[-1] += 1
+
+    def samples(self):
+        with self._lock:
+            return [[list(key), list(value)] for key, value in self._values.items()]
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self.collectors = []  # callables run before each snapshot (e.g. to refresh gauges)
+        self.directory = None
+        self.retention = None
+        self._file = None
+        self._flusher = None
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+
+    def snapshot(self):
+        for collect in self.collectors:
+            collect()
+        return {
+            name: {
+                'kind': metric.kind,
+                'help': metric.documentation,
+                'labels': list(metric.labelnames),
+                'buckets': list(getattr(metric, 'buckets', ())),
+                'samples': metric.samples(),
+            }
+            for name, metric in self.metrics.items()
+        }
+
+    # --- Multi-process support ---
+
+    def enable_multiprocess(self, directory, interval, retention=3600):
+        self.directory = directory
+        self.interval = interval
+        self.retention = retention
+        os.makedirs(directory, exist_ok=True)
+
+    def start_flusher(self):
+        """Starts the background writer for this process (idempotent, fork-aware)."""
+        if self.directory is None:
+            return
+        pid = os.getpid()
+        if self._flusher is not None and self._flusher[0] == pid:
+            return
+        with self._lock:
+            if self._flusher is not None and self._flusher[0] == pid:
+                return
+            self._file = os.path.join(self.directory, f'{pid}-{int(time.time())}.json')
+            thread = threading.Thread(target=self._flush_loop, name='metrics-flusher', daemon=True)
+            self._flusher = (pid, thread)
+            thread.start()
+
+    def _flush_loop(self):
+        while True:
+            try:
+                self.flush()
+            except OSError:
+                pass  # try again next round; /metrics just sees older numbers
+            time.sleep(self.interval)
+
+    def flush(self):
+        if self._file is None:
+            return
+        # The flusher thread and /metrics (collect_all) both flush: one at a time, so an older
+        # snapshot never replaces a newer one, each through its own temp file
+        with self._lock:
+            descriptor, temporary = tempfile.mkstemp(
+                dir=self.directory, prefix=f'{os.path.basename(self._file)}.', suffix='.tmp')
+            try:
+                with os.fdopen(descriptor, 'w') as f:
+                    json.dump({'pid': os.getpid(), 'metrics': self.snapshot()}, f)
+                os.replace(temporary, self._file)
+            except BaseException:
+                os.unlink(temporary)
+                raise
+
+    def collect_all(self):
+        """Snapshots of every live worker (or just this process without METRICS_DIR)."""
+        if self.directory is None:
+            return [{'pid': os.getpid(), 'live': True, 'metrics': self.snapshot()}]
+        self.flush()
+        stale_after = self.interval * 3
+        now = time.time()
+        snapshots = []
+        for path in glob.glob(os.path.join(self.directory, '*.json')):
+            try:
+                with open(path) as f:
+                    data = json.load(f)
+                age = now - os.path.getmtime(path)
+            except (OSError, ValueError):
+                continue  # a worker is replacing its file right now
+            if age > self.retention and not _process_alive(data.get('pid')):
+                _remove(path)
+                continue
+            data['live'] = age <= stale_after
+            snapshots.append(data)
+        for path in glob.glob(os.path.join(self.directory, '*.tmp')):
+            # Left behind by a worker killed mid-write
+            try:
+                if now - os.path.getmtime(path) > self.retention:
+                    _remove(path)
+            except OSError:
+                continue
+        return snapshots
+
+
+def _process_alive(pid):
+    """Whether a process with this pid exists on this host."""
+    if not isinstance(pid, int) or pid <= 0:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # exists, owned by someone else
+    return True
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass  # another worker pruned it first
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_bound(bound):
+    return '+Inf' if bound == float('inf') else repr(float(bound))
+
+
+def render_prometheus(snapshots):
+    """Merges per-worker snapshots into Prometheus text exposition format."""
+    merged = {}
+    for snapshot in snapshots:
+        for name, metric in snapshot['metrics'].items():
+            target = merged.setdefault(name, {**metric, 'samples': {}})
+            for label_values, value in metric['samples']:
+                if metric['kind'] == 'gauge':
+                    if not snapshot['live']:
+                        continue
+                    key = (*label_values, str(snapshot['pid']))
+                    target['samples'][key] = value
+                elif metric['kind'] == 'counter':
+                    key = tuple(label_values)
+                    target['samples'][key] = target['samples'].get(key, 0) + value
+                else:
+                    key = tuple(label_values)
+                    existing = target['samples'].get(key)
+                    target['samples'][key] = value if existing is None else [a + b for a, b in zip(existing, value)]
+
+    lines = []
+    for name, metric in sorted(merged.items()):
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['kind']}")
+        labelnames = metric['labels']
+        for key, value in sorted(metric['samples'].items()):
+            if metric['kind'] == 'gauge':
+                lines.append(f'{name}{_format_labels([*labelnames, "pid"], key)} {value}')
+            elif metric['kind'] == 'counter':
+                lines.append(f'{name}{_format_labels(labelnames, key)} {value}')
+            else:
+                cumulative = 0
+                for bound, count in zip([*metric['buckets'], float('inf')], [*value[:-2], 0]):
+                    cumulative += count
+                    if bound == float('inf'):
+                        cumulative = value[-1]
+                    lines.append(f'{name}_bucket{_format_labels(labelnames, key, [("le", _format_bound(bound))])} {cumulative}')
+                lines.append(f'{name}_sum{_format_labels(labelnames, key)} {value[-2]}')
+                lines.append(f'{name}_count{_format_labels(labelnames, key)} {value[-1]}')
+    return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
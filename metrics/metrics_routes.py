@@ -0,0 +1,87 @@
+# metrics/metrics_routes.py
+
+import hmac
+import os
+from flask import Blueprint, Response, jsonify, request, current_app, abort, render_template
+from .metrics_pool import pool_snapshot
+from .metrics_profiler import profiler, is_profiler_admin, to_collapsed, to_speedscope, top_functions
+from .metrics_registry import registry, render_prometheus
+
+metrics_bp = Blueprint('metrics', __name__)
+# Separate from metrics_bp so admins can reach it with their login session, not only the token
+profiles_bp = Blueprint('profiles', __name__)
+
+
+@metrics_bp.before_request
+def require_metrics_token():
+    token = current_app.config.get('METRICS_TOKEN')
+    if not token:
+        return
+    supplied = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+    if not hmac.compare_digest(supplied, token):
+        abort(401)
+
+
+@metrics_bp.route('/metrics/db-pool')
+def db_pool():
+    """Connection pool gauges and counters for the worker that serves the request."""
+    return jsonify(pid=os.getpid(), pools=pool_snapshot())
+
+
+@metrics_bp.route('/metrics')
+def prometheus():
+    """Prometheus text exposition, merged across all gunicorn workers."""
+    return Response(render_prometheus(registry.collect_all()),
+                    mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+
+@profiles_bp.before_request
+def require_profiler_admin():
+    if not is_profiler_admin():
+        abort(403)
+
+
+@profiles_bp.route('/admin/profiles')
+def list_profiles():
+    """Recent request profiles from every worker on this host."""
+    profiles = profiler.recent()
+    if request.args.get('format') == 'json':
+        return jsonify(enabled=current_app.config['PROFILER_ENABLED'], profiles=profiles)
+    return render_template('metrics/metrics_profiles.html', profiles=profiles,
+                           enabled=current_app.config['PROFILER_ENABLED'],
+                           sample_rate=current_app.config['PROFILER_SAMPLE_RATE'])
+
+
+@profiles_bp.route('/admin/profiles/<profile_id>')
+def show_profile(profile_id):
+    profile = profiler.load(profile_id)
+    if profile is None:
+        abort(404)
+    return render_template('metrics/metrics_profile.html', profile=profile, top=top_functions(profile))
+
+
+@profiles_bp.route('/admin/profiles/<profile_id>.speedscope.json')
+def profile_speedscope(profile_id):
+    profile = profiler.load(profile_id)
+    if profile is None:
+        abort(404)
+    response = jsonify(to_speedscope(profile))
+    response.headers['Content-Disposition'] = f'attachment; filename={profile_id}.speedscope.json'
+    return response
+
+
+@profiles_bp.route('/admin/profiles/<profile_id>.collapsed.txt')
+def profile_collapsed(profile_id):
+    profile = profiler.load(profile_id)
+    if profile is None:
+        abort(404)
+    return Response(to_collapsed(profile), mimetype='text/plain',
+                    headers={'Content-Disposition': f'attachment; filename={profile_id}.collapsed.txt'})
+
+
+@profiles_bp.route('/admin/profiles/<profile_id>.sql.json')
+def profile_sql(profile_id):
+    profile = profiler.load(profile_id)
+    if profile is None:
+        abort(404)
+    return jsonify(id=profile_id, **profile['sql'])
@@ -0,0 +1,34 @@
+from datetime import datetime
+from projects.projects_model import db
+
+class OutboxMessage(db.Model):
+    __tablename__ = 'mail_outbox'
+    __table_args__ = (
+        # Workers claim due messages with: status IN (...) AND next_attempt_at <= now ORDER BY id
+        db.Index('ix_mail_outbox_status_next_attempt', 'status', 'next_attempt_at'),
+    )
+
+    STATUS_PENDING = 'pending'
+    STATUS_SENDING = 'sending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+
+    id = db.Column(db.Integer, primary_key=True)
+    subject = db.Column(db.Text, nullable=False)
+    sender = db.Column(db.String(255), nullable=False)
+    recipients = db.Column(db.Text, nullable=False)  # newline-separated addresses
+    body = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(16), default=STATUS_PENDING, nullable=False)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    claim_token = db.Column(db.String(32))  # set by the worker that claimed the row
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    sent_at = db.Column(db.DateTime)
+
+    @property
+    def recipient_list(self):
+        return [address for address in self.recipients.split('\n') if address]
+
+    def __repr__(self):
+        return f'<OutboxMessage {self.id} {self.status}>'
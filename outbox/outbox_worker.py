@@ -0,0 +1,311 @@
+# outbox/outbox_worker.py
+#
+# Background dispatch for outbound mail. Requests only insert a row into the
+# mail_outbox table; a small pool of worker threads claims due rows in batches
+# and sends them over one SMTP connection per worker, retrying failures with
+# exponential backoff.
+#
+# Run standalone (e.g. as a separate Cloud Run job) with:
+#     python -m outbox.outbox_worker [--workers N]
+# The standalone process starts MAIL_OUTBOX_STANDALONE_WORKERS threads (or
+# --workers) whatever MAIL_OUTBOX_WORKERS says, so the web processes and the
+# worker can share one environment with MAIL_OUTBOX_WORKERS=0.
+
+import logging
+import random
+import smtplib
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from flask import current_app
+from flask_mail import Message
+from sqlalchemy import case, insert
+from projects.projects_model import db
+from .outbox_model import OutboxMessage
+
+log = logging.getLogger(__name__)
+
+
+def enqueue_message(subject, sender, recipients, body):
+    """Stores a message in the outbox, commits, and wakes the local workers."""
+    message = OutboxMessage(
+        subject=subject,
+        sender=sender,
+        recipients='\n'.join(recipients),
+        body=body,
+    )
+    db.session.add(message)
+    db.session.commit()
+
+    pool = current_app.extensions.get('outbox')
+    if pool is not None:
+        pool.notify()
+    return message
+
+
+def enqueue_messages(messages):
+    """
+    Stores many messages (dicts of enqueue_message's arguments) with one
+    executemany INSERT, commits along with anything else pending in the
+    session, and wakes the local workers.
+    """
+    if messages:
+        db.session.execute(insert(OutboxMessage), [
+            dict(message, recipients='\n'.join(message['recipients'])) for message in messages
+        ])
+    db.session.commit()
+
+    pool = current_app.extensions.get('outbox')
+    if pool is not None and messages:
+        pool.notify()
+
+
+class OutboxWorkerPool:
+    """Flask extension owning the outbox worker threads for this process."""
+
+    def __init__(self, mail, app=None):
+        self.mail = mail
+        self.app = None
+        self._threads = []
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._start_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.config.setdefault('MAIL_OUTBOX_WORKERS', 2)
+        app.config.setdefault('MAIL_OUTBOX_STANDALONE_WORKERS', 2)
+        app.config.setdefault('MAIL_OUTBOX_BATCH_SIZE', 20)
+        app.config.setdefault('MAIL_OUTBOX_POLL_INTERVAL', 2.0)
+        app.config.setdefault('MAIL_OUTBOX_IDLE_TIMEOUT', 60.0)
+        app.config.setdefault('MAIL_OUTBOX_LEASE_SECONDS', 300)
+        app.config.setdefault('MAIL_OUTBOX_MAX_ATTEMPTS', 6)
+        app.config.setdefault('MAIL_OUTBOX_BACKOFF_BASE', 30)
+        app.config.setdefault('MAIL_OUTBOX_BACKOFF_MAX', 3600)
+        app.extensions['outbox'] = self
+        # Threads are started on the first request rather than at import time,
+        # so nothing is running yet if the process is forked after import.
+        app.before_request(self.start)
+
+    # --- Lifecycle ---
+
+    def start(self, workers=None):
+        """Starts the worker threads: MAIL_OUTBOX_WORKERS of them, unless workers is given."""
+        if workers is None:
+            workers = self.app.config['MAIL_OUTBOX_WORKERS']
+        if self._threads or workers <= 0:
+            return
+        with self._start_lock:
+            if self._threads:
+                return
+            for number in range(workers):
+                thread = threading.Thread(
+                    target=self._run, name=f'outbox-worker-{number}', daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout=10):
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        self._stopping.clear()
+
+    def notify(self):
+        self._wakeup.set()
+
+    def run_forever(self, workers=None):
+        """Runs the workers in the foreground until interrupted (MAIL_OUTBOX_STANDALONE_WORKERS by default)."""
+        if workers is None:
+            workers = self.app.config['MAIL_OUTBOX_STANDALONE_WORKERS']
+        if workers <= 0:
+            raise ValueError("The standalone outbox worker needs at least one worker thread.")
+        self.start(workers)
+        try:
+            while any(thread.is_alive() for thread in self._threads):
+                time.sleep(1)
+        except KeyboardInterrupt:
+            self.stop()
+
+    # --- Worker loop ---
+
+    def _run(self):
+        config = self.app.config
+        connect_failures = 0
+        while not self._stopping.is_set():
+            self._wakeup.wait(config['MAIL_OUTBOX_POLL_INTERVAL'])
+            self._wakeup.clear()
+            if self._stopping.is_set():
+                break
+            with self.app.app_context():
+                try:
+                    self._drain()
+                    connect_failures = 0
+                except OSError as e:  # includes smtplib.SMTPException
+                    # Back off while the SMTP server is unreachable; queued rows stay pending
+                    connect_failures += 1
+                    delay = min(config['MAIL_OUTBOX_POLL_INTERVAL'] * 2 ** connect_failures,
+                                config['MAIL_OUTBOX_BACKOFF_MAX'])
+                    log.warning("Outbox: SMTP connection failed, retrying in %.0fs: %s", delay, e)
+                    self._stopping.wait(delay)
+                except Exception:
+                    log.exception("Outbox: worker iteration failed")
+                    db.session.rollback()
+                finally:
+                    db.session.remove()
+
+    def _drain(self):
+        """Sends due messages over a single SMTP connection until idle."""
+        config = self.app.config
+        if not self._claim_batch(peek=True):
+            return
+        with self.mail.connect() as connection:
+            idle_since = time.monotonic()
+            while not self._stopping.is_set():
+                batch = self._claim_batch()
+                if batch:
+                    self._send_batch(connection, batch)
+                    idle_since = time.monotonic()
+                    continue
+                if time.monotonic() - idle_since >= config['MAIL_OUTBOX_IDLE_TIMEOUT']:
+                    break
+                # Keep the connection open briefly in case more mail arrives
+                self._wakeup.wait(config['MAIL_OUTBOX_POLL_INTERVAL'])
+                self._wakeup.clear()
+
+    def _claim_batch(self, peek=False):
+        """
+        Claims up to MAIL_OUTBOX_BATCH_SIZE due messages for this worker.
+
+        Claimed rows move to 'sending' with a lease; if the worker dies before
+        finishing, the lease expires and another worker picks them up again.
+        That re-claim counts as a failed attempt, so a message that keeps
+        killing or hanging its worker is given up on after
+        MAIL_OUTBOX_MAX_ATTEMPTS like any other.
+        """
+        config = self.app.config
+        now = datetime.utcnow()
+        query = (
+            OutboxMessage.query
+            .filter(OutboxMessage.status.in_([OutboxMessage.STATUS_PENDING, OutboxMessage.STATUS_SENDING]))
+            .filter(OutboxMessage.next_attempt_at <= now)
+        )
+        if peek:
+            found = db.session.query(query.exists()).scalar()
+            db.session.rollback()
+            return found
+
+        candidate_ids = [
+            row.id for row in
+            query.with_entities(OutboxMessage.id)
+            .order_by(OutboxMessage.id)
+            .limit(config['MAIL_OUTBOX_BATCH_SIZE'])
+            .with_for_update(skip_locked=True)
+        ]
+        if not candidate_ids:
+            db.session.rollback()
+            return []
+
+        # Conditional update, so two workers can never both claim a row even on
+        # databases without SKIP LOCKED (SQLite): only one UPDATE matches it.
+        claim_token = uuid.uuid4().hex
+        lease_until = now + timedelta(seconds=config['MAIL_OUTBOX_LEASE_SECONDS'])
+        query.filter(OutboxMessage.id.in_(candidate_ids)).update(
+            {
+                OutboxMessage.status: OutboxMessage.STATUS_SENDING,
+                OutboxMessage.next_attempt_at: lease_until,
+                OutboxMessage.claim_token: claim_token,
+                # Still 'sending' means the lease expired: the last attempt never finished
+                OutboxMessage.attempts: case(
+                    (OutboxMessage.status == OutboxMessage.STATUS_SENDING, OutboxMessage.attempts + 1),
+                    else_=OutboxMessage.attempts,
+                ),
+            },
+            synchronize_session=False,
+        )
+        db.session.commit()
+        claimed = (
+            OutboxMessage.query
+            .filter(OutboxMessage.id.in_(candidate_ids), OutboxMessage.claim_token == claim_token)
+            .order_by(OutboxMessage.id)
+            .all()
+        )
+        exhausted = [message for message in claimed if message.attempts >= config['MAIL_OUTBOX_MAX_ATTEMPTS']]
+        if not exhausted:
+            return claimed
+        for message in exhausted:
+            message.status = OutboxMessage.STATUS_FAILED
+            message.last_error = "lease expired: the worker sending it died or hung"
+            log.error("Outbox: giving up on message %s after %s attempts: %s",
+                      message.id, message.attempts, message.last_error)
+        db.session.commit()
+        return [message for message in claimed if message.status == OutboxMessage.STATUS_SENDING]
+
+    def _send_batch(self, connection, batch):
+        for position, message in enumerate(batch):
+            try:
+                connection.send(Message(
+                    message.subject,
+                    sender=message.sender,
+                    recipients=message.recipient_list,
+                    body=message.body,
+                ))
+            except smtplib.SMTPServerDisconnected as e:
+                self._abandon_batch(batch, position, e)
+                raise
+            except smtplib.SMTPException as e:
+                # Rejected by the server (bad recipient, throttling, ...): retry
+                # this message later, keep using the connection for the rest.
+                self._schedule_retry(message, e)
+            except OSError as e:
+                self._abandon_batch(batch, position, e)
+                raise
+            except Exception as e:
+                self._schedule_retry(message, e)
+            else:
+                message.status = OutboxMessage.STATUS_SENT
+                message.sent_at = datetime.utcnow()
+                message.attempts += 1
+                message.last_error = None
+            db.session.commit()
+
+    def _abandon_batch(self, batch, position, error):
+        """The connection is gone: reschedule the failed message and release the rest."""
+        self._schedule_retry(batch[position], error)
+        for unsent in batch[position + 1:]:
+            unsent.status = OutboxMessage.STATUS_PENDING
+            unsent.next_attempt_at = datetime.utcnow()
+        db.session.commit()
+
+    def _schedule_retry(self, message, error):
+        config = self.app.config
+        message.attempts += 1
+        message.last_error = repr(error)
+        if message.attempts >= config['MAIL_OUTBOX_MAX_ATTEMPTS']:
+            message.status = OutboxMessage.STATUS_FAILED
+            log.error("Outbox: giving up on message %s after %s attempts: %r",
+                      message.id, message.attempts, error)
+            return
+        delay = min(config['MAIL_OUTBOX_BACKOFF_BASE'] * 2 ** (message.attempts - 1),
+                    config['MAIL_OUTBOX_BACKOFF_MAX'])
+        # Jitter spreads retries out when many messages failed at once
+        delay *= random.uniform(0.8, 1.2)
+        message.status = OutboxMessage.STATUS_PENDING
+        message.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+        log.warning("Outbox: message %s failed (attempt %s), retrying in %.0fs: %r",
+                    message.id, message.attempts, delay, error)
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Send queued mail from the outbox until interrupted.")
+    parser.add_argument('--workers', type=int, help="worker threads (default: MAIL_OUTBOX_STANDALONE_WORKERS)")
+    args = parser.parse_args()
+    from main import app
+    log.info("Outbox: starting standalone worker.")
+    app.extensions['outbox'].run_forever(args.workers)
@@ -0,0 +1,32 @@
+# projects/projects_async.py
+#
+# Event-loop versions of the project listing views, for the ASGI server
+# (see utils/async_views.py). Keep them in step with projects_routes.py.
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import defer
+from utils.async_views import async_view
+from utils.pagination import keyset_page_async, page_size_from
+from .projects_model import Project
+from .projects_routes import _project_to_dict
+
+
+async def _projects_last_modified(session):
+    return await session.scalar(select(func.max(Project.updated_at)))
+
+
+@async_view('/api/projects', 'projects.index_json', 'projects', last_modified=_projects_last_modified)
+async def index_json(request, session, config):
+    page = await keyset_page_async(
+        session,
+        select(Project).options(defer(Project.background)),
+        Project.created_at,
+        Project.id,
+        cursor=request.args.get('cursor'),
+        page_size=page_size_from(request.args, config, 'PROJECTS_PAGE_SIZE'),
+    )
+    return dict(
+        projects=[_project_to_dict(project) for project in page.items],
+        next_cursor=page.next_cursor,
+        page_size=page.page_size,
+    )
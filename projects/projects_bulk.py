@@ -0,0 +1,197 @@
+# projects/projects_bulk.py
+#
+# Streaming bulk import and export of projects (CSV or NDJSON). Both sides
+# work row by row, so memory use does not grow with the size of the file or
+# of the table.
+
+import csv
+import io
+import json
+from datetime import datetime
+from sqlalchemy import insert, select
+from .projects_model import db, Project
+
+FORMATS = ('csv', 'ndjson')
+FIELDS = ['name', 'short_description', 'background', 'start_date', 'end_date']
+EXPORT_FIELDS = ['id', *FIELDS, 'created_at', 'updated_at']
+DATE_FORMAT = '%Y-%m-%d'
+MAX_REPORTED_ERRORS = 100
+
+
+def detect_format(filename=None, content_type=None, requested=None):
+    if requested:
+        return requested if requested in FORMATS else None
+    if filename:
+        if filename.lower().endswith('.csv'):
+            return 'csv'
+        if filename.lower().endswith(('.ndjson', '.jsonl')):
+            return 'ndjson'
+    if content_type:
+        if 'csv' in content_type:
+            return 'csv'
+        if 'ndjson' in content_type or 'jsonl' in content_type:
+            return 'ndjson'
+    return None
+
+
+def iter_rows(binary_stream, fmt):
+    """Yields (line_number, dict) pairs from an uploaded file without reading it whole."""
+    text = io.TextIOWrapper(binary_stream, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        for line_number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield line_number, ValueError(f"invalid JSON: {e}")
+                continue
+            yield line_number, row if isinstance(row, dict) else ValueError("expected a JSON object")
+
+
+class UnreadableUpload(ValueError):
+    """The upload stopped being readable part way; chunks before that point were already imported."""
+
+    def __init__(self, message, inserted, errors, error_count):
+        super().__init__(message)
+        self.inserted = inserted
+        self.errors = errors
+        self.error_count = error_count
+
+
+def _parse_date(value):
+    if value in (None, ''):
+        return None
+    if not isinstance(value, str):
+        raise TypeError(value)
+    return datetime.strptime(value, DATE_FORMAT)
+
+
+def _text(row, field):
+    """The field as a string or None; raises ValueError for other JSON types (numbers, objects, lists)."""
+    value = row.get(field)
+    if value is None or value == '':
+        return None
+    if not isinstance(value, str):
+        raise ValueError(f"{field} must be a string")
+    if '\x00' in value:
+        raise ValueError(f"{field} contains a NUL character")
+    return value
+
+
+def _validate_chunk(chunk, errors):
+    """Turns a chunk of raw rows into insert parameters, recording rejected rows in errors."""
+    valid = []
+    for line_number, row in chunk:
+        if isinstance(row, Exception):
+            errors.append((line_number, str(row)))
+            continue
+        try:
+            name = (_text(row, 'name') or '').strip()
+            short_description = _text(row, 'short_description')
+            background = _text(row, 'background')
+        except ValueError as e:
+            errors.append((line_number, str(e)))
+            continue
+        if not name:
+            errors.append((line_number, "name is required"))
+            continue
+        try:
+            start_date = _parse_date(row.get('start_date'))
+            end_date = _parse_date(row.get('end_date'))
+        except (TypeError, ValueError):
+            errors.append((line_number, "dates must be YYYY-MM-DD"))
+            continue
+        if start_date and end_date and end_date < start_date:
+            errors.append((line_number, "end_date is before start_date"))
+            continue
+        valid.append({
+            'name': name,
+            'short_description': short_description,
+            'background': background,
+            'start_date': start_date,
+            'end_date': end_date,
+        })
+    return valid
+
+
+def import_projects(rows, chunk_size=1000):
+    """
+    Inserts rows in chunks of chunk_size: one executemany INSERT and one
+    transaction per chunk. Invalid rows are skipped and reported.
+
+    Returns (inserted_count, errors, error_count), where errors holds at most
+    MAX_REPORTED_ERRORS (line_number, message) pairs. Raises UnreadableUpload
+    if the upload turns out not to be UTF-8 part way through.
+    """
+    inserted = 0
+    errors = []
+    error_count = 0
+
+    def flush(chunk):
+        nonlocal inserted, error_count
+        chunk_errors = []
+        valid = _validate_chunk(chunk, chunk_errors)
+        if valid:
+            db.session.execute(insert(Project), valid)
+            db.session.commit()
+            inserted += len(valid)
+        error_count += len(chunk_errors)
+        errors.extend(chunk_errors[:MAX_REPORTED_ERRORS - len(errors)])
+
+    chunk = []
+    try:
+        for item in rows:
+            chunk.append(item)
+            if len(chunk) >= chunk_size:
+                flush(chunk)
+                chunk = []
+    except UnicodeDecodeError as e:
+        raise UnreadableUpload(f"the upload is not valid UTF-8 ({e.reason}); "
+                               f"the rows before the chunk containing it were imported",
+                               inserted, errors, error_count) from e
+    if chunk:
+        flush(chunk)
+    return inserted, errors, error_count
+
+
+def _export_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def export_projects(fmt, batch_size=1000):
+    """
+    Yields the projects table as CSV or NDJSON text chunks.
+
+    yield_per streams rows from a server-side cursor, so only batch_size rows
+    are held in memory at a time.
+    """
+    columns = [getattr(Project, field) for field in EXPORT_FIELDS]
+    result = db.session.execute(
+        select(*columns).order_by(Project.id).execution_options(yield_per=batch_size)
+    )
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if fmt == 'csv' else None
+    if writer:
+        writer.writerow(EXPORT_FIELDS)
+
+    for partition in result.partitions():
+        for row in partition:
+            values = [_export_value(value) for value in row]
+            if writer:
+                writer.writerow(values)
+            else:
+                buffer.write(json.dumps(dict(zip(EXPORT_FIELDS, values))))
+                buffer.write('\n')
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
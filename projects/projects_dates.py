@@ -0,0 +1,60 @@
+# projects/projects_dates.py
+#
+# Date-range lookups over projects: which projects are active on a day, and
+# which overlap a period.
+#
+# A project runs from start_date to end_date inclusive (dates are stored as
+# midnights, so it is active on the whole of its end day). A missing end_date
+# means it is still running. Projects with no start_date, or an end before
+# their start, are never active.
+#
+# PostgreSQL: a partial GiST index on tsrange(start_date, end_date, '[]'),
+# queried with the && (overlaps) operator.
+# Other databases: the composite (start_date, end_date) b-tree index on the
+# model, which bounds the scan by start_date.
+#
+# Run bootstrap.py (install_date_indexes) to create the GiST index; it is
+# idempotent.
+
+from datetime import timedelta
+from sqlalchemy import func, or_
+from .projects_model import Project
+
+_POSTGRES_DDL = [
+    """
+    CREATE INDEX IF NOT EXISTS ix_projects_active_range ON projects
+    USING gist (tsrange(start_date, end_date, '[]'))
+    WHERE start_date IS NOT NULL AND (end_date IS NULL OR end_date >= start_date)
+    """,
+]
+
+# The GiST index's WHERE clause; queries repeat it so the planner can use the index
+_DATED = (
+    Project.start_date.isnot(None),
+    or_(Project.end_date.is_(None), Project.end_date >= Project.start_date),
+)
+
+
+def install_date_indexes(connection):
+    """Creates the dialect-specific date range index, if there is one (idempotent)."""
+    if connection.dialect.name == 'postgresql':
+        for statement in _POSTGRES_DDL:
+            connection.exec_driver_sql(statement)
+
+
+def overlapping(query, first_day, last_day, dialect):
+    """Filters query to projects running at any time on the days first_day..last_day (midnights, inclusive)."""
+    until = last_day + timedelta(days=1)
+    if dialect == 'postgresql':
+        project_range = func.tsrange(Project.start_date, Project.end_date, '[]')
+        return query.filter(*_DATED, project_range.op('&&')(func.tsrange(first_day, until, '[)')))
+    return query.filter(
+        *_DATED,
+        Project.start_date < until,
+        or_(Project.end_date.is_(None), Project.end_date >= first_day),
+    )
+
+
+def active_on(query, day, dialect):
+    """Filters query to projects running at any time on day (a midnight)."""
+    return overlapping(query, day, day, dialect)
@@ -1,12 +1,22 @@
 
 from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
+from utils.db_routing import RoutingSession
 
-db = SQLAlchemy()
+# RoutingSession sends reads in @replica_router.read_only views to a replica (utils/db_routing.py)
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 class Project(db.Model):
     __tablename__ = 'projects'
-    
+    __table_args__ = (
+        # Supports keyset pagination on the project listing (see projects.index)
+        db.Index('ix_projects_created_at_id', 'created_at', 'id'),
+        # Makes max(updated_at), the listing's Last-Modified/ETag validator, an index lookup
+        db.Index('ix_projects_updated_at', 'updated_at'),
+        # Bounds the active/overlapping date range lookups (see projects_dates.py)
+        db.Index('ix_projects_start_end', 'start_date', 'end_date'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.Text, nullable=False)
     short_description = db.Column(db.Text)
@@ -18,3 +28,15 @@ class Project(db.Model):
 
     def __repr__(self):
         return f'<Project {self.name}>'
+
+
+class ProjectMonthlyStats(db.Model):
+    """Projects started and ended per calendar month, kept current by projects_stats.py."""
+    __tablename__ = 'project_monthly_stats'
+
+    month = db.Column(db.Date, primary_key=True)  # first day of the month
+    started = db.Column(db.Integer, nullable=False, default=0)
+    ended = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<ProjectMonthlyStats {self.month:%Y-%m}>'
@@ -1,14 +1,180 @@
-
-from flask import Blueprint, render_template, request, redirect, url_for
+import io
+import logging
+from flask import Blueprint, render_template, request, redirect, url_for, jsonify, current_app, Response, stream_with_context
 from datetime import datetime
-from .projects_model import db, Project
+from flask_security import current_user
+from sqlalchemy import func, or_
+from sqlalchemy.orm import defer
+from .projects_model import db, Project, ProjectMonthlyStats
+from .projects_bulk import detect_format, iter_rows, import_projects, export_projects, UnreadableUpload
+from .projects_search import search_projects
+from .projects_dates import active_on, overlapping
+from . import projects_stats  # noqa: F401  (keeps project_monthly_stats current)
+from utils.pagination import keyset_page, keyset_stream, page_size_from
+from utils.page_cache import page_cache
+from utils.streaming import render_streamed
+from utils.db_routing import replica_router
+from utils.rate_limit import client_ip
+from users.users_access import role_or_token
 
 projects_bp = Blueprint('projects', __name__)
+log = logging.getLogger(__name__)
+page_cache.watch(Project, 'projects')
+
+
+def _projects_last_modified():
+    return db.session.query(func.max(Project.updated_at)).scalar()
+
+
+def _project_page(streamable=False):
+    """The requested page; long pages are streamed (rows fetched during rendering) if streamable."""
+    # background is never shown in the listing, so leave it out of the SELECT
+    query = Project.query.options(defer(Project.background))
+    cursor = request.args.get('cursor')
+    page_size = page_size_from(request.args, current_app.config, 'PROJECTS_PAGE_SIZE')
+    if streamable and page_size >= current_app.config['STREAM_MIN_PAGE_SIZE']:
+        return keyset_stream(query, Project.created_at, Project.id, cursor=cursor, page_size=page_size,
+                             batch_size=current_app.config['STREAM_BATCH_SIZE'])
+    return keyset_page(query, Project.created_at, Project.id, cursor=cursor, page_size=page_size)
+
+
+def _project_to_dict(project):
+    return {
+        'id': project.id,
+        'name': project.name,
+        'short_description': project.short_description,
+        'start_date': project.start_date.strftime('%Y-%m-%d') if project.start_date else None,
+        'end_date': project.end_date.strftime('%Y-%m-%d') if project.end_date else None,
+        'created_at': project.created_at.isoformat(),
+    }
+
 
 @projects_bp.route('/')
+@replica_router.read_only
+@page_cache.cached('projects', last_modified=_projects_last_modified)
 def index():
-    projects = Project.query.all()
-    return render_template('projects/projects.html', projects=projects)
+    page = _project_page(streamable=True)
+    render = render_streamed if page.streamed else render_template
+    return render('projects/projects.html', projects=page.items, page=page)
+
+@projects_bp.route('/api/projects')
+@replica_router.read_only
+@page_cache.cached('projects', last_modified=_projects_last_modified)
+def index_json():
+    page = _project_page()
+    return jsonify(
+        projects=[_project_to_dict(project) for project in page.items],
+        next_cursor=page.next_cursor,
+        page_size=page.page_size,
+    )
+
+def _search_page():
+    """Returns (query, rows, offset, next_offset) for the current request's ?q=&offset=&limit=."""
+    query = request.args.get('q', '').strip()
+    page_size = page_size_from(request.args, current_app.config, 'SEARCH_PAGE_SIZE')
+    offset = max(0, request.args.get('offset', 0, type=int))
+    limit = min(page_size, current_app.config['SEARCH_MAX_RESULTS'] - offset)
+    if limit <= 0:
+        return query, [], offset, None
+    rows, has_next = search_projects(query, offset=offset, limit=limit)
+    next_offset = offset + limit if has_next and offset + limit < current_app.config['SEARCH_MAX_RESULTS'] else None
+    return query, rows, offset, next_offset
+
+@projects_bp.route('/projects/search')
+@replica_router.read_only
+@page_cache.cached('projects')
+def search():
+    query, rows, offset, next_offset = _search_page()
+    return render_template('projects/projects_search.html',
+                           query=query, results=rows, offset=offset, next_offset=next_offset)
+
+@projects_bp.route('/api/projects/search')
+@replica_router.read_only
+@page_cache.cached('projects')
+def search_json():
+    query, rows, offset, next_offset = _search_page()
+    return jsonify(
+        query=query,
+        results=[{**_project_to_dict(row), 'rank': float(row.rank)} for row in rows],
+        offset=offset,
+        next_offset=next_offset,
+    )
+
+def _parse_day(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except (TypeError, ValueError):
+        return None
+
+def _dated_page(query):
+    """A keyset page ordered by (start_date, id); every row in these queries has a start_date."""
+    return keyset_page(
+        query.options(defer(Project.background)),
+        Project.start_date,
+        Project.id,
+        cursor=request.args.get('cursor'),
+        page_size=page_size_from(request.args, current_app.config, 'PROJECTS_PAGE_SIZE'),
+    )
+
+def _dated_page_json(page, **extra):
+    return jsonify(
+        **extra,
+        projects=[_project_to_dict(project) for project in page.items],
+        next_cursor=page.next_cursor,
+        page_size=page.page_size,
+    )
+
+@projects_bp.route('/api/projects/active')
+@replica_router.read_only
+@page_cache.cached('projects')
+def active_json():
+    """Projects running on ?on=YYYY-MM-DD (default: today, UTC)."""
+    day = _parse_day(request.args.get('on', datetime.utcnow().strftime('%Y-%m-%d')))
+    if day is None:
+        return jsonify(error="on must be YYYY-MM-DD"), 400
+    dialect = db.session.get_bind().dialect.name
+    page = _dated_page(active_on(Project.query, day, dialect))
+    return _dated_page_json(page, on=day.strftime('%Y-%m-%d'))
+
+@projects_bp.route('/api/projects/overlapping')
+@replica_router.read_only
+@page_cache.cached('projects')
+def overlapping_json():
+    """Projects running at any time from ?start= to ?end= (YYYY-MM-DD, inclusive)."""
+    start, end = _parse_day(request.args.get('start')), _parse_day(request.args.get('end'))
+    if start is None or end is None:
+        return jsonify(error="start and end must be YYYY-MM-DD"), 400
+    if end < start:
+        return jsonify(error="end is before start"), 400
+    dialect = db.session.get_bind().dialect.name
+    page = _dated_page(overlapping(Project.query, start, end, dialect))
+    return _dated_page_json(page, start=start.strftime('%Y-%m-%d'), end=end.strftime('%Y-%m-%d'))
+
+@projects_bp.route('/api/projects/stats')
+@replica_router.read_only
+@page_cache.cached('projects')
+def stats_json():
+    """Projects started and ended per month, optionally limited to ?from=YYYY-MM&to=YYYY-MM."""
+    query = ProjectMonthlyStats.query.filter(
+        or_(ProjectMonthlyStats.started != 0, ProjectMonthlyStats.ended != 0))
+    bounds = {}
+    for name in ('from', 'to'):
+        if request.args.get(name):
+            month = _parse_day(request.args[name] + '-01')
+            if month is None:
+                return jsonify(error=f"{name} must be YYYY-MM"), 400
+            bounds[name] = month.date()
+    if 'from' in bounds:
+        query = query.filter(ProjectMonthlyStats.month >= bounds['from'])
+    if 'to' in bounds:
+        query = query.filter(ProjectMonthlyStats.month <= bounds['to'])
+    months = query.order_by(ProjectMonthlyStats.month).all()
+    return jsonify(
+        months=[{'month': row.month.strftime('%Y-%m'), 'started': row.started, 'ended': row.ended}
+                for row in months],
+        started=sum(row.started for row in months),
+        ended=sum(row.ended for row in months),
+    )
 
 @projects_bp.route('/add', methods=['POST'])
 def add_project():
@@ -30,3 +196,54 @@ def add_project():
     db.session.commit()
 
     return redirect(url_for('projects.index'))
+
+@projects_bp.route('/projects/import', methods=['POST'])
+def import_projects_file():
+    """
+    Bulk import from a multipart 'file' upload or a raw CSV/NDJSON request body.
+
+    Only for users with PROJECTS_IMPORT_ROLE, or requests bearing PROJECTS_IMPORT_TOKEN.
+    """
+    importer = role_or_token(current_app.config['PROJECTS_IMPORT_ROLE'], current_app.config.get('PROJECTS_IMPORT_TOKEN'))
+    if importer is None:
+        log.warning("Project import refused for %s.", client_ip())
+        return jsonify(error="Importing projects requires an administrator."), 403 if current_user.is_authenticated else 401
+
+    upload = request.files.get('file')
+    if upload:
+        fmt = detect_format(upload.filename, upload.mimetype, request.args.get('format'))
+        stream = upload.stream
+    else:
+        fmt = detect_format(None, request.mimetype, request.args.get('format'))
+        stream = io.BufferedReader(request.stream)
+    if fmt is None:
+        return jsonify(error="Unknown format; use ?format=csv or ?format=ndjson"), 400
+
+    chunk_size = request.args.get('chunk_size', current_app.config['PROJECTS_IMPORT_CHUNK_SIZE'], type=int)
+    try:
+        inserted, errors, error_count = import_projects(iter_rows(stream, fmt), chunk_size=max(1, chunk_size))
+    except UnreadableUpload as e:
+        return jsonify(
+            error=str(e),
+            inserted=e.inserted,
+            rejected=e.error_count,
+            errors=[{'line': line, 'error': message} for line, message in e.errors],
+        ), 400
+    return jsonify(
+        inserted=inserted,
+        rejected=error_count,
+        errors=[{'line': line, 'error': message} for line, message in errors],
+    )
+
+@projects_bp.route('/projects/export')
+@replica_router.read_only
+def export_projects_file():
+    fmt = request.args.get('format', 'csv')
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify(error="format must be csv or ndjson"), 400
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    return Response(
+        stream_with_context(export_projects(fmt, batch_size=current_app.config['PROJECTS_EXPORT_BATCH_SIZE'])),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename=projects.{fmt}'},
+    )
@@ -0,0 +1,158 @@
+# projects/projects_search.py
+#
+# Ranked full-text search over projects.
+#
+# PostgreSQL: a generated tsvector column (name weighted A, short_description
+# B, background C) with a GIN index, so the database keeps it current on
+# every insert and update, bulk imports included. pg_trgm adds a trigram GIN
+# index on name for misspelled and partial names.
+#
+# SQLite: an external-content FTS5 table kept in sync by triggers, ranked
+# with bm25(), with prefix indexes for 2-4 character prefixes. Prefix
+# matching works; fuzzy matching does not.
+#
+# Other databases fall back to an unindexed LIKE scan.
+#
+# Run bootstrap.py (install_search) once to create the column, indexes,
+# tables and triggers; every statement is idempotent.
+
+import re
+from sqlalchemy import column, func, literal_column, or_, select, table, text
+from .projects_model import db, Project
+
+TEXT_SEARCH_CONFIG = 'english'
+RESULT_COLUMNS = (Project.id, Project.name, Project.short_description,
+                  Project.start_date, Project.end_date, Project.created_at)
+_projects_fts = table('projects_fts', column('rowid'))
+
+_POSTGRES_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    f"""
+    ALTER TABLE projects ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('{TEXT_SEARCH_CONFIG}', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('{TEXT_SEARCH_CONFIG}', coalesce(short_description, '')), 'B') ||
+        setweight(to_tsvector('{TEXT_SEARCH_CONFIG}', coalesce(background, '')), 'C')
+    ) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_projects_search_vector ON projects USING gin (search_vector)",
+    "CREATE INDEX IF NOT EXISTS ix_projects_name_trgm ON projects USING gin (name gin_trgm_ops)",
+]
+
+_SQLITE_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS projects_fts USING fts5(
+        name, short_description, background, content='projects', content_rowid='id',
+        prefix='2 3 4'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS projects_fts_insert AFTER INSERT ON projects BEGIN
+        INSERT INTO projects_fts (rowid, name, short_description, background)
+        VALUES (new.id, new.name, new.short_description, new.background);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS projects_fts_delete AFTER DELETE ON projects BEGIN
+        INSERT INTO projects_fts (projects_fts, rowid, name, short_description, background)
+        VALUES ('delete', old.id, old.name, old.short_description, old.background);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS projects_fts_update AFTER UPDATE ON projects BEGIN
+        INSERT INTO projects_fts (projects_fts, rowid, name, short_description, background)
+        VALUES ('delete', old.id, old.name, old.short_description, old.background);
+        INSERT INTO projects_fts (rowid, name, short_description, background)
+        VALUES (new.id, new.name, new.short_description, new.background);
+    END
+    """,
+]
+
+
+def install_search(connection):
+    """Creates whatever the connection's database needs for search (idempotent)."""
+    dialect = connection.dialect.name
+    if dialect == 'postgresql':
+        for statement in _POSTGRES_DDL:
+            connection.execute(text(statement))
+    elif dialect == 'sqlite':
+        exists = connection.execute(
+            text("SELECT 1 FROM sqlite_master WHERE name = 'projects_fts'")).first()
+        for statement in _SQLITE_DDL:
+            connection.execute(text(statement))
+        if not exists:
+            # Index the rows that were there before the triggers
+            connection.execute(text("INSERT INTO projects_fts (projects_fts) VALUES ('rebuild')"))
+
+
+def search_terms(query):
+    """The words of a query, lowercased; punctuation and operators are dropped."""
+    return re.findall(r'\w+', (query or '').lower())
+
+
+def search_projects(query, offset=0, limit=20):
+    """
+    Returns (rows, has_next) for one page of results, best match first.
+
+    Rows have the RESULT_COLUMNS plus rank. The last word is treated as a
+    prefix, so results update usefully while the user is still typing.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return [], False
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        statement = _postgres_query(terms).offset(offset).limit(limit + 1)
+    elif dialect == 'sqlite':
+        statement = _sqlite_query(terms, offset, limit + 1)
+    else:
+        statement = _like_query(terms).offset(offset).limit(limit + 1)
+    rows = db.session.execute(statement).all()
+    return rows[:limit], len(rows) > limit
+
+
+def _postgres_query(terms):
+    tsquery = func.to_tsquery(
+        TEXT_SEARCH_CONFIG, ' & '.join(terms[:-1] + [terms[-1] + ':*']))
+    search_vector = literal_column('projects.search_vector')
+    name_query = ' '.join(terms)
+    # name % q uses the trigram index (similarity above pg_trgm.similarity_threshold)
+    rank = func.ts_rank_cd(search_vector, tsquery) + func.similarity(Project.name, name_query)
+    return (
+        select(*RESULT_COLUMNS, rank.label('rank'))
+        .where(or_(search_vector.op('@@')(tsquery), Project.name.op('%')(name_query)))
+        .order_by(rank.desc(), Project.id.desc())
+    )
+
+
+def _sqlite_query(terms, offset, limit):
+    # Quoted terms can't be read as FTS5 operators; the last one is a prefix
+    match = ' '.join([*(f'"{term}"' for term in terms[:-1]), f'"{terms[-1]}"*'])
+    # bm25() is lower for better matches; weight name over short_description over background.
+    # Rank and cut in the FTS table first, so only the page's rows are read from projects.
+    rank = literal_column('bm25(projects_fts, 10.0, 4.0, 1.0)')
+    best = (
+        select(_projects_fts.c.rowid, rank.label('bm25'))
+        .where(literal_column('projects_fts').op('MATCH')(match))
+        .order_by(rank, _projects_fts.c.rowid.desc())
+        .offset(offset).limit(limit)
+        .subquery()
+    )
+    return (
+        select(*RESULT_COLUMNS, (-best.c.bm25).label('rank'))
+        .join_from(best, Project, Project.id == best.c.rowid)
+        .order_by(best.c.bm25, Project.id.desc())
+    )
+
+
+def _like_query(terms):
+    conditions = [
+        or_(Project.name.icontains(term, autoescape=True),
+            Project.short_description.icontains(term, autoescape=True))
+        for term in terms
+    ]
+    return (
+        select(*RESULT_COLUMNS, literal_column('0').label('rank'))
+        .where(*conditions)
+        .order_by(Project.id.desc())
+    )
@@ -0,0 +1,177 @@
+# projects/projects_stats.py
+#
+# Keeps project_monthly_stats (projects started and ended per month) current
+# as projects change, so /api/projects/stats reads a few hundred counter rows
+# instead of aggregating the projects table on every request.
+#
+# - Flushed inserts, updates and deletes of Project adjust the counters in the
+#   same flush, hence the same transaction.
+# - Bulk insert(Project) statements (the CSV/NDJSON import) are counted from
+#   their parameters when the transaction commits.
+# - Bulk UPDATE/DELETE statements and inserts whose values can't be read
+#   trigger a full rebuild from the projects table at commit. So does a
+#   flushed change whose old dates weren't loaded, right after that flush.
+# The counters are updated with an atomic INSERT ... ON CONFLICT DO UPDATE,
+# so concurrent writers add up correctly.
+
+import logging
+from collections import defaultdict
+from datetime import date, datetime
+from sqlalchemy import delete, event, func, inspect, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from .projects_model import db, Project, ProjectMonthlyStats
+
+log = logging.getLogger(__name__)
+
+_stats = ProjectMonthlyStats.__table__
+
+
+class _Unknown(Exception):
+    """A change whose effect on the counters can't be worked out; rebuild instead."""
+
+
+def _month(value):
+    if value is None:
+        return None
+    if not isinstance(value, (date, datetime)):
+        raise _Unknown(value)
+    return date(value.year, value.month, 1)
+
+
+def _count(deltas, start_date, end_date, sign):
+    """Adds sign to the started/ended counters of a project with these dates."""
+    if (month := _month(start_date)) is not None:
+        deltas[month][0] += sign
+    if (month := _month(end_date)) is not None:
+        deltas[month][1] += sign
+
+
+def _old_and_new(project, name):
+    history = inspect(project).attrs[name].history
+    if not history.has_changes():
+        return None
+    if not history.deleted:
+        raise _Unknown(name)  # the old value was never loaded
+    return history.deleted[0], (history.added or [None])[0]
+
+
+def apply_deltas(session, deltas):
+    """Adds {month: [started, ended]} to the stored counters, inside the session's transaction."""
+    rows = [{'month': month, 'started': started, 'ended': ended}
+            for month, (started, ended) in deltas.items() if started or ended]
+    if not rows:
+        return
+    dialect = session.get_bind(ProjectMonthlyStats).dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        insert = (postgresql if dialect == 'postgresql' else sqlite).insert(_stats)
+        statement = insert.on_conflict_do_update(
+            index_elements=[_stats.c.month],
+            set_={'started': _stats.c.started + insert.excluded.started,
+                  'ended': _stats.c.ended + insert.excluded.ended},
+        )
+        session.execute(statement, rows)
+        return
+    for row in rows:
+        changed = session.execute(
+            update(_stats).where(_stats.c.month == row['month']).values(
+                started=_stats.c.started + row['started'], ended=_stats.c.ended + row['ended'])
+        ).rowcount
+        if not changed:
+            session.execute(_stats.insert().values(**row))
+
+
+def rebuild_project_stats(session=None):
+    """Recomputes every counter from the projects table. Needs an app context; doesn't commit."""
+    session = session or db.session
+    deltas = defaultdict(lambda: [0, 0])
+    dialect = session.get_bind(ProjectMonthlyStats).dialect.name
+    for position, column in enumerate((Project.start_date, Project.end_date)):
+        if dialect == 'postgresql':
+            month = func.date_trunc('month', column)
+        elif dialect == 'sqlite':
+            month = func.date(column, 'start of month')
+        else:
+            month = column  # counted per month in Python below
+        counts = session.execute(
+            select(month, func.count()).where(column.isnot(None)).group_by(month)).all()
+        for value, count in counts:
+            if isinstance(value, str):
+                value = date.fromisoformat(value[:10])
+            deltas[_month(value)][position] += count
+    session.execute(delete(_stats))
+    apply_deltas(session, deltas)
+    log.info("Rebuilt project stats: %d months.", len(deltas))
+
+
+# --- Session events ---
+
+@event.listens_for(db.session, 'after_flush')
+def _count_flushed_changes(session, flush_context):
+    deltas = defaultdict(lambda: [0, 0])
+    try:
+        for project in session.new:
+            if isinstance(project, Project):
+                _count(deltas, project.start_date, project.end_date, +1)
+        for project in session.deleted:
+            if isinstance(project, Project):
+                state = inspect(project)
+                if 'start_date' not in state.dict or 'end_date' not in state.dict:
+                    raise _Unknown('deleted')
+                _count(deltas, state.dict['start_date'], state.dict['end_date'], -1)
+        for project in session.dirty:
+            if isinstance(project, Project) and project not in session.deleted:
+                for position, name in enumerate(('start_date', 'end_date')):
+                    change = _old_and_new(project, name)
+                    if change is not None:
+                        old, new = change
+                        if (month := _month(old)) is not None:
+                            deltas[month][position] -= 1
+                        if (month := _month(new)) is not None:
+                            deltas[month][position] += 1
+    except _Unknown:
+        # The flush has been written, so the table is current: recount it now, bulk changes included
+        session.info.pop('project_stats_rebuild', None)
+        session.info.pop('project_stats_pending', None)
+        rebuild_project_stats(session)
+        return
+    apply_deltas(session, deltas)
+
+
+@event.listens_for(db.session, 'do_orm_execute')
+def _track_bulk_writes(orm_execute_state):
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is None or mapper.class_ is not Project:
+        return
+    info = orm_execute_state.session.info
+    parameters = orm_execute_state.parameters
+    if orm_execute_state.is_insert and parameters:
+        rows = parameters if isinstance(parameters, (list, tuple)) else [parameters]
+        pending = info.setdefault('project_stats_pending', defaultdict(lambda: [0, 0]))
+        try:
+            for row in rows:
+                _count(pending, row.get('start_date'), row.get('end_date'), +1)
+            return
+        except _Unknown:
+            pass
+    info['project_stats_rebuild'] = True
+
+
+@event.listens_for(db.session, 'before_commit')
+def _apply_bulk_writes(session):
+    if session.info.pop('project_stats_rebuild', False):
+        session.info.pop('project_stats_pending', None)
+        session.flush()  # so the rebuild sees, and later flushes don't re-add, pending objects
+        rebuild_project_stats(session)
+        session.info.pop('project_stats_rebuild', None)
+        return
+    pending = session.info.pop('project_stats_pending', None)
+    if pending:
+        apply_deltas(session, pending)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _forget_bulk_writes(session):
+    session.info.pop('project_stats_rebuild', None)
+    session.info.pop('project_stats_pending', None)
@@ -0,0 +1,14 @@
+// tailwind.config.js
+//
+// Used by the asset build (assets/assets_build.py). Tailwind scans these
+// files for class names and emits only the utilities it finds, so classes
+// built by string concatenation at runtime must be listed in safelist.
+
+module.exports = {
+  content: ['./templates/**/*.html', './static/js/**/*.js'],
+  safelist: [],
+  theme: {
+    extend: {},
+  },
+  plugins: [],
+};
@@ -0,0 +1,73 @@
+# tests/conftest.py
+#
+# Every test gets its own SQLite database and cache-free configuration.
+# config.py reads the environment, and main builds an app at import time, so
+# the variables are set before main is imported.
+
+import os
+import sys
+from contextlib import contextmanager
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def environment(tmp_path, monkeypatch):
+    values = {
+        'DATABASE_URL': f"sqlite:///{tmp_path / 'test.db'}",
+        'SECRET_KEY': 'test',
+        'LOG_LEVEL': 'ERROR',
+        'MAIL_OUTBOX_WORKERS': '0',
+        'MAIL_DEFAULT_SENDER': 'app@example.com',
+        'IDENTITY_CACHE_BACKEND': 'none',
+        'PAGE_CACHE_BACKEND': 'none',
+        'RATE_LIMIT_BACKEND': 'memory',
+        'METRICS_DIR': str(tmp_path / 'metrics'),
+        'PROFILER_DIR': str(tmp_path / 'profiles'),
+    }
+    for name, value in values.items():
+        monkeypatch.setenv(name, value)
+    monkeypatch.syspath_prepend(ROOT)
+    return values
+
+
+@pytest.fixture
+def app(environment):
+    from main import create_app
+    from bootstrap import bootstrap
+    from extensions import db
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': environment['DATABASE_URL']})
+    with app.app_context():
+        bootstrap()
+        db.session.remove()
+    # No context is left pushed: requests made while one is would share its g (and the cached current_user)
+    return app
+
+
+def login(client, fs_uniquifier):
+    """Makes client's session belong to the user with this fs_uniquifier."""
+    with client.session_transaction() as session:
+        session['_user_id'] = fs_uniquifier
+        session['_fresh'] = True
+
+
+@contextmanager
+def recorded_statements(app):
+    """Collects the SQL statements the app's engine runs inside the block."""
+    from sqlalchemy import event
+    from extensions import db
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
@@ -0,0 +1,182 @@
+# tests/test_asgi.py
+
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+
+def _post(bridge, path, query, body_parts, headers):
+    """Sends one HTTP request through the bridge; the body arrives in body_parts, as a chunked upload would."""
+    messages = [{'type': 'http.request', 'body': part, 'more_body': True} for part in body_parts]
+    messages.append({'type': 'http.request', 'body': b'', 'more_body': False})
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {'type': 'http', 'method': 'POST', 'path': path, 'query_string': query, 'root_path': '',
+             'http_version': '1.1', 'scheme': 'http', 'server': ('testserver', 80), 'client': ('127.0.0.1', 0),
+             'headers': headers}
+    asyncio.run(bridge(scope, receive, send))
+    return sent[0]['status'], b''.join(message.get('body', b'') for message in sent[1:])
+
+
+def test_chunked_upload_without_content_length_is_read(app):
+    from asgi import WsgiBridge
+
+    app.config['PROJECTS_IMPORT_TOKEN'] = 'secret'
+    bridge = WsgiBridge(app, app.config)
+    bridge.executor = ThreadPoolExecutor(1)
+    try:
+        rows = [json.dumps({'name': f'project {n}'}).encode() + b'\n' for n in range(3)]
+        status, body = _post(bridge, '/projects/import', b'format=ndjson', rows,
+                             [(b'transfer-encoding', b'chunked'), (b'content-type', b'application/x-ndjson'),
+                              (b'authorization', b'Bearer secret')])
+    finally:
+        bridge.executor.shutdown()
+    assert status == 200
+    assert json.loads(body)['inserted'] == 3
+
+
+def _serve(bridge, requests):
+    """Starts the bridge (lifespan), sends each (path, query, headers) GET, stops it; returns the responses."""
+    async def run():
+        started, stopping = asyncio.Event(), asyncio.Event()
+
+        async def lifespan_receive():
+            if not started.is_set():
+                return {'type': 'lifespan.startup'}
+            await stopping.wait()
+            return {'type': 'lifespan.shutdown'}
+
+        async def lifespan_send(message):
+            assert message['type'] in ('lifespan.startup.complete', 'lifespan.shutdown.complete')
+            started.set()
+
+        lifespan = asyncio.create_task(bridge({'type': 'lifespan'}, lifespan_receive, lifespan_send))
+        await started.wait()
+        responses = []
+        for path, query, headers in requests:
+            responses.append(await _get(bridge, path, query, headers))
+        stopping.set()
+        await lifespan
+        return responses
+    return asyncio.run(run())
+
+
+async def _get(bridge, path, query, headers):
+    sent = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {'type': 'http', 'method': 'GET', 'path': path, 'query_string': query, 'root_path': '',
+             'http_version': '1.1', 'scheme': 'http', 'server': ('testserver', 80), 'client': ('127.0.0.1', 0),
+             'headers': headers}
+    await bridge(scope, receive, send)
+    headers = {name.decode(): value.decode() for name, value in sent[0]['headers']}
+    return sent[0]['status'], headers, b''.join(message.get('body', b'') for message in sent[1:])
+
+
+def _thread_free_bridge(app):
+    """A bridge whose Flask path fails, so a response proves it came from the loop."""
+    from asgi import WsgiBridge
+
+    def no_threads(*args):
+        raise AssertionError("a Flask thread was used")
+
+    bridge = WsgiBridge(app, app.config)
+    bridge._run_wsgi = no_threads
+    return bridge
+
+
+def _add(app, projects=0, users=0):
+    from datetime import datetime
+    from extensions import db, user_datastore
+    from projects.projects_model import Project
+    from users.users_model import Role
+    with app.app_context():
+        db.session.add_all(Project(name=f'project {number}', created_at=datetime(2024, 1, 1 + number % 3))
+                           for number in range(projects))
+        role = Role.query.first()
+        for number in range(users):
+            user_datastore.create_user(email=f'user{number}@example.com', name=f'User {number}', roles=[role])
+        db.session.commit()
+
+
+def test_listings_are_served_on_the_loop_exactly_as_flask_serves_them(app):
+    _add(app, projects=5, users=3)
+    client = app.test_client()
+    paths = [('/api/projects', b'limit=2'), ('/api/users', b'limit=2')]
+    flask_pages = [client.get(path, query_string=query.decode()).json for path, query in paths]
+
+    responses = _serve(_thread_free_bridge(app), [(path, query, []) for path, query in paths])
+    assert [status for status, _, _ in responses] == [200, 200]
+    assert [json.loads(body) for _, _, body in responses] == flask_pages
+
+
+def test_async_cursors_walk_every_project_once(app):
+    _add(app, projects=7)
+    bridge, seen, cursor = _thread_free_bridge(app), [], None
+    while True:
+        query = b'limit=3' + (b'&cursor=' + cursor.encode() if cursor else b'')
+        (status, _, body), = _serve(bridge, [('/api/projects', query, [])])
+        page = json.loads(body)
+        seen += [project['id'] for project in page['projects']]
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+    assert len(seen) == len(set(seen)) == 7
+
+
+def test_async_views_share_the_page_cache_and_etags_with_flask(environment, monkeypatch, request):
+    monkeypatch.setenv('PAGE_CACHE_BACKEND', 'memory')
+    app = request.getfixturevalue('app')
+    _add(app, projects=2)
+    flask_response = app.test_client().get('/api/projects')
+    assert flask_response.headers['X-Page-Cache'] == 'miss'
+
+    hit, not_modified = _serve(_thread_free_bridge(app), [
+        ('/api/projects', b'', []),
+        ('/api/projects', b'', [(b'if-none-match', flask_response.headers['ETag'].encode())]),
+    ])
+    assert hit[0] == 200 and hit[1]['x-page-cache'] == 'hit' and hit[2] == flask_response.get_data()
+    assert hit[1]['etag'] == flask_response.headers['ETag']
+    assert not_modified[0] == 304
+
+
+def test_flask_answers_when_the_async_views_are_off(app):
+    from asgi import WsgiBridge
+    _add(app, projects=1)
+    app.config['ASGI_ASYNC_VIEWS'] = False
+    (status, _, body), = _serve(WsgiBridge(app, app.config), [('/api/projects', b'', [])])
+    assert status == 200 and len(json.loads(body)['projects']) == 1
+
+
+def test_async_views_are_counted_in_the_metrics(app):
+    from metrics.metrics_http import QUERIES, REQUESTS
+
+    def count(metric, *labels):
+        return dict((tuple(key), value) for key, value in metric.samples()).get(labels, 0)
+
+    _add(app, users=2)
+    requests, queries = count(REQUESTS, 'users.list_users_json', 'GET', '200'), count(QUERIES, 'users.list_users_json')
+    _serve(_thread_free_bridge(app), [('/api/users', b'', [])])
+    assert count(REQUESTS, 'users.list_users_json', 'GET', '200') == requests + 1
+    assert count(QUERIES, 'users.list_users_json') == queries + 2  # the page, then its roles
+
+
+def test_large_async_responses_are_compressed(app):
+    import gzip
+    _add(app, projects=40)
+    plain = app.test_client().get('/api/projects?limit=40').get_data()
+    (status, headers, body), = _serve(_thread_free_bridge(app),
+                                      [('/api/projects', b'limit=40', [(b'accept-encoding', b'gzip')])])
+    assert headers['content-encoding'] == 'gzip' and 'Accept-Encoding' in headers['vary']
+    assert gzip.decompress(body) == plain
@@ -0,0 +1,23 @@
+# tests/test_config.py
+
+from config import provider_pooler_url
+
+
+def test_neon_hosts_use_the_pooler_regardless_of_case():
+    assert provider_pooler_url('postgresql://u:p@EP-Cool-1.EU-Central-1.AWS.Neon.Tech:5432/db?sslmode=require') == \
+        'postgresql://u:p@ep-cool-1-pooler.eu-central-1.aws.neon.tech:5432/db?sslmode=require'
+
+
+def test_us_east_2_hosts_keep_the_original_rewrite():
+    assert provider_pooler_url('postgresql://u:p@db.example.us-east-2.rds.example.com/db') == \
+        'postgresql://u:p@db.example-pooler.us-east-2.rds.example.com/db'
+
+
+def test_other_hosts_only_with_the_mode_on():
+    url = 'postgresql://u:p@db.example.com/db'
+    assert provider_pooler_url(url) == url
+    assert provider_pooler_url(url, 'on') == 'postgresql://u:p@db-pooler.example.com/db'
+    assert provider_pooler_url('postgresql://u:p@ep-x-pooler.us-east-2.aws.neon.tech/db') == \
+        'postgresql://u:p@ep-x-pooler.us-east-2.aws.neon.tech/db'
+    assert provider_pooler_url('postgresql://u:p@ep-x.us-east-2.aws.neon.tech/db', 'off') == \
+        'postgresql://u:p@ep-x.us-east-2.aws.neon.tech/db'
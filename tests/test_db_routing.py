@@ -0,0 +1,50 @@
+# tests/test_db_routing.py
+
+import time
+import pytest
+
+
+@pytest.fixture
+def replica_app(environment, monkeypatch, tmp_path, request):
+    """An app with one replica that never receives the primary's writes, i.e. one that is always behind."""
+    monkeypatch.setenv('DATABASE_REPLICA_URLS', f"sqlite:///{tmp_path / 'replica.db'}")
+    monkeypatch.setenv('PAGE_CACHE_BACKEND', 'memory')
+    app = request.getfixturevalue('app')
+    from extensions import db
+    with app.app_context():
+        db.metadata.create_all(db.engines['replica_0'])
+    yield app
+    db.metadatas.pop('replica_0', None)  # Flask-SQLAlchemy adds one per bind, and db outlives the app
+
+
+def test_read_only_leaves_the_session_alone_without_replicas(app, monkeypatch):
+    from utils import db_routing
+
+    class Untouchable:
+        def get(self, *args):
+            raise AssertionError("the client session was read")
+
+    monkeypatch.setattr(db_routing, 'client_session', Untouchable())
+    with app.test_request_context('/'):
+        db_routing.replica_router.read_only(lambda: None)()
+
+
+def test_replica_pages_are_not_cached_until_replicas_can_have_caught_up(replica_app):
+    from extensions import db
+    from projects.projects_model import Project
+    from utils.page_cache import page_cache
+
+    with replica_app.app_context():
+        db.session.add(Project(name='new'))
+        db.session.commit()  # bumps the 'projects' version
+    client = replica_app.test_client()
+
+    response = client.get('/api/projects')
+    assert response.json['projects'] == []  # read from the lagging replica
+    assert response.headers['X-Page-Cache'] == 'bypass'
+    assert client.get('/api/projects').headers['X-Page-Cache'] == 'bypass'
+
+    version, _ = page_cache._version('projects')
+    page_cache.backend.set('version:projects', (version, time.time() - 3600), ttl=0)
+    assert client.get('/api/projects').headers['X-Page-Cache'] == 'miss'
+    assert client.get('/api/projects').headers['X-Page-Cache'] == 'hit'
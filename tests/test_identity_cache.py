@@ -0,0 +1,79 @@
+# tests/test_identity_cache.py
+
+import pytest
+from conftest import login, recorded_statements
+
+
+@pytest.fixture
+def cached_app(environment, monkeypatch, request):
+    monkeypatch.setenv('IDENTITY_CACHE_BACKEND', 'memory')
+    return request.getfixturevalue('app')
+
+
+def _user(app, email, role):
+    from extensions import db, user_datastore
+    from users.users_model import Role
+    with app.app_context():
+        user = user_datastore.create_user(email=email, name=email, roles=[Role.query.filter_by(name=role).one()])
+        db.session.commit()
+        return user.fs_uniquifier
+
+
+def _bulk(client):
+    # Refused (401/403) before any work of its own, so its queries are only the auth ones
+    return client.post('/users/bulk', json=[])
+
+
+def test_authenticated_requests_need_no_queries_once_cached(cached_app):
+    client = cached_app.test_client()
+    login(client, _user(cached_app, 'analyst@example.com', 'analyst'))
+    assert _bulk(client).status_code == 403
+    with recorded_statements(cached_app) as statements:
+        assert _bulk(client).status_code == 403
+    assert statements == []
+
+
+def test_role_changes_take_effect_on_the_next_request(cached_app):
+    from extensions import db, user_datastore
+    client = cached_app.test_client()
+    login(client, _user(cached_app, 'analyst@example.com', 'analyst'))
+    assert _bulk(client).status_code == 403
+
+    with cached_app.app_context():
+        user = user_datastore.find_user(email='analyst@example.com')
+        user_datastore.add_role_to_user(user, 'admin')
+        db.session.commit()
+    assert _bulk(client).status_code == 200
+
+    with cached_app.app_context():
+        user = user_datastore.find_user(email='analyst@example.com')
+        user_datastore.remove_role_from_user(user, 'admin')
+        db.session.commit()
+    assert _bulk(client).status_code == 403
+
+
+def test_deactivated_users_are_logged_out(cached_app):
+    from extensions import db, user_datastore
+    client = cached_app.test_client()
+    login(client, _user(cached_app, 'admin2@example.com', 'admin'))
+    assert _bulk(client).status_code == 200
+
+    with cached_app.app_context():
+        user_datastore.deactivate_user(user_datastore.find_user(email='admin2@example.com'))
+        db.session.commit()
+    assert _bulk(client).status_code == 401
+
+
+def test_giving_someone_a_role_keeps_everyone_else_cached(cached_app):
+    from extensions import db, user_datastore
+    client = cached_app.test_client()
+    login(client, _user(cached_app, 'analyst@example.com', 'analyst'))
+    assert _bulk(client).status_code == 403
+
+    _user(cached_app, 'another@example.com', 'analyst')
+    with cached_app.app_context():
+        user_datastore.add_role_to_user(user_datastore.find_user(email='another@example.com'), 'admin')
+        db.session.commit()
+    with recorded_statements(cached_app) as statements:
+        assert _bulk(client).status_code == 403
+    assert statements == []
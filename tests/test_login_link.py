@@ -0,0 +1,40 @@
+# tests/test_login_link.py
+
+
+def _outbox_count(app):
+    from outbox.outbox_model import OutboxMessage
+    with app.app_context():
+        return OutboxMessage.query.count()
+
+
+def _request_link(client, email):
+    return client.post('/send-login-link', data={'email': email})
+
+
+def test_repeated_requests_for_an_address_share_one_email(app):
+    client = app.test_client()
+    statuses = [_request_link(client, email).status_code
+                for email in ('a@example.com', 'A@Example.com', ' a@example.com')]
+    assert statuses == [200, 200, 200]
+    assert _outbox_count(app) == 1
+    assert _request_link(client, 'b@example.com').status_code == 200
+    assert _outbox_count(app) == 2
+
+
+def test_an_address_over_its_limit_is_told_when_to_retry(app):
+    app.config.update(LOGIN_LINK_COALESCE_SECONDS=0, LOGIN_LINK_RATE_LIMIT_EMAIL='2/hour')
+    client = app.test_client()
+    assert [_request_link(client, 'a@example.com').status_code for _ in range(2)] == [200, 200]
+    response = _request_link(client, 'a@example.com')
+    assert response.status_code == 429
+    assert 0 < int(response.headers['Retry-After']) <= 1800
+    assert _outbox_count(app) == 2
+    assert _request_link(client, 'b@example.com').status_code == 200  # other addresses are unaffected
+
+
+def test_a_client_over_its_limit_is_refused_before_any_work(app):
+    app.config['LOGIN_LINK_RATE_LIMIT_IP'] = '3/minute'
+    client = app.test_client()
+    statuses = [_request_link(client, f'user{number}@example.com').status_code for number in range(5)]
+    assert statuses == [200, 200, 200, 429, 429]
+    assert _outbox_count(app) == 3
@@ -0,0 +1,42 @@
+# tests/test_metrics_profiler.py
+
+import json
+import os
+import stat
+import pytest
+
+
+@pytest.fixture
+def profiling_app(environment, monkeypatch, request):
+    """An app that profiles every request."""
+    monkeypatch.setenv('PROFILER_ENABLED', 'true')
+    monkeypatch.setenv('PROFILER_SAMPLE_RATE', '1')
+    return request.getfixturevalue('app')
+
+
+def _profiles(directory):
+    if not os.path.isdir(directory):
+        return []
+    return sorted(name for name in os.listdir(directory) if name.endswith('.json'))
+
+
+def test_login_links_are_not_profiled(profiling_app, environment):
+    response = profiling_app.test_client().get('/login/secret-token?token=secret')
+    response.close()
+    assert 'X-Profile-Id' not in response.headers
+    assert _profiles(environment['PROFILER_DIR']) == []
+
+
+def test_profiles_record_the_route_not_the_url_and_are_private(profiling_app, environment):
+    response = profiling_app.test_client().get('/api/projects?cursor=secret&page_size=5')
+    response.close()  # the profile is saved when the response is closed
+    directory = environment['PROFILER_DIR']
+    [name] = _profiles(directory)
+    with open(os.path.join(directory, name)) as f:
+        document = json.load(f)
+
+    assert document['id'] == response.headers['X-Profile-Id']
+    assert document['path'] == '/api/projects?cursor&page_size'
+    assert 'secret' not in json.dumps(document)
+    assert stat.S_IMODE(os.stat(directory).st_mode) == 0o700
+    assert stat.S_IMODE(os.stat(os.path.join(directory, name)).st_mode) == 0o600
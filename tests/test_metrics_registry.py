@@ -0,0 +1,63 @@
+# tests/test_metrics_registry.py
+
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+
+def _registry(directory, retention=60):
+    from metrics.metrics_registry import Counter, Registry
+
+    registry = Registry()
+    registry.enable_multiprocess(str(directory), interval=5, retention=retention)
+    registry._file = os.path.join(str(directory), f'{os.getpid()}-1.json')
+    Counter(registry, 'requests_total', 'Requests.').inc(3)
+    return registry
+
+
+def _worker_file(directory, pid, age):
+    path = os.path.join(str(directory), f'{pid}-1.json')
+    with open(path, 'w') as f:
+        json.dump({'pid': pid, 'metrics': {}}, f)
+    os.utime(path, (time.time() - age, time.time() - age))
+    return path
+
+
+def test_concurrent_flushes_do_not_collide(environment, tmp_path):
+    registry = _registry(tmp_path)
+    errors = []
+
+    def flush_repeatedly():
+        try:
+            for _ in range(200):
+                registry.flush()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=flush_repeatedly) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert os.listdir(tmp_path) == [os.path.basename(registry._file)]
+
+
+def test_files_of_exited_workers_are_pruned_after_retention(environment, tmp_path):
+    exited = subprocess.Popen([sys.executable, '-c', 'pass'])
+    exited.wait()
+    expired = _worker_file(tmp_path, exited.pid, age=120)
+    recent = _worker_file(tmp_path, exited.pid + 1_000_000, age=10)  # no such pid, but within retention
+    alive = _worker_file(tmp_path, os.getppid(), age=120)  # idle, yet its process still runs
+    leftover = os.path.join(str(tmp_path), 'x.json.abc.tmp')
+    open(leftover, 'w').close()
+    os.utime(leftover, (time.time() - 120, time.time() - 120))
+
+    snapshots = _registry(tmp_path).collect_all()
+
+    assert not os.path.exists(expired) and not os.path.exists(leftover)
+    assert os.path.exists(recent) and os.path.exists(alive)
+    assert {snapshot['pid'] for snapshot in snapshots} == {os.getpid(), exited.pid + 1_000_000, os.getppid()}
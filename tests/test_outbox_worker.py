@@ -0,0 +1,105 @@
+# tests/test_outbox_worker.py
+#
+# The standalone worker (python -m outbox.outbox_worker) must send queued
+# mail even with MAIL_OUTBOX_WORKERS=0, the setting the web processes use
+# when sending is left to it.
+
+import os
+import socketserver
+import subprocess
+import sys
+import threading
+import time
+from conftest import ROOT
+
+
+class SmtpSink(socketserver.ThreadingTCPServer):
+    """Accepts every message and counts it."""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), _SmtpHandler)
+        self.delivered = 0
+
+
+class _SmtpHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        self.reply('220 sink ready')
+        while line := self.rfile.readline():
+            command = line[:4].upper()
+            if command == b'DATA':
+                self.reply('354 end with <CRLF>.<CRLF>')
+                while (line := self.rfile.readline()) and line != b'.\r\n':
+                    pass
+                self.server.delivered += 1
+                self.reply('250 queued')
+            elif command == b'QUIT':
+                self.reply('221 bye')
+                return
+            else:
+                self.reply('250 ok')
+
+    def reply(self, text):
+        self.wfile.write(text.encode() + b'\r\n')
+
+
+def test_standalone_worker_drains_the_outbox(app, environment):
+    from extensions import db
+    from outbox.outbox_model import OutboxMessage
+    from outbox.outbox_worker import enqueue_message
+
+    sink = SmtpSink()
+    threading.Thread(target=sink.serve_forever, daemon=True).start()
+    environment = dict(environment, MAIL_SERVER='127.0.0.1', MAIL_PORT=str(sink.server_address[1]),
+                       MAIL_USE_TLS='false')
+    with app.app_context():
+        message_id = enqueue_message("Hello", sender='app@example.com',
+                                     recipients=['someone@example.com'], body="Hi").id
+
+    worker = subprocess.Popen([sys.executable, '-m', 'outbox.outbox_worker', '--workers', '1'],
+                              cwd=ROOT, env={**os.environ, **environment})
+    try:
+        deadline = time.monotonic() + 30
+        status = None
+        while time.monotonic() < deadline:
+            assert worker.poll() is None, "the standalone worker exited"
+            with app.app_context():
+                status = db.session.get(OutboxMessage, message_id).status
+            if status == OutboxMessage.STATUS_SENT:
+                break
+            time.sleep(0.2)
+        assert status == OutboxMessage.STATUS_SENT
+        assert sink.delivered == 1
+    finally:
+        worker.terminate()
+        worker.wait(10)
+        sink.shutdown()
+
+
+def test_expired_leases_count_as_attempts(app):
+    from datetime import datetime, timedelta
+    from extensions import db
+    from outbox.outbox_model import OutboxMessage
+
+    max_attempts = app.config['MAIL_OUTBOX_MAX_ATTEMPTS']
+    expired = datetime.utcnow() - timedelta(seconds=1)
+    with app.app_context():
+        # Claimed by workers that died mid-send: one with attempts to spare, one on its last
+        retried = OutboxMessage(subject="a", sender='app@example.com', recipients='a@example.com', body="a",
+                                status=OutboxMessage.STATUS_SENDING, attempts=1, next_attempt_at=expired)
+        doomed = OutboxMessage(subject="b", sender='app@example.com', recipients='b@example.com', body="b",
+                               status=OutboxMessage.STATUS_SENDING, attempts=max_attempts - 1,
+                               next_attempt_at=expired)
+        db.session.add_all([retried, doomed])
+        db.session.commit()
+        retried_id, doomed_id = retried.id, doomed.id
+
+        batch = app.extensions['outbox']._claim_batch()
+
+        assert [message.id for message in batch] == [retried_id]
+        assert batch[0].attempts == 2
+        doomed = db.session.get(OutboxMessage, doomed_id)
+        assert doomed.status == OutboxMessage.STATUS_FAILED
+        assert doomed.attempts == max_attempts
+        db.session.remove()
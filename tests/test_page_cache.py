@@ -0,0 +1,58 @@
+# tests/test_page_cache.py
+
+import pytest
+from conftest import recorded_statements
+
+
+@pytest.fixture
+def cached_app(environment, monkeypatch, request):
+    monkeypatch.setenv('PAGE_CACHE_BACKEND', 'memory')
+    return request.getfixturevalue('app')
+
+
+def _add_project(client, name):
+    response = client.post('/add', data={'name': name, 'short_description': '', 'background': '',
+                                         'start_date': '2024-01-01', 'end_date': ''})
+    assert response.status_code == 302
+
+
+def test_unchanged_listing_is_not_modified_after_one_lookup(cached_app):
+    client = cached_app.test_client()
+    _add_project(client, 'first')
+    response = client.get('/api/projects')
+    etag = response.headers['ETag']
+    assert response.headers['Cache-Control'] == 'no-cache' and response.last_modified is not None
+
+    with recorded_statements(cached_app) as statements:
+        response = client.get('/api/projects', headers={'If-None-Match': etag})
+    assert response.status_code == 304 and response.get_data() == b''
+    assert len(statements) == 1 and 'max(' in statements[0].lower()
+
+    _add_project(client, 'second')
+    response = client.get('/api/projects', headers={'If-None-Match': etag})
+    assert response.status_code == 200 and response.headers['ETag'] != etag
+
+
+def test_adding_a_project_replaces_the_cached_pages(cached_app):
+    client = cached_app.test_client()
+    _add_project(client, 'first')
+    assert client.get('/').headers['X-Page-Cache'] == 'miss'
+    response = client.get('/')
+    assert response.headers['X-Page-Cache'] == 'hit' and 'first' in response.get_data(as_text=True)
+
+    _add_project(client, 'second')
+    response = client.get('/')
+    assert response.headers['X-Page-Cache'] == 'miss' and 'second' in response.get_data(as_text=True)
+
+
+def test_creating_a_user_replaces_the_cached_users_page(cached_app):
+    from users.users_model import Role
+    client = cached_app.test_client()
+    assert client.get('/users').headers['X-Page-Cache'] == 'miss'
+    assert client.get('/users').headers['X-Page-Cache'] == 'hit'
+
+    with cached_app.app_context():
+        role_id = Role.query.first().id
+    client.post('/users/create', data={'name': 'New', 'email': 'new@example.com', 'role_id': role_id})
+    response = client.get('/users')
+    assert response.headers['X-Page-Cache'] == 'miss' and 'new@example.com' in response.get_data(as_text=True)
@@ -0,0 +1,44 @@
+# tests/test_projects_bulk.py
+
+import json
+from conftest import login
+
+
+def _import(client, body, fmt='ndjson', token='secret', **params):
+    query = '&'.join(f'{name}={value}' for name, value in {'format': fmt, **params}.items())
+    headers = {'Authorization': f'Bearer {token}'} if token else {}
+    return client.post(f'/projects/import?{query}', data=body, headers=headers)
+
+
+def test_requires_an_administrator_or_the_token(app):
+    from extensions import db, user_datastore
+    from users.users_model import Role
+    app.config['PROJECTS_IMPORT_TOKEN'] = 'secret'
+    client = app.test_client()
+    assert _import(client, '{"name": "a"}', token=None).status_code == 401
+    assert _import(client, '{"name": "a"}', token='wrong').status_code == 401
+    with app.app_context():
+        analyst = user_datastore.create_user(email='analyst@example.com', name='Analyst',
+                                             roles=[Role.query.filter_by(name='analyst').one()])
+        db.session.commit()
+        login(client, analyst.fs_uniquifier)
+    assert _import(client, '{"name": "a"}', token=None).status_code == 403
+    assert _import(client, '{"name": "a"}').json['inserted'] == 1
+
+
+def test_wrong_json_types_are_rejected_per_row(app):
+    app.config['PROJECTS_IMPORT_TOKEN'] = 'secret'
+    rows = [{'name': 5}, {'name': 'a', 'short_description': {'a': 1}}, {'name': 'b', 'background': [1]},
+            {'name': 'c', 'start_date': 20240101}, {'name': 'ok', 'start_date': '2024-01-01'}]
+    response = _import(app.test_client(), '\n'.join(json.dumps(row) for row in rows))
+    assert response.status_code == 200
+    assert response.json['inserted'] == 1
+    assert [error['line'] for error in response.json['errors']] == [1, 2, 3, 4]
+
+
+def test_invalid_utf8_is_a_400_reporting_what_was_imported(app):
+    app.config['PROJECTS_IMPORT_TOKEN'] = 'secret'
+    body = b'name\nfirst\nsecond\n\xff\xfe broken\n'
+    response = _import(app.test_client(), body, fmt='csv', chunk_size=1)
+    assert response.status_code == 400
+    assert 'UTF-8' in response.json['error']
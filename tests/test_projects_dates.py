@@ -0,0 +1,73 @@
+# tests/test_projects_dates.py
+
+import json
+
+
+def _add(client, name, start, end=''):
+    response = client.post('/add', data={'name': name, 'short_description': '', 'background': '',
+                                         'start_date': start, 'end_date': end})
+    assert response.status_code == 302
+
+
+def _stats(client, **bounds):
+    response = client.get('/api/projects/stats', query_string=bounds)
+    assert response.status_code == 200
+    return {row['month']: (row['started'], row['ended']) for row in response.json['months']}
+
+
+def _names(client, path, **params):
+    response = client.get(path, query_string=params)
+    assert response.status_code == 200
+    return [project['name'] for project in response.json['projects']]
+
+
+def test_stats_follow_adds_imports_edits_and_deletes(app):
+    from extensions import db
+    from projects.projects_model import Project
+    from projects.projects_stats import rebuild_project_stats
+    app.config['PROJECTS_IMPORT_TOKEN'] = 'secret'
+    client = app.test_client()
+
+    _add(client, 'a', '2024-01-10', '2024-03-05')
+    _add(client, 'b', '2024-01-20')
+    assert _stats(client) == {'2024-01': (2, 0), '2024-03': (0, 1)}
+
+    rows = [{'name': 'c', 'start_date': '2024-03-01', 'end_date': '2024-04-30'}, {'name': 'd'}]
+    response = client.post('/projects/import?format=ndjson', data='\n'.join(json.dumps(row) for row in rows),
+                           headers={'Authorization': 'Bearer secret'})
+    assert response.json['inserted'] == 2
+    assert _stats(client) == {'2024-01': (2, 0), '2024-03': (1, 1), '2024-04': (0, 1)}
+
+    with app.app_context():
+        project = Project.query.filter_by(name='b').one()
+        project.end_date = project.start_date.replace(month=2)
+        db.session.delete(Project.query.filter_by(name='a').one())
+        db.session.commit()
+    assert _stats(client) == {'2024-01': (1, 0), '2024-02': (0, 1), '2024-03': (1, 0), '2024-04': (0, 1)}
+    assert _stats(client, **{'from': '2024-02', 'to': '2024-03'}) == {'2024-02': (0, 1), '2024-03': (1, 0)}
+
+    with app.app_context():
+        db.session.execute(db.delete(Project).where(Project.name == 'c'))  # bulk: counted by a rebuild
+        db.session.commit()
+    assert _stats(client) == {'2024-01': (1, 0), '2024-02': (0, 1)}
+    with app.app_context():
+        rebuild_project_stats()
+        db.session.commit()
+    assert _stats(client) == {'2024-01': (1, 0), '2024-02': (0, 1)}
+
+
+def test_active_and_overlapping_projects(app):
+    client = app.test_client()
+    _add(client, 'january', '2024-01-01', '2024-01-31')
+    _add(client, 'spring', '2024-03-01', '2024-05-31')
+    _add(client, 'ongoing', '2024-02-15')
+    _add(client, 'backwards', '2024-04-01', '2024-03-01')  # ends before it starts: never active
+
+    assert _names(client, '/api/projects/active', on='2024-01-31') == ['january']
+    assert _names(client, '/api/projects/active', on='2024-02-01') == []
+    assert _names(client, '/api/projects/active', on='2024-03-15') == ['ongoing', 'spring']
+    assert _names(client, '/api/projects/overlapping', start='2024-01-20', end='2024-02-20') == \
+        ['january', 'ongoing']
+    assert _names(client, '/api/projects/overlapping', start='2025-01-01', end='2025-12-31') == ['ongoing']
+    assert client.get('/api/projects/overlapping?start=2024-02-01&end=2024-01-01').status_code == 400
+    assert client.get('/api/projects/active?on=soon').status_code == 400
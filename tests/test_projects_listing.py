@@ -0,0 +1,56 @@
+# tests/test_projects_listing.py
+
+from datetime import datetime
+from conftest import recorded_statements
+
+
+def _add_projects(app, count, created_at=None):
+    from extensions import db
+    from projects.projects_model import Project
+    with app.app_context():
+        projects = [Project(name=f'project {number}', created_at=created_at or datetime(2024, 1, 1 + number % 28))
+                    for number in range(count)]
+        db.session.add_all(projects)
+        db.session.commit()
+        return [project.id for project in projects]
+
+
+def _all_pages(client, path, key, limit):
+    pages, cursor = [], None
+    while True:
+        response = client.get(path, query_string={'limit': limit, **({'cursor': cursor} if cursor else {})})
+        assert response.status_code == 200
+        pages.append([item['id'] for item in response.json[key]])
+        cursor = response.json['next_cursor']
+        if cursor is None:
+            return pages
+
+
+def test_cursor_walks_every_project_once_in_order(app):
+    ids = _add_projects(app, 11)
+    pages = _all_pages(app.test_client(), '/api/projects', 'projects', limit=4)
+    assert [len(page) for page in pages] == [4, 4, 3]
+    seen = [project_id for page in pages for project_id in page]
+    assert sorted(seen) == sorted(ids) and len(set(seen)) == len(seen)
+
+
+def test_rows_created_at_the_same_instant_are_not_skipped_or_repeated(app):
+    ids = _add_projects(app, 7, created_at=datetime(2024, 5, 1, 12, 0))
+    pages = _all_pages(app.test_client(), '/api/projects', 'projects', limit=3)
+    assert [project_id for page in pages for project_id in page] == sorted(ids)
+
+
+def test_a_malformed_cursor_starts_from_the_beginning(app):
+    _add_projects(app, 2)
+    response = app.test_client().get('/api/projects?cursor=not-a-cursor')
+    assert len(response.json['projects']) == 2
+
+
+def test_the_listing_does_not_read_the_background_column(app):
+    _add_projects(app, 3)
+    client = app.test_client()
+    with recorded_statements(app) as statements:
+        assert client.get('/').status_code == 200
+        assert client.get('/api/projects').status_code == 200
+    listing = [statement for statement in statements if 'FROM projects' in statement]
+    assert listing and not any('background' in statement for statement in listing)
@@ -0,0 +1,73 @@
+# tests/test_projects_search.py
+#
+# Runs against SQLite, i.e. the FTS5 engine.
+
+
+def _add(app, **projects):
+    """Adds projects given as key=(name, short_description, background); returns key -> id."""
+    from extensions import db
+    from projects.projects_model import Project
+    with app.app_context():
+        rows = {key: Project(name=name, short_description=short, background=background)
+                for key, (name, short, background) in projects.items()}
+        db.session.add_all(rows.values())
+        db.session.commit()
+        return {key: row.id for key, row in rows.items()}
+
+
+def _search(client, q, **params):
+    response = client.get('/api/projects/search', query_string={'q': q, **params})
+    assert response.status_code == 200
+    return response.json
+
+
+def test_name_matches_outrank_description_matches(app):
+    ids = _add(app,
+               background=('Archive', 'Old records', 'Mostly about telescopes'),
+               name=('Telescope survey', 'Sky mapping', ''),
+               short=('Optics', 'Telescope mirror grinding', ''),
+               unrelated=('Gardening', 'Roses', 'Soil'))
+    results = _search(app.test_client(), 'telescope')['results']
+    assert [result['id'] for result in results] == [ids['name'], ids['short'], ids['background']]
+    assert results[0]['rank'] > results[1]['rank'] > results[2]['rank']
+
+
+def test_the_last_word_matches_as_a_prefix(app):
+    ids = _add(app, pipeline=('Data pipeline', '', ''), pip=('Pip packaging', '', ''), other=('Piano', '', ''))
+    client = app.test_client()
+    assert sorted(result['id'] for result in _search(client, 'pip')['results']) == \
+        sorted([ids['pipeline'], ids['pip']])
+    # Earlier words must match whole
+    assert [result['id'] for result in _search(client, 'data pipe')['results']] == [ids['pipeline']]
+    assert _search(client, 'dat pipeline')['results'] == []
+
+
+def test_edits_and_deletes_are_reflected(app):
+    from extensions import db
+    from projects.projects_model import Project
+    ids = _add(app, kept=('Comet tracker', '', ''), renamed=('Comet tail', '', ''), dropped=('Comet dust', '', ''))
+    with app.app_context():
+        db.session.get(Project, ids['renamed']).name = 'Asteroid belt'
+        db.session.delete(db.session.get(Project, ids['dropped']))
+        db.session.commit()
+    client = app.test_client()
+    assert [result['id'] for result in _search(client, 'comet')['results']] == [ids['kept']]
+    assert [result['id'] for result in _search(client, 'asteroid')['results']] == [ids['renamed']]
+
+
+def test_results_are_paginated(app):
+    _add(app, **{f'p{number}': (f'Nebula {number}', '', '') for number in range(5)})
+    client = app.test_client()
+    first = _search(client, 'nebula', limit=2)
+    second = _search(client, 'nebula', limit=2, offset=first['next_offset'])
+    last = _search(client, 'nebula', limit=2, offset=second['next_offset'])
+    seen = [result['id'] for page in (first, second, last) for result in page['results']]
+    assert len(seen) == len(set(seen)) == 5
+    assert last['next_offset'] is None
+
+
+def test_query_syntax_is_not_interpreted(app):
+    _add(app, one=('Quasar', '', ''))
+    client = app.test_client()
+    assert _search(client, 'quasar OR "NEAR(*')['results'] == []
+    assert _search(client, '')['results'] == []
@@ -0,0 +1,79 @@
+# tests/test_streaming.py
+
+import gzip
+import re
+from datetime import datetime
+from html import unescape
+from urllib.parse import parse_qs, urlsplit
+
+
+def _add_projects(app, count):
+    from extensions import db
+    from projects.projects_model import Project
+    with app.app_context():
+        db.session.add_all(Project(name=f'Project {number:03}', short_description='x' * 80,
+                                   created_at=datetime(2024, 1, 1, 0, number))
+                           for number in range(count))
+        db.session.commit()
+
+
+def _streamed_app(app):
+    app.config.update(STREAM_MIN_PAGE_SIZE=5, STREAM_BATCH_SIZE=2, STREAM_CHUNK_SIZE=256)
+    return app
+
+
+def _names(html):
+    return re.findall(r'<td[^>]*>(Project \d+)</td>', html)
+
+
+def test_long_pages_are_streamed_with_every_row_and_a_next_link(app):
+    _add_projects(app, 12)
+    client = _streamed_app(app).test_client()
+    response = client.get('/', query_string={'limit': 10})
+    assert response.is_streamed
+    html = response.get_data(as_text=True)
+    response.close()
+    assert _names(html) == [f'Project {number:03}' for number in range(10)]
+
+    link = re.search(r'href="([^"]*cursor=[^"]*)"[^>]*>\s*Next page', html).group(1)
+    response = client.get('/', query_string=parse_qs(urlsplit(unescape(link)).query))
+    assert _names(response.get_data(as_text=True)) == ['Project 010', 'Project 011']
+    response.close()
+
+
+def test_large_pages_are_gzipped_for_clients_that_accept_it(app):
+    _add_projects(app, 40)
+    client = _streamed_app(app).test_client()
+    plain = client.get('/', query_string={'limit': 40})
+    compressed = client.get('/', query_string={'limit': 40}, headers={'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in plain.headers
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in compressed.headers['Vary']
+    assert gzip.decompress(compressed.get_data()) == plain.get_data()
+    plain.close()
+    compressed.close()
+
+
+def test_small_responses_are_not_compressed(app):
+    response = app.test_client().get('/api/projects', headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200 and 'Content-Encoding' not in response.headers
+    assert response.json['projects'] == []
+
+
+def test_chunks_are_compressed_as_they_arrive(app):
+    from utils.compression import CompressionMiddleware
+    produced = []
+
+    # A generator, so start_response is only called once the middleware starts reading the body
+    def slow_app(environ, start_response):
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        for number in range(3):
+            produced.append(number)
+            yield b'%d' % number * 2048
+
+    middleware = CompressionMiddleware(slow_app, app.config)
+    body = middleware({'REQUEST_METHOD': 'GET', 'HTTP_ACCEPT_ENCODING': 'gzip'}, lambda status, headers: None)
+    first = next(body)
+    assert produced == [0] and first  # sent before the app produced its next chunk
+    rest = b''.join(body)
+    assert gzip.decompress(first + rest) == b''.join(b'%d' % number * 2048 for number in range(3))
@@ -0,0 +1,93 @@
+# tests/test_users_bulk.py
+
+import pytest
+from conftest import login
+
+
+def _admin(app, email='admin@example.com', role='admin'):
+    from extensions import db, user_datastore
+    from users.users_model import Role
+    with app.app_context():
+        user = user_datastore.create_user(email=email, name='Admin',
+                                          roles=[Role.query.filter_by(name=role).one()])
+        db.session.commit()
+        return user.fs_uniquifier
+
+
+def _count(app, model, *criteria):
+    with app.app_context():
+        return model.query.filter(*criteria).count()
+
+
+def _post(client, rows, **params):
+    query = '&'.join(f'{name}={value}' for name, value in params.items())
+    return client.post(f'/users/bulk?{query}', json=rows)
+
+
+def test_requires_an_administrator(app):
+    client = app.test_client()
+    assert _post(client, [{'email': 'a@example.com'}]).status_code == 401
+    login(client, _admin(app, 'analyst@example.com', role='analyst'))
+    assert _post(client, [{'email': 'a@example.com'}]).status_code == 403
+
+
+def test_token_is_accepted(app):
+    app.config['USERS_BULK_TOKEN'] = 'secret'
+    response = app.test_client().post('/users/bulk', json=[{'email': 'a@example.com'}],
+                                      headers={'Authorization': 'Bearer secret'})
+    assert response.status_code == 200 and response.json['created'] == 1
+
+
+def test_rejects_invalid_and_non_string_values(app):
+    from users.users_model import User
+    client = app.test_client()
+    login(client, _admin(app))
+    response = _post(client, [{'email': '@'}, {'email': ['q@example.com']}, {'email': 'ok@example.com', 'name': 5},
+                              {'email': 'x@example.com', 'roles': [1]}, {'email': ' Good@Example.COM '}])
+    assert [result['status'] for result in response.json['results']] == \
+        ['rejected', 'rejected', 'rejected', 'rejected', 'created']
+    assert response.json['results'][4]['email'] == 'Good@example.com'  # domain normalized, as Flask-Security does
+    assert _count(app, User, User.email != 'admin@example.com') == 1
+
+
+def test_existing_emails_match_regardless_of_case(app):
+    from users.users_model import User
+    client = app.test_client()
+    login(client, _admin(app))
+    assert _post(client, [{'email': 'Alice@X.com'}]).json['created'] == 1
+    response = _post(client, [{'email': 'alice@x.com'}])
+    assert response.json['results'][0]['status'] == 'exists'
+    assert _count(app, User, User.email.ilike('alice@x.com')) == 1
+
+
+def test_invitations_are_rate_limited(app):
+    from outbox.outbox_model import OutboxMessage
+    from users.users_model import User
+    app.config['USERS_BULK_INVITE_RATE_LIMIT'] = '3/hour'
+    client = app.test_client()
+    login(client, _admin(app))
+    rows = [{'email': f'user{number}@example.com'} for number in range(5)]
+    response = _post(client, rows, invite=1, chunk_size=2)
+    # 2 invitations, then a chunk of 2 doesn't fit in the 1 left, then the last row does
+    assert [result['status'] for result in response.json['results']] == \
+        ['created', 'created', 'rejected', 'rejected', 'created']
+    assert _count(app, OutboxMessage) == 3
+    assert _count(app, User, User.email.like('user%')) == 3
+
+
+def test_chunks_larger_than_the_invite_limit_are_split_to_fit(app):
+    from outbox.outbox_model import OutboxMessage
+    app.config['USERS_BULK_INVITE_RATE_LIMIT'] = '3/hour'
+    client = app.test_client()
+    login(client, _admin(app))
+    rows = [{'email': f'user{number}@example.com'} for number in range(4)]
+    response = _post(client, rows, invite=1, chunk_size=100)
+    assert [result['status'] for result in response.json['results']] == \
+        ['created', 'created', 'created', 'rejected']
+    assert response.json['invited'] == _count(app, OutboxMessage) == 3
+
+
+def test_a_cost_beyond_the_capacity_is_refused(app):
+    with app.app_context():
+        with pytest.raises(ValueError):
+            app.extensions['rate_limiter'].hit('test', 'key', '3/hour', cost=4)
@@ -0,0 +1,57 @@
+# tests/test_users_listing.py
+
+import re
+from html import unescape
+from urllib.parse import parse_qs, urlsplit
+from conftest import recorded_statements
+
+
+def _add_users(app, count, start=0):
+    from extensions import db, user_datastore
+    from users.users_model import Role
+    with app.app_context():
+        roles = Role.query.order_by(Role.id).all()
+        for number in range(start, start + count):
+            # Two roles each, so the roles relationship has something to load per user
+            user_datastore.create_user(email=f'user{number}@example.com', name=f'User {number}',
+                                       roles=roles[:2])
+        db.session.commit()
+
+
+def _listed(html):
+    """The emails on a rendered /users page and the cursor of its next-page link, if any."""
+    emails = re.findall(r'<td[^>]*>\s*(user\d+@example\.com)\s*</td>', html)
+    link = re.search(r'href="([^"]*cursor=[^"]*)"[^>]*>\s*Next page', html)
+    cursor = parse_qs(urlsplit(unescape(link.group(1))).query)['cursor'][0] if link else None
+    return emails, cursor
+
+
+def test_cursor_walks_every_user_once(app):
+    _add_users(app, 9)
+    client = app.test_client()
+    pages, cursor = [], None
+    while True:
+        response = client.get('/users', query_string={'limit': 4, **({'cursor': cursor} if cursor else {})})
+        assert response.status_code == 200
+        emails, cursor = _listed(response.get_data(as_text=True))
+        pages.append(emails)
+        if cursor is None:
+            break
+    seen = [email for page in pages for email in page]
+    assert len(set(seen)) == len(seen)
+    assert sorted(seen) == sorted(f'user{number}@example.com' for number in range(9))
+
+
+def test_query_count_does_not_grow_with_the_users_listed(app):
+    client = app.test_client()
+
+    def queries_for_a_page():
+        with recorded_statements(app) as statements:
+            assert client.get('/users', query_string={'limit': 50}).status_code == 200
+        return len(statements)
+
+    _add_users(app, 2)
+    queries_for_a_page()  # warms the role cache
+    few = queries_for_a_page()
+    _add_users(app, 30, start=2)
+    assert queries_for_a_page() == few
@@ -0,0 +1,19 @@
+# users/users_access.py
+#
+# Access check shared by the bulk endpoints (/users/bulk, /projects/import):
+# the caller is a logged-in user with a given role, or a script bearing a
+# configured token ("Authorization: Bearer <token>").
+
+import hmac
+from flask import request
+from flask_security import current_user
+
+
+def role_or_token(role, token=None):
+    """Who is calling: 'token' or 'user:<id>'. None if the request has neither the token nor the role."""
+    supplied = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+    if token and supplied and hmac.compare_digest(supplied, token):
+        return 'token'
+    if current_user.is_authenticated and current_user.has_role(role):
+        return f'user:{current_user.id}'
+    return None
@@ -0,0 +1,28 @@
+# users/users_async.py
+#
+# Event-loop version of the user listing view, for the ASGI server (see
+# utils/async_views.py). Keep it in step with users_routes.py.
+
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+from utils.async_views import async_view
+from utils.pagination import keyset_page_async, page_size_from
+from .users_model import User
+from .users_routes import _user_to_dict
+
+
+@async_view('/api/users', 'users.list_users_json', 'users')
+async def list_users_json(request, session, config):
+    page = await keyset_page_async(
+        session,
+        select(User).options(selectinload(User.roles)),
+        User.created_at,
+        User.id,
+        cursor=request.args.get('cursor'),
+        page_size=page_size_from(request.args, config, 'USERS_PAGE_SIZE'),
+    )
+    return dict(
+        users=[_user_to_dict(user) for user in page.items],
+        next_cursor=page.next_cursor,
+        page_size=page.page_size,
+    )
@@ -0,0 +1,246 @@
+# users/users_bulk.py
+#
+# Bulk user provisioning from CSV, NDJSON or a JSON array of
+# {name, email, roles} rows. Roles are resolved once per request. Each chunk
+# of rows then costs a fixed number of statements, however many rows it has:
+# one IN query for emails that already exist, one executemany INSERT for the
+# users, one for their roles_users rows and (with invitations) one for their
+# login-link emails, all committed in a single transaction per chunk.
+# Emails are normalized as Flask-Security does and compared without regard
+# to case. Existing users are reported and left alone, so no cached identity
+# (users/users_cache.py) goes stale.
+
+import json
+import logging
+import re
+import uuid
+from datetime import datetime
+from flask import current_app, url_for
+from sqlalchemy import func, insert, select
+from sqlalchemy.exc import IntegrityError
+from projects.projects_bulk import detect_format as detect_projects_format, iter_rows as iter_projects_rows
+from outbox.outbox_worker import enqueue_messages
+from .users_model import db, User, roles_users
+from .users_cache import role_cache
+
+log = logging.getLogger(__name__)
+
+FORMATS = ('csv', 'ndjson', 'json')
+MAX_EMAIL_LENGTH = 255
+_ROLE_SEPARATORS = re.compile(r'[;,|]')
+
+CREATED = 'created'
+EXISTS = 'exists'
+REJECTED = 'rejected'
+
+
+def detect_format(filename=None, content_type=None, requested=None):
+    if requested:
+        return requested if requested in FORMATS else None
+    if filename and filename.lower().endswith('.json'):
+        return 'json'
+    if content_type and content_type.split(';', 1)[0].strip() == 'application/json':
+        return 'json'
+    return detect_projects_format(filename, content_type)
+
+
+def iter_rows(binary_stream, fmt):
+    """Yields (line_number, dict) pairs; for a JSON array the number is the 1-based position."""
+    if fmt != 'json':
+        yield from iter_projects_rows(binary_stream, fmt)
+        return
+    try:
+        rows = json.load(binary_stream)
+    except ValueError as e:
+        raise ValueError(f"invalid JSON: {e}") from e
+    if isinstance(rows, dict):
+        rows = rows.get('users')
+    if not isinstance(rows, list):
+        raise ValueError("expected a JSON array of users, or {\"users\": [...]}")
+    for position, row in enumerate(rows, start=1):
+        yield position, row if isinstance(row, dict) else ValueError("expected a JSON object")
+
+
+def _role_names(value):
+    if value is None:
+        return []
+    if isinstance(value, str):
+        value = _ROLE_SEPARATORS.split(value)
+    if not isinstance(value, list) or not all(isinstance(name, str) for name in value):
+        raise ValueError("roles must be a list of names or a ;-separated string")
+    return [name.strip() for name in value if name.strip()]
+
+
+def _validate_chunk(chunk, role_ids, results, seen):
+    """Turns raw rows into pending users, recording rejected rows in results."""
+    mail_util = current_app.extensions['security']._mail_util
+    valid = []
+    for line_number, row in chunk:
+        def reject(message, email=None):
+            results.append({'line': line_number, 'email': email, 'status': REJECTED, 'error': message})
+
+        if isinstance(row, Exception):
+            reject(str(row))
+            continue
+        email, name = row.get('email'), row.get('name')
+        if not isinstance(email, str) or not email.strip():
+            reject("email is required and must be a string")
+            continue
+        try:
+            # Syntax only: no DNS lookups for thousands of rows
+            email = mail_util.normalize(email.strip())
+        except ValueError:
+            reject("invalid email address", email.strip())
+            continue
+        if len(email) > MAX_EMAIL_LENGTH:
+            reject("email is too long", email)
+            continue
+        if name is not None and not isinstance(name, str):
+            reject("name must be a string", email)
+            continue
+        if email.lower() in seen:
+            reject(f"duplicate of line {seen[email.lower()]}", email)
+            continue
+        try:
+            names = _role_names(row.get('roles'))
+        except ValueError as e:
+            reject(str(e), email)
+            continue
+        unknown = [name for name in names if name.lower() not in role_ids]
+        if unknown:
+            reject(f"unknown role: {', '.join(unknown)}", email)
+            continue
+        seen[email.lower()] = line_number
+        valid.append({
+            'line': line_number,
+            'email': email,
+            'name': (name or '').strip()[:255] or email.split('@')[0],
+            'role_ids': sorted({role_ids[name.lower()] for name in names}),
+        })
+    return valid
+
+
+def _insert_users(pending):
+    """Inserts pending users and returns {email: id}."""
+    now = datetime.utcnow()
+    rows = [{'email': user['email'], 'name': user['name'], 'active': True,
+             'fs_uniquifier': user['fs_uniquifier'], 'created_at': now} for user in pending]
+    if db.session.get_bind(User).dialect.insert_executemany_returning:
+        created = db.session.execute(insert(User).returning(User.id, User.email), rows)
+    else:
+        db.session.execute(insert(User), rows)
+        created = db.session.execute(
+            select(User.id, User.email).where(User.email.in_([row['email'] for row in rows])))
+    return {email: user_id for user_id, email in created}
+
+
+def _invitations(pending):
+    security = current_app.extensions['security']
+    sender = current_app.config.get('MAIL_DEFAULT_SENDER') or current_app.config.get('SECURITY_EMAIL_SENDER')
+    if not sender:
+        raise RuntimeError("MAIL_DEFAULT_SENDER or SECURITY_EMAIL_SENDER not configured.")
+    valid_for = current_app.config.get('SECURITY_LOGIN_WITHIN', '24 hours')
+    messages = []
+    for user in pending:
+        # Same token as flask_security.passwordless.generate_login_token, without loading the User
+        token = security.login_serializer.dumps([user['fs_uniquifier']])
+        link = url_for('users.login_with_token', token=token, _external=True)
+        messages.append({
+            'subject': "You're invited to ContextWindow",
+            'sender': sender,
+            'recipients': [user['email']],
+            'body': f"An account has been created for you. Click this link to log in (valid for {valid_for}): {link}",
+        })
+    return messages
+
+
+def _provision_chunk(chunk, role_ids, seen, reserve_invitations, results):
+    valid = _validate_chunk(chunk, role_ids, results, seen)
+    if not valid:
+        return
+    for attempt in range(2):
+        # Emails are unique regardless of case (ix_users_email_lower serves this lookup)
+        existing = set(db.session.scalars(
+            select(func.lower(User.email)).where(func.lower(User.email).in_([user['email'].lower() for user in valid]))))
+        pending = [dict(user, fs_uniquifier=uuid.uuid4().hex)
+                   for user in valid if user['email'].lower() not in existing]
+        if pending and reserve_invitations is not None:
+            retry_after = reserve_invitations(len(pending))
+            if retry_after:
+                # Not created either, so the same rows can simply be sent again later
+                db.session.rollback()
+                for user in valid:
+                    if user['email'].lower() in existing:
+                        results.append({'line': user['line'], 'email': user['email'], 'status': EXISTS})
+                    else:
+                        results.append({'line': user['line'], 'email': user['email'], 'status': REJECTED,
+                                        'error': f"invitation rate limit reached; retry in {retry_after}s"})
+                return
+        try:
+            ids = _insert_users(pending) if pending else {}
+            links = [{'user_id': ids[user['email']], 'role_id': role_id}
+                     for user in pending for role_id in user['role_ids']]
+            if links:
+                db.session.execute(roles_users.insert(), links)
+            if pending and reserve_invitations is not None:
+                enqueue_messages(_invitations(pending))  # commits
+            else:
+                db.session.commit()
+            break
+        except IntegrityError:
+            # Another request created one of these emails after the IN query; look again
+            db.session.rollback()
+            if attempt:
+                raise
+    invited = reserve_invitations is not None
+    for user in valid:
+        if user['email'].lower() in existing:
+            results.append({'line': user['line'], 'email': user['email'], 'status': EXISTS})
+        else:
+            results.append({'line': user['line'], 'email': user['email'], 'status': CREATED,
+                            'id': ids[user['email']], 'invited': invited})
+
+
+def provision_users(rows, chunk_size=500, reserve_invitations=None):
+    """
+    Creates users from (line_number, row) pairs in chunks of chunk_size, one
+    transaction per chunk.
+
+    To also queue a login link for each new user, in the same transaction,
+    pass reserve_invitations: called with the number of links a chunk is
+    about to send, it returns None to go ahead or the seconds to wait. A
+    chunk that is refused creates nothing; its new rows are reported as
+    rejected.
+
+    Returns one result per row, in input order within each chunk:
+    {'line', 'email', 'status': 'created' | 'exists' | 'rejected', 'id' or 'error'};
+    created rows also say whether a login link was queued ('invited').
+    A chunk that fails is rolled back and its rows reported as rejected; the
+    other chunks are unaffected.
+    """
+    role_ids = {role.name.lower(): role.id for role in role_cache.all()}
+    results = []
+    seen = {}  # lowercased email -> line, to catch duplicates within the upload
+
+    def flush(chunk):
+        chunk_results = []
+        try:
+            _provision_chunk(chunk, role_ids, seen, reserve_invitations, chunk_results)
+        except Exception as e:
+            db.session.rollback()
+            log.exception("Bulk provisioning chunk failed.")
+            rejected = {result['line'] for result in chunk_results}  # by validation, before the failure
+            chunk_results += [{'line': line_number, 'email': row.get('email') if isinstance(row, dict) else None,
+                               'status': REJECTED, 'error': f"not saved: {e}"}
+                              for line_number, row in chunk if line_number not in rejected]
+        results.extend(sorted(chunk_results, key=lambda result: result['line']))
+
+    chunk = []
+    for item in rows:
+        chunk.append(item)
+        if len(chunk) >= chunk_size:
+            flush(chunk)
+            chunk = []
+    if chunk:
+        flush(chunk)
+    return results
@@ -0,0 +1,214 @@
+# users/users_cache.py
+
+import threading
+import time
+import uuid
+from collections import namedtuple
+from flask import current_app, session
+from flask_security import RoleMixin, UserMixin
+from flask_security.utils import set_request_attr
+from sqlalchemy import event, inspect
+from projects.projects_model import db
+from utils.cache import create_cache
+from .users_model import User, Role
+
+# Immutable, session-independent copy of a Role row
+RoleInfo = namedtuple('RoleInfo', ['id', 'name', 'description'])
+
+
+class RoleCache:
+    """
+    Process-local cache of the (small, rarely changing) roles table.
+
+    Entries expire after ROLE_CACHE_TTL seconds. Commits that insert, update
+    or delete a Role in this process drop the cache immediately; other
+    workers pick the change up when their TTL runs out.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._roles = None
+        self._loaded_at = 0.0
+
+    def all(self):
+        roles = self._roles
+        ttl = current_app.config.get('ROLE_CACHE_TTL', 300)
+        if roles is not None and time.monotonic() - self._loaded_at < ttl:
+            return roles
+        return self.prime()
+
+    def prime(self):
+        """Loads the roles table into the cache; all() calls it on first use and after expiry."""
+        roles = tuple(
+            RoleInfo(role.id, role.name, role.description)
+            for role in db.session.query(Role).order_by(Role.id)
+        )
+        with self._lock:
+            self._roles = roles
+            self._loaded_at = time.monotonic()
+        return roles
+
+    def invalidate(self):
+        with self._lock:
+            self._roles = None
+
+
+role_cache = RoleCache()
+
+
+# --- Invalidation on write ---
+
+@event.listens_for(db.session, 'before_flush')
+def _track_role_writes(session, flush_context, instances):
+    # Giving a user a role also dirties the Role through its users backref; only column changes count
+    changed = (*session.new, *session.deleted,
+               *(obj for obj in session.dirty if session.is_modified(obj, include_collections=False)))
+    if any(isinstance(obj, Role) for obj in changed):
+        session.info['roles_changed'] = True
+
+
+@event.listens_for(db.session, 'after_commit')
+def _invalidate_roles_on_commit(session):
+    if session.info.pop('roles_changed', False):
+        role_cache.invalidate()
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _forget_role_writes(session):
+    session.info.pop('roles_changed', None)
+
+
+# --- Identity cache ---
+
+class CachedRole(RoleMixin, namedtuple('CachedRole', ['id', 'name'])):
+    """A role as seen by permission checks; compares equal to a Role or role name."""
+    __slots__ = ()
+
+
+class CachedUser(UserMixin, namedtuple('CachedUser', ['id', 'email', 'name', 'active', 'fs_uniquifier', 'roles'])):
+    """
+    Immutable snapshot of an authenticated user and their roles, used as
+    current_user. It never touches the database; call load() for the real
+    User row before changing anything.
+    """
+    __slots__ = ()
+
+    def load(self):
+        return db.session.get(User, self.id)
+
+
+class IdentityCache:
+    """
+    Caches the user behind a session, keyed by fs_uniquifier, so
+    authenticated requests need no queries to load current_user.
+
+    Writes to a User (including role assignment and deactivation) drop that
+    user's entry on commit; writes to a Role, or bulk updates, drop every
+    entry by moving to a new key generation. With the 'memory' backend other
+    workers only see this after IDENTITY_CACHE_TTL seconds; the 'sqlite'
+    backend shares entries and invalidations between the workers on a host.
+    """
+
+    def __init__(self):
+        self.backend = None
+        self.datastore = None
+
+    def init_app(self, app, security):
+        app.config.setdefault('IDENTITY_CACHE_BACKEND', 'memory')
+        app.config.setdefault('IDENTITY_CACHE_TTL', 300)
+        app.config.setdefault('IDENTITY_CACHE_MAX_ENTRIES', 10000)
+        app.config.setdefault('IDENTITY_CACHE_PATH', None)
+        self.backend = create_cache(
+            app.config['IDENTITY_CACHE_BACKEND'],
+            path=app.config['IDENTITY_CACHE_PATH'],
+            default_ttl=app.config['IDENTITY_CACHE_TTL'],
+            max_entries=app.config['IDENTITY_CACHE_MAX_ENTRIES'],
+        )
+        self.datastore = security.datastore
+        # Replaces Flask-Security's loader, which queries the user (and roles) on every request
+        security.login_manager.user_loader(self.load_user)
+        app.extensions['identity_cache'] = self
+
+    def _key(self, fs_uniquifier):
+        generation = self.backend.get('identity:generation')
+        if generation is None:
+            generation = uuid.uuid4().hex[:12]
+            self.backend.set('identity:generation', generation, ttl=0)
+        return f'identity:{generation}:{fs_uniquifier}'
+
+    def get(self, fs_uniquifier):
+        """Returns the CachedUser for fs_uniquifier (loading it on a miss), or None."""
+        key = self._key(fs_uniquifier)
+        data = self.backend.get(key)
+        if data is None:
+            user = self.datastore.find_user(fs_uniquifier=fs_uniquifier)
+            if user is None:
+                return None
+            # Plain values only, so entries stay readable across code changes
+            data = (user.id, user.email, user.name, bool(user.active), user.fs_uniquifier,
+                    tuple((role.id, role.name) for role in user.roles))
+            self.backend.set(key, data)
+        *fields, roles = data
+        return CachedUser(*fields, tuple(CachedRole(*role) for role in roles))
+
+    def load_user(self, user_id):
+        # Same contract as flask_security.core._user_loader
+        if self.backend is None:
+            user = self.datastore.find_user(fs_uniquifier=str(user_id))
+        else:
+            user = self.get(str(user_id))
+        if user and user.active:
+            set_request_attr('fs_authn_via', 'session')
+            set_request_attr('fs_paa', session.get('fs_paa', 0))
+            return user
+        return None
+
+    def invalidate(self, fs_uniquifier):
+        if self.backend is not None:
+            self.backend.delete(self._key(fs_uniquifier))
+
+    def invalidate_all(self):
+        if self.backend is not None:
+            self.backend.set('identity:generation', uuid.uuid4().hex[:12], ttl=0)
+
+
+identity_cache = IdentityCache()
+
+
+# --- Identity invalidation on write ---
+
+@event.listens_for(db.session, 'before_flush')
+def _track_identity_writes(session, flush_context, instances):
+    changed = session.info.setdefault('identities_changed', set())
+    for obj in (*session.dirty, *session.deleted):
+        if isinstance(obj, User):
+            # Both the current and (if it is being rotated) the previous uniquifier
+            history = inspect(obj).attrs.fs_uniquifier.history
+            changed.update(value for value in (*history.unchanged, *history.deleted, *history.added) if value)
+        elif isinstance(obj, Role) and (obj in session.deleted
+                                        or session.is_modified(obj, include_collections=False)):
+            # Not when it is only dirty because a user was given the role; that user is handled above
+            session.info['all_identities_changed'] = True
+
+
+@event.listens_for(db.session, 'do_orm_execute')
+def _track_bulk_identity_writes(orm_execute_state):
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and mapper.class_ in (User, Role):
+        orm_execute_state.session.info['all_identities_changed'] = True
+
+
+@event.listens_for(db.session, 'after_commit')
+def _invalidate_identities_on_commit(session):
+    if session.info.pop('all_identities_changed', False):
+        identity_cache.invalidate_all()
+    for fs_uniquifier in session.info.pop('identities_changed', ()):
+        identity_cache.invalidate(fs_uniquifier)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _forget_identity_writes(session):
+    session.info.pop('all_identities_changed', None)
+    session.info.pop('identities_changed', None)
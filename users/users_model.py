@@ -18,7 +18,11 @@ class Role(db.Model, RoleMixin):
 
 class User(db.Model, UserMixin):
     __tablename__ = 'users'
-    
+    __table_args__ = (
+        # Supports keyset pagination on the users listing (see users.list_users)
+        db.Index('ix_users_created_at_id', 'created_at', 'id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(255), unique=True, nullable=False)
     password = db.Column(db.String(255))
@@ -30,3 +34,6 @@ class User(db.Model, UserMixin):
     
     roles = db.relationship('Role', secondary=roles_users,
                           backref=db.backref('users', lazy='dynamic'))
+
+# Case-insensitive email lookups (see users/users_bulk.py)
+db.Index('ix_users_email_lower', db.func.lower(User.email))
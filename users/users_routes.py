@@ -1,190 +1,207 @@
 # users/users_routes.py
 
-import traceback
-from flask import Blueprint, render_template, request, redirect, url_for, current_app
-from flask_mail import Message
+import io
+import logging
+from flask import Blueprint, render_template, request, redirect, url_for, current_app, jsonify
 # Import only login_user from utils, as generate/verify aren't there
+from flask_security import current_user
 from flask_security.utils import login_user
 # Import itsdangerous exceptions for verification
 from itsdangerous import SignatureExpired, BadSignature
+from sqlalchemy.orm import selectinload
 from .users_model import User, Role, db
-# Import mail and security objects initialized in main.py
-from main import mail, security, user_datastore # Import user_datastore here too
+from .users_cache import role_cache
+from .users_access import role_or_token
+from .users_bulk import detect_format, iter_rows, provision_users, CREATED, EXISTS, REJECTED
+from utils.pagination import keyset_page, keyset_stream, page_size_from
+from utils.page_cache import page_cache
+from utils.streaming import render_streamed
+from utils.db_routing import replica_router
+from outbox.outbox_worker import enqueue_message
+# Shared extension objects (bound to the app in main.create_app)
+from extensions import security, user_datastore, rate_limiter
+from utils.rate_limit import client_ip, parse_limit
 
 users_bp = Blueprint('users', __name__)
+log = logging.getLogger(__name__)
+page_cache.watch(User, 'users')
+page_cache.watch(Role, 'users')  # the role dropdown is part of the page
 
 @users_bp.route('/users_login')
 def login():
-    current_app.logger.info("Rendering login page")
-    print("DEBUG: Rendering login page (users/users_login.html)")
+    log.debug("Rendering login page (users/users_login.html)")
     return render_template('users/users_login.html')
 
 @users_bp.route('/send-login-link', methods=['POST'])
 def send_login_link():
-    print("\n--- DEBUG: Entered send_login_link route ---")
+    log.debug("Entered send_login_link route")
     user = None
+    claimed = queued = None
     try:
         email = request.form.get('email')
-        print(f"DEBUG: Received email from form: {email}")
+        log.debug("Received email from form: %s", email)
         if not email:
-            print("ERROR: No email provided in form.")
+            log.warning("No email provided in form.")
             return "Email is required.", 400
 
+        # --- Throttling (before any database or mail work) ---
+        retry_after = rate_limiter.hit('login-ip', client_ip(), current_app.config['LOGIN_LINK_RATE_LIMIT_IP'])
+        if retry_after:
+            log.warning("Login link rate limit hit for IP %s.", client_ip())
+            return "Too many login requests. Please try again later.", 429, {'Retry-After': str(retry_after)}
+        email_key = email.strip().lower()
+        if not rate_limiter.claim('login-link', email_key, current_app.config['LOGIN_LINK_COALESCE_SECONDS']):
+            # A link for this address was just queued; don't send another one
+            log.debug("Coalesced login link request for %s into the pending one.", email)
+            return "Login link has been sent to your email", 200
+        claimed = email_key
+        retry_after = rate_limiter.hit('login-email', email_key, current_app.config['LOGIN_LINK_RATE_LIMIT_EMAIL'])
+        if retry_after:
+            log.warning("Login link rate limit hit for email %s.", email)
+            return "Too many login requests. Please try again later.", 429, {'Retry-After': str(retry_after)}
+
         # Ensure necessary objects are available
         if not user_datastore:
-             print("ERROR: user_datastore not available.")
+             log.error("user_datastore not available.")
              return "Server configuration error (datastore).", 500
         if not security:
-             print("ERROR: security object not available.")
+             log.error("security object not available.")
              return "Server configuration error (security object).", 500
         if not hasattr(security, 'login_serializer'):
-             print("ERROR: security object missing 'login_serializer'. Check Flask-Security setup.")
+             log.error("security object missing 'login_serializer'. Check Flask-Security setup.")
              return "Server configuration error (login serializer missing).", 500
-        print("DEBUG: user_datastore, security object, and login_serializer available.")
+        log.debug("user_datastore, security object, and login_serializer available.")
 
-        print(f"DEBUG: Querying for user with email: {email}")
+        log.debug("Querying for user with email: %s", email)
         user = user_datastore.find_user(email=email)
 
         if not user:
-            print(f"DEBUG: User not found for email {email}. Attempting to create user.")
+            log.debug("User not found for email %s. Attempting to create user.", email)
             try:
                 user = user_datastore.create_user(
                     email=email,
                     name=email.split('@')[0]
                 )
                 db.session.commit()
-                print(f"DEBUG: Successfully created new user: {user}")
-                print("DEBUG: db.session.commit() called after user creation.")
+                log.debug("Successfully created new user: %s", user)
 
             except Exception as e_create:
                 db.session.rollback()
-                print(f"ERROR: Failed to create user for email {email}.")
-                print(traceback.format_exc())
+                log.exception("Failed to create user for email %s.", email)
                 return f"Failed to process user: {e_create}", 500
         else:
-            print(f"DEBUG: Found existing user: {user}")
+            log.debug("Found existing user: %s", user)
 
         if not user or not hasattr(user, 'get_id'): # Check for get_id method
-             print(f"ERROR: User object is invalid or missing get_id method: {user}")
+             log.error("User object is invalid or missing get_id method: %s", user)
              return "Failed to retrieve or create user properly.", 500
 
-        print(f"DEBUG: Attempting to generate login token for user: {user.email} (ID: {user.get_id()}) using login_serializer.dumps()")
+        log.debug("Attempting to generate login token for user: %s (ID: %s) using login_serializer.dumps()", user.email, user.get_id())
         token = None
         try:
             # --- THIS IS THE FIX for Generation ---
             # Use the serializer's dumps() method directly. It typically serializes the user ID.
             # Use user.get_id() as Flask-Login does.
             user_id_to_serialize = user.get_id()
-            print(f"DEBUG: User ID to serialize: {user_id_to_serialize}")
+            log.debug("User ID to serialize: %s", user_id_to_serialize)
             if user_id_to_serialize is None:
                 raise ValueError("User ID is None, cannot generate token.")
             token = security.login_serializer.dumps(user_id_to_serialize)
             # --- END FIX ---
 
             if not token:
-                 print("ERROR: login_serializer.dumps() returned None or empty value.")
-                 print(f"DEBUG: User details: ID={user.get_id()}, Email={user.email}, Active={getattr(user, 'active', 'N/A')}, FS_Uniquifier={getattr(user, 'fs_uniquifier', 'N/A')}")
+                 log.error("login_serializer.dumps() returned None or empty value.")
+                 log.debug("User details: ID=%s, Email=%s, Active=%s, FS_Uniquifier=%s", user.get_id(), user.email, getattr(user, 'active', 'N/A'), getattr(user, 'fs_uniquifier', 'N/A'))
                  return "Failed to generate login token.", 500
-            print(f"DEBUG: Successfully generated login token: {token[:10]}...") # Token is usually bytes, but slicing works
+            log.debug("Successfully generated login token: %s...", token[:10]) # Token is usually bytes, but slicing works
         except Exception as e_token:
-            print("ERROR: Failed during call to login_serializer.dumps().")
-            print(traceback.format_exc())
+            log.exception("Failed during call to login_serializer.dumps().")
             return f"Failed to generate login token: {e_token}", 500
 
         # --- Generate URL and Send Email (Code remains the same) ---
-        print(f"DEBUG: Attempting to generate login URL with token: {token[:10]}...")
+        log.debug("Attempting to generate login URL with token: %s...", token[:10])
         login_link = None
         try:
             login_link = url_for('users.login_with_token', token=token, _external=True)
             if not login_link:
-                 print("ERROR: url_for returned None or empty value for login_with_token.")
+                 log.error("url_for returned None or empty value for login_with_token.")
                  return "Failed to construct login URL.", 500
-            print(f"DEBUG: Successfully generated login link: {login_link}")
+            log.debug("Successfully generated login link: %s", login_link)
         except Exception as e_url:
-            print("ERROR: Failed to generate login link URL.")
-            print(traceback.format_exc())
+            log.exception("Failed to generate login link URL.")
             return f"Failed to construct login URL: {e_url}", 500
 
-        print(f"DEBUG: Attempting to create email message for: {email}")
-        msg = None
+        log.debug("Attempting to queue email message for: %s", email)
         try:
             sender = current_app.config.get('MAIL_DEFAULT_SENDER') or current_app.config.get('SECURITY_EMAIL_SENDER')
             if not sender:
-                print("ERROR: MAIL_DEFAULT_SENDER or SECURITY_EMAIL_SENDER not configured.")
+                log.error("MAIL_DEFAULT_SENDER or SECURITY_EMAIL_SENDER not configured.")
                 return "Email sender not configured.", 500
-            print(f"DEBUG: Using sender: {sender}")
+            log.debug("Using sender: %s", sender)
 
-            msg = Message(
+            # The outbox workers send it in the background (see outbox/outbox_worker.py)
+            queued = enqueue_message(
                 "Your Login Link",
                 sender=sender,
                 recipients=[email],
                 body=f"Click this link to log in (valid for {current_app.config.get('SECURITY_LOGIN_WITHIN', '24 hours')}): {login_link}"
             )
-            print("DEBUG: Successfully created email message object.")
-        except Exception as e_msg:
-             print("ERROR: Failed to create email message object.")
-             print(traceback.format_exc())
-             return f"Failed to create email message: {e_msg}", 500
-
+            log.debug("Successfully queued email message %s.", queued.id)
+        except Exception as e_queue:
+            db.session.rollback()
+            log.exception("Failed to queue email message.")
+            return f"Failed to queue login email: {e_queue}", 500
 
-        print(f"DEBUG: Attempting to send email to: {email}")
-        try:
-            mail.send(msg)
-            print("DEBUG: Successfully sent email.")
-        except Exception as e_send:
-            print("ERROR: Failed to send email.")
-            print(traceback.format_exc())
-            return f"Failed to send login email. Please check server logs and mail configuration. Error: {e_send}", 500
-
-        print("--- DEBUG: Successfully finished send_login_link ---")
+        log.debug("Successfully finished send_login_link")
         return "Login link has been sent to your email", 200
     # --- End Generate/Send ---
 
     except Exception as e_main:
-        print(f"ERROR: An unexpected error occurred in send_login_link for email {request.form.get('email')}.")
-        print(traceback.format_exc())
-        user_info = f"User: {getattr(user, 'email', 'N/A')} (ID: {getattr(user, 'id', 'N/A')})"
-        print(f"DEBUG: State at time of error: {user_info}")
+        log.exception("An unexpected error occurred in send_login_link for email %s. User: %s (ID: %s)",
+                      request.form.get('email'), getattr(user, 'email', 'N/A'), getattr(user, 'id', 'N/A'))
         return f"An unexpected error occurred: {e_main}", 500
+    finally:
+        if claimed and not queued:
+            # Nothing was queued, so let the next request for this address try again
+            rate_limiter.release('login-link', claimed)
 
 
 @users_bp.route('/login/<token>')
 def login_with_token(token):
-    print(f"\n--- DEBUG: Entered login_with_token route with token: {token[:10]}... ---")
+    log.debug("Entered login_with_token route with token: %s...", token[:10])
     user = None
     try:
         if not security:
-             print("ERROR: security object not available.")
+             log.error("security object not available.")
              return "Server configuration error (security object).", 500
         if not hasattr(security, 'login_serializer'):
-             print("ERROR: security object missing 'login_serializer'.")
+             log.error("security object missing 'login_serializer'.")
              return "Server configuration error (login serializer missing).", 500
         if not user_datastore:
-             print("ERROR: user_datastore not available.")
+             log.error("user_datastore not available.")
              return "Server configuration error (datastore).", 500
-        print("DEBUG: Security object, login_serializer, and user_datastore available.")
+        log.debug("Security object, login_serializer, and user_datastore available.")
 
-        print(f"DEBUG: Attempting to verify token using login_serializer.loads()")
+        log.debug("Attempting to verify token using login_serializer.loads()")
         # --- THIS IS THE FIX for Verification ---
         max_age = current_app.config.get("SECURITY_TOKEN_MAX_AGE", 86400) # Use configured max age
-        print(f"DEBUG: Using max_age: {max_age} seconds")
+        log.debug("Using max_age: %s seconds", max_age)
 
         try:
             # Use the serializer's loads() method directly.
             # It raises SignatureExpired or BadSignature on failure.
             # It should return the original data (the user ID) on success.
             user_id = security.login_serializer.loads(token, max_age=max_age)
-            print(f"DEBUG: Token loaded successfully. User ID: {user_id}")
+            log.debug("Token loaded successfully. User ID: %s", user_id)
 
         except SignatureExpired:
-            print("ERROR: Token verification failed (SignatureExpired).")
+            log.warning("Token verification failed (SignatureExpired).")
             return "Login link has expired.", 400
         except BadSignature as e:
-            print(f"ERROR: Token verification failed (BadSignature): {e}")
+            log.warning("Token verification failed (BadSignature): %s", e)
             return "Invalid login link.", 400
         except Exception as e_loads:
-            print(f"ERROR: Unexpected error during login_serializer.loads(): {e_loads}")
-            print(traceback.format_exc())
+            log.exception("Unexpected error during login_serializer.loads(): %s", e_loads)
             return "Invalid login link (verification error).", 400
         # --- END FIX ---
 
@@ -192,80 +209,110 @@ def login_with_token(token):
             # Convert ID to integer, just in case loads returns it as string sometimes
             try:
                 user_id_int = int(user_id)
-                print(f"DEBUG: Attempting to find user with ID: {user_id_int}")
+                log.debug("Attempting to find user with ID: %s", user_id_int)
                 user = user_datastore.get_user(user_id_int)
             except ValueError:
-                print(f"ERROR: User ID '{user_id}' from token is not a valid integer.")
+                log.warning("User ID '%s' from token is not a valid integer.", user_id)
                 return "Invalid login link (user ID format error)", 400
             except Exception as e_get_user:
-                print(f"ERROR: Error during user_datastore.get_user: {e_get_user}")
-                print(traceback.format_exc())
+                log.exception("Error during user_datastore.get_user: %s", e_get_user)
                 return "Error retrieving user information.", 500
 
 
             if user:
-                print(f"DEBUG: Found user: {user.email} from token ID.")
+                log.debug("Found user: %s from token ID.", user.email)
                 # Log the user in
                 logged_in = login_user(user)
                 if logged_in:
-                    print(f"DEBUG: User {user.email} logged in successfully via token. Redirecting...")
+                    log.debug("User %s logged in successfully via token. Redirecting...", user.email)
                     db.session.commit() # Commit session changes like last_login_at
                     return redirect(url_for('projects.index'))
                 else:
-                     print(f"ERROR: login_user failed for user {user.email}. User might be inactive.")
+                     log.warning("login_user failed for user %s. User might be inactive.", user.email)
                      # db.session.rollback() # Optional rollback
                      return "Login failed (user inactive or other issue?)", 400
             else:
-                print(f"ERROR: User ID {user_id_int} from token not found in database.")
+                log.warning("User ID %s from token not found in database.", user_id_int)
                 return "Invalid login link (user not found)", 400
         else:
             # This case shouldn't happen if loads() succeeded without error, but included for safety
-            print("ERROR: User ID not found in token after successful load (unexpected).")
+            log.error("User ID not found in token after successful load (unexpected).")
             return "Invalid login link (internal error).", 500
 
     except Exception as e_main:
-        print("ERROR: An unexpected error occurred during token login.")
-        print(traceback.format_exc())
+        log.exception("An unexpected error occurred during token login.")
         return f"An error occurred during login: {e_main}", 500
 
 
-# (Keep the list_users and create_user functions as they were)
 @users_bp.route('/users')
+@replica_router.read_only
+@page_cache.cached('users')
 def list_users():
-    # (Code from previous version)
-    print("\n--- DEBUG: Entered list_users route ---")
+    log.debug("Entered list_users route")
     try:
-        users = User.query.all()
-        roles = Role.query.all()
-        print(f"DEBUG: Found {len(users)} users and {len(roles)} roles.")
-        return render_template('users/users.html', users=users, roles=roles)
+        # One query for the page of users, one for all of their roles (selectinload),
+        # and none for the role dropdown once the role cache is warm.
+        query = User.query.options(selectinload(User.roles))
+        cursor = request.args.get('cursor')
+        page_size = page_size_from(request.args, current_app.config, 'USERS_PAGE_SIZE')
+        roles = role_cache.all()
+        if page_size >= current_app.config['STREAM_MIN_PAGE_SIZE']:
+            # Long page: render while the rows arrive, fetching (and selectinloading) a batch at a time
+            page = keyset_stream(query, User.created_at, User.id, cursor=cursor, page_size=page_size,
+                                 batch_size=current_app.config['STREAM_BATCH_SIZE'])
+            log.debug("Streaming up to %s users.", page_size)
+            return render_streamed('users/users.html', users=page.items, roles=roles, page=page)
+        page = keyset_page(query, User.created_at, User.id, cursor=cursor, page_size=page_size)
+        log.debug("Found %s users and %s roles.", len(page.items), len(roles))
+        return render_template('users/users.html', users=page.items, roles=roles, page=page)
     except Exception as e:
-        print("ERROR: Failed to list users.")
-        print(traceback.format_exc())
+        log.exception("Failed to list users.")
         return f"Failed to load users page: {e}", 500
 
+def _user_to_dict(user):
+    return {
+        'id': user.id,
+        'name': user.name,
+        'email': user.email,
+        'roles': [role.name for role in user.roles],
+        'created_at': user.created_at.isoformat(),
+    }
+
+@users_bp.route('/api/users')
+@replica_router.read_only
+@page_cache.cached('users')
+def list_users_json():
+    page = keyset_page(User.query.options(selectinload(User.roles)), User.created_at, User.id,
+                       cursor=request.args.get('cursor'),
+                       page_size=page_size_from(request.args, current_app.config, 'USERS_PAGE_SIZE'))
+    return jsonify(
+        users=[_user_to_dict(user) for user in page.items],
+        next_cursor=page.next_cursor,
+        page_size=page.page_size,
+    )
+
 @users_bp.route('/users/create', methods=['POST'])
 def create_user():
     # (Code from previous version)
-    print("\n--- DEBUG: Entered create_user route ---")
+    log.debug("Entered create_user route")
     try:
         name = request.form.get('name')
         email = request.form.get('email')
         role_id = request.form.get('role_id')
-        print(f"DEBUG: Received data - Name: {name}, Email: {email}, Role ID: {role_id}")
+        log.debug("Received data - Name: %s, Email: %s, Role ID: %s", name, email, role_id)
 
         if not all([name, email, role_id]):
-             print("ERROR: Missing data for user creation.")
+             log.warning("Missing data for user creation.")
              return "Missing required fields for user creation.", 400
 
         # from main import user_datastore # Already imported at top
-        print("DEBUG: Finding role by ID.")
+        log.debug("Finding role by ID.")
         role = Role.query.get(role_id)
         if role:
-            print(f"DEBUG: Found role: {role.name}. Attempting to create user.")
+            log.debug("Found role: %s. Attempting to create user.", role.name)
             existing_user = user_datastore.find_user(email=email)
             if existing_user:
-                print(f"ERROR: User with email {email} already exists.")
+                log.warning("User with email %s already exists.", email)
                 return redirect(url_for('users.list_users'))
 
             user = user_datastore.create_user(
@@ -274,13 +321,64 @@ def create_user():
                 roles=[role]
             )
             db.session.commit()
-            print(f"DEBUG: Successfully created user {email} with role {role.name}.")
+            log.debug("Successfully created user %s with role %s.", email, role.name)
         else:
-            print(f"ERROR: Role with ID {role_id} not found.")
+            log.warning("Role with ID %s not found.", role_id)
 
         return redirect(url_for('users.list_users'))
     except Exception as e:
         db.session.rollback()
-        print("ERROR: Failed to create user.")
-        print(traceback.format_exc())
-        return redirect(url_for('users.list_users'))
\ No newline at end of file
+        log.exception("Failed to create user.")
+        return redirect(url_for('users.list_users'))
+
+@users_bp.route('/users/bulk', methods=['POST'])
+def bulk_create_users():
+    """
+    Creates many users from a multipart 'file' upload or a raw request body:
+    CSV or NDJSON with name, email and roles columns (roles separated by ';'),
+    or a JSON array of {"name", "email", "roles": [...]} objects.
+    ?invite=1 also queues a login link to every new user, within
+    USERS_BULK_INVITE_RATE_LIMIT per provisioner.
+
+    Only for users with USERS_BULK_ROLE, or requests bearing USERS_BULK_TOKEN.
+    """
+    provisioner = role_or_token(current_app.config['USERS_BULK_ROLE'], current_app.config.get('USERS_BULK_TOKEN'))
+    if provisioner is None:
+        log.warning("Bulk provisioning refused for %s.", client_ip())
+        return jsonify(error="Bulk provisioning requires an administrator."), 403 if current_user.is_authenticated else 401
+
+    upload = request.files.get('file')
+    if upload:
+        fmt = detect_format(upload.filename, upload.mimetype, request.args.get('format'))
+        stream = upload.stream
+    else:
+        fmt = detect_format(None, request.mimetype, request.args.get('format'))
+        stream = io.BufferedReader(request.stream)
+    if fmt is None:
+        return jsonify(error="Unknown format; use ?format=csv, ?format=ndjson or ?format=json"), 400
+
+    chunk_size = max(1, request.args.get('chunk_size', current_app.config['USERS_IMPORT_CHUNK_SIZE'], type=int))
+    invite = request.args.get('invite', '').lower() in ('1', 'true', 'yes')
+    limit = current_app.config['USERS_BULK_INVITE_RATE_LIMIT']
+    if invite and limit:
+        # A chunk's invitations are reserved all at once, so a chunk must fit in the bucket
+        chunk_size = min(chunk_size, parse_limit(limit)[0])
+
+    def reserve_invitations(count):
+        return rate_limiter.hit('bulk-invite', provisioner, limit, cost=count)
+
+    try:
+        results = provision_users(iter_rows(stream, fmt), chunk_size=chunk_size,
+                                  reserve_invitations=reserve_invitations if invite else None)
+    except UnicodeDecodeError:
+        return jsonify(error="The upload must be UTF-8 text."), 400
+    except ValueError as e:
+        # The upload itself couldn't be read (e.g. a JSON body that isn't an array)
+        return jsonify(error=str(e)), 400
+    counts = {status: 0 for status in (CREATED, EXISTS, REJECTED)}
+    for result in results:
+        counts[result['status']] += 1
+    log.info("Bulk provisioning: %s created, %s existing, %s rejected.",
+             counts[CREATED], counts[EXISTS], counts[REJECTED])
+    invited = sum(1 for result in results if result.get('invited'))
+    return jsonify(**counts, invited=invited, results=results)
@@ -0,0 +1,71 @@
+# utils/async_db.py
+#
+# Async SQLAlchemy engine (asyncpg on Postgres, aiosqlite on SQLite) for code
+# that runs on the ASGI server's event loop (see asgi.py). It maps the same
+# db.Model classes as the sync engine, so Project, User and Role can be
+# queried with AsyncSession as they are.
+#
+# Async connections belong to the event loop that opened them, so the engine
+# is created by asgi.py's lifespan startup, on the server loop, and disposed
+# on shutdown. The read-only views in utils/async_views.py use it; the Flask
+# views keep using the sync engine from their worker threads.
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+_ASYNC_DRIVERS = {
+    'postgres': 'postgresql+asyncpg',
+    'postgresql': 'postgresql+asyncpg',
+    'postgresql+psycopg2': 'postgresql+asyncpg',
+    'sqlite': 'sqlite+aiosqlite',
+}
+
+
+def async_database_url(database_url):
+    """Rewrites a sync database URL for the async driver (libpq's sslmode becomes asyncpg's ssl)."""
+    url = make_url(database_url)
+    url = url.set(drivername=_ASYNC_DRIVERS.get(url.drivername, url.drivername))
+    if url.drivername == 'postgresql+asyncpg' and 'sslmode' in url.query:
+        url = url.update_query_dict({'ssl': url.query['sslmode']}).difference_update_query(['sslmode'])
+    return url.render_as_string(hide_password=False)
+
+
+class AsyncDatabase:
+    def __init__(self):
+        self.engine = None
+        self.sessionmaker = None
+
+    def start(self, config):
+        """Creates the engine; call from the event loop that will use it."""
+        url = config.get('ASYNC_DATABASE_URL') or async_database_url(config['SQLALCHEMY_DATABASE_URI'])
+        options = {}
+        if url.startswith('postgresql+asyncpg'):
+            options.update(
+                pool_size=config['ASYNC_DB_POOL_SIZE'],
+                max_overflow=config['ASYNC_DB_MAX_OVERFLOW'],
+                pool_recycle=280,
+                pool_pre_ping=True,
+            )
+            if '-pooler' in url:
+                # PgBouncer in transaction mode can't keep asyncpg's prepared statements
+                options['connect_args'] = {'statement_cache_size': 0, 'prepared_statement_cache_size': 0}
+        self.engine = create_async_engine(url, **options)
+        self.sessionmaker = async_sessionmaker(self.engine, class_=AsyncSession, expire_on_commit=False)
+
+    async def stop(self):
+        if self.engine is not None:
+            await self.engine.dispose()
+            self.engine = self.sessionmaker = None
+
+    @property
+    def running(self):
+        return self.sessionmaker is not None
+
+    def session(self):
+        """async with async_db.session() as session: ..."""
+        if self.sessionmaker is None:
+            raise RuntimeError("The async engine only runs under the ASGI server (asgi.py)")
+        return self.sessionmaker()
+
+
+async_db = AsyncDatabase()
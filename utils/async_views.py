@@ -0,0 +1,61 @@
+# utils/async_views.py
+#
+# Read-only JSON views answered on the ASGI server's event loop (asgi.py)
+# through the async engine (utils/async_db.py). While one of them waits for
+# the database it holds no thread and no connection from the sync pool.
+#
+# Each mirrors the Flask view at the same path and returns the same JSON;
+# under the WSGI servers, or while the async engine isn't running, the Flask
+# view answers instead. Both share page cache entries and ETags (keyed on
+# the path and query string) and the metrics endpoint name. They differ in
+# that the async views:
+# - read from ASYNC_DATABASE_URL (the primary), never from a replica;
+# - have no session, so they must not depend on who is asking;
+# - call the page cache backend on the loop, which is instant for 'memory'
+#   and a local file read for 'sqlite'.
+
+from collections import namedtuple
+from flask import jsonify
+from .async_db import async_db
+from .page_cache import page_cache
+
+AsyncView = namedtuple('AsyncView', ['endpoint', 'view', 'namespace', 'last_modified'])
+
+_views = {}  # path -> AsyncView
+
+
+def async_view(path, endpoint, namespace, last_modified=None):
+    """
+    Registers `async def view(request, session, config)` for GET requests to
+    path. It returns the payload for jsonify, or (payload, status). endpoint
+    is the Flask view's, for metrics; namespace and last_modified (a
+    coroutine function taking the session) are as for page_cache.cached().
+    """
+    def decorator(view):
+        _views[path] = AsyncView(endpoint, view, namespace, last_modified)
+        return view
+    return decorator
+
+
+def find(method, path):
+    """The AsyncView serving this request, or None if Flask should."""
+    return _views.get(path) if method == 'GET' else None
+
+
+async def dispatch(app, view, request):
+    """Answers a werkzeug request with view, in its own AsyncSession; returns a Response."""
+    async with async_db.session() as session:
+        async def render():
+            result = await view.view(request, session, app.config)
+            payload, status = result if isinstance(result, tuple) else (result, 200)
+            with app.app_context():  # only for jsonify's settings; nothing is awaited inside
+                response = jsonify(payload)
+            response.status_code = status
+            return response
+
+        last_modified = None
+        if view.last_modified is not None:
+            async def last_modified():
+                return await view.last_modified(session)
+
+        return await page_cache.serve_async(view.namespace, request, render, last_modified)
@@ -0,0 +1,180 @@
+# utils/cache.py
+#
+# Key/value cache backends with per-entry TTLs.
+#
+#   LRUCache     in-process, bounded by entry count; each worker has its own
+#   SQLiteCache  a SQLite file on local disk, shared by every worker process
+#                on the host (stdlib only; no cache server to run)
+#
+# Both expose get / set / delete / incr / update, so callers can switch
+# backends through configuration.
+
+import os
+import pickle
+import random
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class LRUCache:
+    def __init__(self, max_entries=1024, default_ttl=300):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING:
+                return default
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def incr(self, key, amount=1, ttl=0):
+        """Atomically adds amount to an integer entry (missing counts as 0). ttl=0 never expires."""
+        return self.update(key, lambda value: (value or 0) + amount, ttl=ttl)
+
+    def update(self, key, fn, ttl=None):
+        """Atomically replaces the entry with fn(current value or None) and returns the new value."""
+        ttl = self.default_ttl if ttl is None else ttl
+        with self._lock:
+            expires_at, value = self._entries.get(key, (None, None))
+            if expires_at is not None and expires_at <= time.monotonic():
+                value = None
+            value = fn(value)
+            self._entries[key] = (time.monotonic() + ttl if ttl else None, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SQLiteCache:
+    """
+    Cache stored in a local SQLite database (WAL mode), so all gunicorn
+    workers on a host see the same entries and counters. Each thread gets its
+    own connection.
+    """
+
+    def __init__(self, path, default_ttl=300, max_entries=10000):
+        self.path = path
+        self.default_ttl = default_ttl
+        self.max_entries = max_entries
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connection() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS cache '
+                '(key TEXT PRIMARY KEY, value BLOB, expires_at REAL)'
+            )
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get(self, key, default=None):
+        row = self._connection().execute(
+            'SELECT value, expires_at FROM cache WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None or (row[1] is not None and row[1] <= time.time()):
+            return default
+        return pickle.loads(row[0])
+
+    def set(self, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        expires_at = time.time() + ttl if ttl else None
+        conn = self._connection()
+        conn.execute(
+            'INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)',
+            (key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), expires_at),
+        )
+        if random.random() < 0.01:
+            self._prune(conn)
+
+    def delete(self, key):
+        self._connection().execute('DELETE FROM cache WHERE key = ?', (key,))
+
+    def incr(self, key, amount=1, ttl=0):
+        """Atomically adds amount to an integer entry (missing or expired counts as 0). ttl=0 never expires."""
+        return self.update(key, lambda value: (value or 0) + amount, ttl=ttl)
+
+    def update(self, key, fn, ttl=None):
+        """
+        Atomically replaces the entry with fn(current value or None) and
+        returns the new value. The write lock is held while fn runs, so keep
+        it short.
+        """
+        ttl = self.default_ttl if ttl is None else ttl
+        now = time.time()
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT value, expires_at FROM cache WHERE key = ?', (key,)).fetchone()
+            value = None
+            if row is not None and (row[1] is None or row[1] > now):
+                value = pickle.loads(row[0])
+            value = fn(value)
+            conn.execute(
+                'INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)',
+                (key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), now + ttl if ttl else None),
+            )
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return value
+
+    def clear(self):
+        self._connection().execute('DELETE FROM cache')
+
+    def _prune(self, conn):
+        conn.execute('DELETE FROM cache WHERE expires_at IS NOT NULL AND expires_at <= ?', (time.time(),))
+        conn.execute(
+            'DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY expires_at IS NULL, expires_at LIMIT '
+            'MAX((SELECT COUNT(*) FROM cache) - ?, 0))',
+            (self.max_entries,),
+        )
+
+
+def create_cache(backend, path=None, default_ttl=300, max_entries=1024):
+    """Builds a backend by name: 'memory', 'sqlite', or 'none'/None (returns None)."""
+    if backend in (None, '', 'none'):
+        return None
+    if backend == 'memory':
+        return LRUCache(max_entries=max_entries, default_ttl=default_ttl)
+    if backend == 'sqlite':
+        return SQLiteCache(path, default_ttl=default_ttl, max_entries=max_entries)
+    raise ValueError(f"Unknown cache backend: {backend!r}")
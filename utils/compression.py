@@ -0,0 +1,169 @@
+# utils/compression.py
+#
+# WSGI middleware that compresses responses with brotli or gzip, whichever
+# the client prefers in Accept-Encoding (brotli needs the optional `brotli`
+# package).
+#
+# Bodies are compressed chunk by chunk as the app yields them, never
+# buffered whole. Each chunk is flushed, so a streamed page
+# (utils/streaming.py) or export reaches the client as it is produced. A
+# response is left alone if any of these hold:
+# - it declares a Content-Length below COMPRESSION_MIN_SIZE;
+# - it is streamed and its body ends before reaching COMPRESSION_MIN_SIZE;
+# - its type is not in COMPRESSION_MIMETYPES;
+# - it already has a Content-Encoding (the pre-compressed assets);
+# - it asks for no-transform.
+
+import itertools
+import logging
+import zlib
+from werkzeug.datastructures import Headers
+from werkzeug.http import parse_accept_header, parse_cache_control_header
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only without it
+    brotli = None
+
+log = logging.getLogger(__name__)
+
+
+class _Gzip:
+    def __init__(self, level):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31: gzip container
+
+    def compress(self, data):
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class _Brotli:
+    def __init__(self, quality):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data):
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+class CompressionMiddleware:
+    def __init__(self, wsgi_app, config):
+        self.wsgi_app = wsgi_app
+        self.min_size = config['COMPRESSION_MIN_SIZE']
+        self.mimetypes = set(config['COMPRESSION_MIMETYPES'])
+        self.encoders = {'gzip': lambda: _Gzip(config['COMPRESSION_GZIP_LEVEL'])}
+        if brotli is not None:
+            self.encoders['br'] = lambda: _Brotli(config['COMPRESSION_BROTLI_QUALITY'])
+
+    def __call__(self, environ, start_response):
+        encoding = self._negotiate(environ.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None or environ['REQUEST_METHOD'] == 'HEAD':
+            return self.wsgi_app(environ, start_response)
+
+        response = {}
+
+        def capture(status, headers, exc_info=None):
+            if exc_info and response.get('sent'):
+                raise exc_info[1].with_traceback(exc_info[2])
+            response.update(status=status, headers=headers)
+
+        body = self.wsgi_app(environ, capture)
+        return self._respond(body, response, encoding, start_response)
+
+    def compress_response(self, response, accept_encoding):
+        """Compresses a complete Response built outside the WSGI app (asgi.py's async views), if worthwhile."""
+        encoding = self._negotiate(accept_encoding)
+        if encoding is None or not self._compressible(f'{response.status_code} ', response.headers):
+            return response
+        body = response.get_data()
+        if len(body) < self.min_size:
+            return response
+        encoder = self.encoders[encoding]()
+        response.set_data(encoder.compress(body) + encoder.finish())
+        response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        return response
+
+    def _negotiate(self, accept_encoding):
+        accepted = parse_accept_header(accept_encoding)
+        offered = [name for name in ('br', 'gzip') if name in self.encoders and accepted[name] > 0]
+        if not offered:
+            return None
+        return max(offered, key=lambda name: accepted[name])  # ties keep br's place first
+
+    def _compressible(self, status, headers):
+        if int(status.split(' ', 1)[0]) in (204, 206, 304) or 'Content-Encoding' in headers:
+            return False
+        if headers.get('Content-Type', '').split(';', 1)[0].strip() not in self.mimetypes:
+            return False
+        if parse_cache_control_header(headers.get('Cache-Control')).no_transform:
+            return False
+        length = headers.get('Content-Length', type=int)
+        return length is None or length >= self.min_size
+
+    def _respond(self, body, response, encoding, start_response):
+        try:
+            chunks = iter(body)
+            if 'headers' not in response:
+                # A generator app only calls start_response when its first chunk is asked for
+                chunks = itertools.chain([next(chunks, b'')], chunks)
+            headers = Headers(response['headers'])
+            if not self._compressible(response['status'], headers):
+                start_response(response['status'], response['headers'])
+                response['sent'] = True
+                yield from chunks
+                return
+
+            # Hold back the first chunks until we know the body is big enough to bother
+            pending, size = [], 0
+            for chunk in chunks:
+                pending.append(chunk)
+                size += len(chunk)
+                if size >= self.min_size:
+                    break
+            else:
+                start_response(response['status'], response['headers'])
+                response['sent'] = True
+                yield b''.join(pending)
+                return
+
+            headers.remove('Content-Length')
+            headers['Content-Encoding'] = encoding
+            vary = [value.strip() for value in headers.get('Vary', '').split(',') if value.strip()]
+            if 'accept-encoding' not in (value.lower() for value in vary):
+                headers['Vary'] = ', '.join(vary + ['Accept-Encoding'])
+            etag = headers.get('ETag')
+            if etag and not etag.startswith('W/'):
+                headers['ETag'] = f'W/{etag}'  # the bytes differ from the uncompressed entity
+            start_response(response['status'], headers.to_wsgi_list())
+            response['sent'] = True
+
+            encoder = self.encoders[encoding]()
+            yield encoder.compress(b''.join(pending))
+            for chunk in chunks:
+                if chunk:
+                    yield encoder.compress(chunk)
+            yield encoder.finish()
+        finally:
+            if hasattr(body, 'close'):
+                body.close()
+
+
+def init_app(app):
+    """Wraps app.wsgi_app; call after any middleware that must see the uncompressed response."""
+    app.config.setdefault('COMPRESSION_ENABLED', True)
+    app.config.setdefault('COMPRESSION_MIN_SIZE', 1024)
+    app.config.setdefault('COMPRESSION_GZIP_LEVEL', 6)
+    app.config.setdefault('COMPRESSION_BROTLI_QUALITY', 4)
+    app.config.setdefault('COMPRESSION_MIMETYPES', [
+        'text/html', 'text/css', 'text/plain', 'text/csv', 'application/json',
+        'application/x-ndjson', 'application/javascript', 'text/javascript', 'image/svg+xml',
+    ])
+    if app.config['COMPRESSION_ENABLED']:
+        app.wsgi_app = CompressionMiddleware(app.wsgi_app, app.config)
+        if brotli is None:
+            log.info("brotli is not installed; compressing responses with gzip only.")
@@ -0,0 +1,197 @@
+# utils/db_routing.py
+#
+# Read-replica routing for db.session.
+#
+# Replicas are Flask-SQLAlchemy binds named replica_<n> (DATABASE_REPLICA_URLS
+# in config.py). RoutingSession.get_bind sends a query to a replica only when
+# all of these hold:
+#
+# - it runs in a view marked @replica_router.read_only;
+# - it is a plain read: not a flush, not an INSERT/UPDATE/DELETE, not a raw
+#   text() statement, not SELECT ... FOR UPDATE;
+# - the session hasn't written anything yet;
+# - the client hasn't written recently. After a request that writes, the
+#   client's Flask session carries a "primary until" time, so for
+#   DATABASE_REPLICA_STICKY_SECONDS its reads go to the primary and it sees
+#   its own change despite replication lag.
+#
+# Everything else uses the primary: other views, CLI commands, the outbox
+# workers and bootstrap.
+#
+# A background thread per process checks every replica each
+# DATABASE_REPLICA_HEALTH_INTERVAL seconds (SELECT 1, plus replay lag on
+# Postgres). Replicas that fail, or lag more than DATABASE_REPLICA_MAX_LAG
+# seconds, are skipped until they pass again. A disconnect seen by a request
+# marks its replica down at once. That request still fails; later ones fail
+# over. With every replica down, reads go to the primary.
+
+import logging
+import os
+import random
+import threading
+import time
+from functools import wraps
+from flask import current_app, g, has_request_context, session as client_session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.sql.elements import TextClause
+
+log = logging.getLogger(__name__)
+
+REPLICA_PREFIX = 'replica_'
+_STICKY_KEY = 'db_primary_until'
+
+# Seconds of replay lag; 0 when caught up (an idle primary doesn't make a replica look stale)
+_POSTGRES_LAG = text(
+    "SELECT CASE WHEN pg_is_in_recovery() AND pg_last_wal_receive_lsn() IS DISTINCT FROM pg_last_wal_replay_lsn()"
+    " THEN EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) ELSE 0 END"
+)
+
+
+def _writes(clause):
+    if clause is None:
+        return False
+    if isinstance(clause, (UpdateBase, TextClause)):
+        return True  # DML, or raw SQL we can't classify
+    return getattr(clause, '_for_update_arg', None) is not None
+
+
+class RoutingSession(Session):
+    """db.session class: sends reads in read-only views to a healthy replica, everything else to the primary."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        engine = super().get_bind(mapper, clause=clause, bind=bind, **kwargs)
+        if bind is not None or engine is not self._db.engines.get(None):
+            return engine  # explicit bind, or a model with its own bind key
+        if self._flushing or _writes(clause):
+            self.info['db_wrote'] = True
+            if has_request_context():
+                g.db_wrote = True
+            return engine
+        if self.info.get('db_wrote') or not has_request_context() or not g.get('db_read_only'):
+            return engine
+
+        # One replica per session, so a request's queries see a single replica's state
+        name = self.info.get('db_replica')
+        if name is None:
+            router = current_app.extensions.get('replica_router')
+            name = router.choose() if router is not None else None
+            if name is None:
+                return engine
+            self.info['db_replica'] = name
+        return self._db.engines[name]
+
+
+class ReplicaRouter:
+    def __init__(self, app=None, db=None):
+        self.app = None
+        self.db = None
+        self.names = []
+        self._healthy = {}
+        self._monitor = None  # (pid, thread)
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        app.config.setdefault('DATABASE_REPLICA_STICKY_SECONDS', 10)
+        app.config.setdefault('DATABASE_REPLICA_HEALTH_INTERVAL', 5)
+        app.config.setdefault('DATABASE_REPLICA_MAX_LAG', 30)
+        self.app, self.db = app, db
+        self.names = sorted(key for key in (app.config.get('SQLALCHEMY_BINDS') or {})
+                            if key and key.startswith(REPLICA_PREFIX))
+        self._healthy = dict.fromkeys(self.names, True)  # until the first check says otherwise
+        app.extensions['replica_router'] = self
+        if not self.names:
+            return
+
+        with app.app_context():
+            for name in self.names:
+                event.listen(db.engines[name], 'handle_error',
+                             lambda context, name=name: self._on_error(name, context))
+        # Started on the first request, so nothing is running yet if the process is forked after import
+        app.before_request(self.start_monitor)
+        app.after_request(self._stick_after_write)
+
+    # --- Routing ---
+
+    def choose(self):
+        """A healthy replica's bind key, or None for the primary."""
+        healthy = [name for name in self.names if self._healthy[name]]
+        return random.choice(healthy) if healthy else None
+
+    def read_only(self, view):
+        """Marks a view whose queries may be served by a replica."""
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            # Without replicas, don't read the client session: that would add Vary: Cookie to cacheable pages
+            if self.names:
+                g.db_read_only = client_session.get(_STICKY_KEY, 0) < time.time()
+            return view(*args, **kwargs)
+        return wrapper
+
+    def max_staleness(self):
+        """Seconds a replica in rotation can be behind the primary: its allowed lag plus one check interval."""
+        if not self.names:
+            return 0
+        return self.app.config['DATABASE_REPLICA_MAX_LAG'] + self.app.config['DATABASE_REPLICA_HEALTH_INTERVAL']
+
+    def _stick_after_write(self, response):
+        seconds = self.app.config['DATABASE_REPLICA_STICKY_SECONDS']
+        if g.get('db_wrote') and seconds > 0:
+            client_session[_STICKY_KEY] = time.time() + seconds
+        return response
+
+    # --- Health ---
+
+    def start_monitor(self):
+        pid = os.getpid()
+        if self._monitor is not None and self._monitor[0] == pid:
+            return
+        with self._lock:
+            if self._monitor is not None and self._monitor[0] == pid:
+                return
+            thread = threading.Thread(target=self._monitor_loop, name='replica-monitor', daemon=True)
+            self._monitor = (pid, thread)
+            thread.start()
+
+    def _monitor_loop(self):
+        while True:
+            with self.app.app_context():
+                for name in self.names:
+                    self._set_health(name, *self.check(name))
+            time.sleep(self.app.config['DATABASE_REPLICA_HEALTH_INTERVAL'])
+
+    def check(self, name):
+        """Returns (healthy, reason) for one replica. Needs an app context."""
+        engine = self.db.engines[name]
+        try:
+            with engine.connect() as connection:
+                if engine.dialect.name == 'postgresql':
+                    lag = connection.execute(_POSTGRES_LAG).scalar() or 0
+                else:
+                    connection.execute(text('SELECT 1'))
+                    lag = 0
+        except Exception as e:
+            return False, f"check failed: {e}"
+        if lag > self.app.config['DATABASE_REPLICA_MAX_LAG']:
+            return False, f"{lag:.0f}s behind"
+        return True, None
+
+    def _set_health(self, name, healthy, reason=None):
+        if self._healthy.get(name) != healthy:
+            if healthy:
+                log.info("Replica %s is back in rotation.", name)
+            else:
+                log.warning("Replica %s taken out of rotation: %s", name, reason)
+        self._healthy[name] = healthy
+
+    def _on_error(self, name, context):
+        if context.is_pre_ping:
+            return  # the pool replaces the connection and carries on
+        if context.is_disconnect or context.connection is None:
+            self._set_health(name, False, f"connection error: {context.original_exception}")
+
+
+replica_router = ReplicaRouter()
@@ -0,0 +1,108 @@
+# utils/log.py
+#
+# Logging pipeline for the app. Request threads only put records on an
+# in-memory queue; a single background listener thread formats them as JSON
+# and writes them to stdout, so a slow or blocked stdout never stalls a request.
+#
+# Levels are controlled per logger through the environment:
+#     LOG_LEVEL=INFO                                   (root level)
+#     LOG_LEVELS=users=DEBUG,sqlalchemy.engine=WARNING (per-logger overrides)
+#     LOG_FORMAT=json|text
+
+import atexit
+import datetime
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+from flask import has_request_context, request
+from flask.logging import default_handler
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats a record as a single JSON line."""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key in ('method', 'path'):
+            if hasattr(record, key):
+                entry[key] = getattr(record, key)
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class RequestContextFilter(logging.Filter):
+    """Tags records emitted during a request with its method and path."""
+
+    def filter(self, record):
+        if has_request_context():
+            record.method = request.method
+            record.path = request.path
+        return True
+
+
+class _DeferredFormattingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that leaves formatting to the listener thread.
+
+    The stock prepare() formats the record (traceback included) in the calling
+    thread so it can be pickled, on a copy of the record. The queue here never
+    leaves the process and this is the only handler, so the record is passed
+    as-is with just the %-args merged (they may be mutated later); everything
+    else happens off the request path.
+    """
+
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def parse_levels(spec):
+    """'users=DEBUG,sqlalchemy.engine=WARNING' -> {'users': 'DEBUG', ...}"""
+    levels = {}
+    for item in (spec or '').split(','):
+        name, _, level = item.partition('=')
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def configure_logging(app):
+    """Routes the root logger (and app.logger) through the queue pipeline."""
+    global _listener
+
+    root = logging.getLogger()
+    root.setLevel(app.config.get('LOG_LEVEL', 'INFO'))
+    for name, level in app.config.get('LOG_LEVELS', {}).items():
+        logging.getLogger(name).setLevel(level)
+
+    # app.logger propagates to root instead of writing to stderr itself
+    app.logger.removeHandler(default_handler)
+
+    if _listener is not None:
+        return  # pipeline already running in this process
+
+    output = logging.StreamHandler(sys.stdout)
+    if app.config.get('LOG_FORMAT', 'json') == 'json':
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter('[%(asctime)s] %(levelname)s in %(name)s: %(message)s'))
+
+    log_queue = queue.SimpleQueue()
+    handler = _DeferredFormattingQueueHandler(log_queue)
+    handler.addFilter(RequestContextFilter())
+    root.addHandler(handler)
+
+    _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
@@ -0,0 +1,221 @@
+# utils/page_cache.py
+#
+# Cache for rendered pages, with versioned keys and conditional GET.
+#
+# Each cached page belongs to a namespace ('projects', 'users'). Cache keys
+# carry the namespace's current version, and committing a change to a
+# watched model replaces that version, so every page in the namespace misses
+# from then on and old entries simply age out. With PAGE_CACHE_BACKEND=sqlite
+# versions are shared by all workers on the host; with 'memory' each worker
+# only sees its own bumps, and other workers serve stale pages for at most
+# PAGE_CACHE_TTL seconds.
+#
+# A page rendered from a read replica (utils/db_routing.py) is not stored
+# until its namespace's version is older than the replica's worst-case lag:
+# before then the replica may not have the change yet, and the stale page
+# would be cached under the new version.
+
+import hashlib
+import time
+import uuid
+from functools import wraps
+from flask import Response, current_app, request, make_response
+from sqlalchemy import event
+from projects.projects_model import db
+from .cache import create_cache
+
+
+class PageCache:
+    def __init__(self, app=None):
+        self.backend = None
+        self._watched = {}  # mapped class -> namespace
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('PAGE_CACHE_BACKEND', 'memory')
+        app.config.setdefault('PAGE_CACHE_TTL', 60)
+        app.config.setdefault('PAGE_CACHE_MAX_ENTRIES', 512)
+        app.config.setdefault('PAGE_CACHE_PATH', None)
+        self.backend = create_cache(
+            app.config['PAGE_CACHE_BACKEND'],
+            path=app.config['PAGE_CACHE_PATH'],
+            default_ttl=app.config['PAGE_CACHE_TTL'],
+            max_entries=app.config['PAGE_CACHE_MAX_ENTRIES'],
+        )
+        app.extensions['page_cache'] = self
+
+    # --- Versions ---
+
+    def version(self, namespace):
+        return self._version(namespace)[0]
+
+    def _version(self, namespace):
+        """(version, time it was set) for namespace."""
+        key = f'version:{namespace}'
+        entry = self.backend.get(key)
+        if not isinstance(entry, tuple):
+            # A fresh random version (never a reused one) if the entry was lost or evicted
+            entry = (uuid.uuid4().hex[:12], time.time())
+            self.backend.set(key, entry, ttl=0)
+        return entry
+
+    def bump(self, namespace):
+        if self.backend is not None:
+            self.backend.set(f'version:{namespace}', (uuid.uuid4().hex[:12], time.time()), ttl=0)
+
+    def watch(self, model, namespace):
+        """Bumps namespace whenever a commit inserts, updates or deletes a model row."""
+        self._watched[model] = namespace
+
+    def _namespaces_in(self, objects):
+        return {
+            namespace
+            for obj in objects
+            for model, namespace in self._watched.items()
+            if isinstance(obj, model)
+        }
+
+    # --- View decorator ---
+
+    def cached(self, namespace, last_modified=None):
+        """
+        Caches the view's 200 responses to GET requests, keyed on the full URL.
+
+        last_modified, if given, is a callable returning the newest change
+        time of the page's data (one cheap query). It adds Last-Modified and
+        ETag headers and answers matching conditional requests with 304
+        before touching the cache or the view.
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if self.backend is None or request.method != 'GET':
+                    return view(*args, **kwargs)
+
+                validators = {}
+                if last_modified is not None:
+                    validators = self.validators(request.full_path, last_modified())
+                    if validators and self.not_modified(request, **validators):
+                        return self._with_validators(make_response('', 304), **validators)
+
+                key, cached, version_set_at = self.lookup(namespace, request.full_path)
+                if cached is not None:
+                    body, mimetype = cached
+                    response = current_app.response_class(body, mimetype=mimetype)
+                    response.headers['X-Page-Cache'] = 'hit'
+                    return self._with_validators(response, **validators)
+
+                response = make_response(view(*args, **kwargs))
+                if response.status_code == 200 and not response.is_streamed:
+                    if self._maybe_behind(version_set_at):
+                        response.headers['X-Page-Cache'] = 'bypass'
+                    else:
+                        self.backend.set(key, (response.get_data(), response.mimetype))
+                        response.headers['X-Page-Cache'] = 'miss'
+                return self._with_validators(response, **validators)
+            return wrapper
+        return decorator
+
+    async def serve_async(self, namespace, request, view, last_modified=None):
+        """
+        cached() for the async views (utils/async_views.py). request is a
+        werkzeug request, view a coroutine function returning the Response
+        and last_modified one returning the newest change time. Entries and
+        ETags are shared with the Flask view at the same URL.
+        """
+        if self.backend is None:
+            return await view()
+
+        validators = {}
+        if last_modified is not None:
+            validators = self.validators(request.full_path, await last_modified())
+            if validators and self.not_modified(request, **validators):
+                return self._with_validators(Response('', 304), **validators)
+
+        key, cached, _ = self.lookup(namespace, request.full_path)
+        if cached is not None:
+            body, mimetype = cached
+            response = Response(body, mimetype=mimetype)
+            response.headers['X-Page-Cache'] = 'hit'
+            return self._with_validators(response, **validators)
+
+        response = await view()
+        if response.status_code == 200:
+            # The async engine reads the primary, so the page can't be older than its version
+            self.backend.set(key, (response.get_data(), response.mimetype))
+            response.headers['X-Page-Cache'] = 'miss'
+        return self._with_validators(response, **validators)
+
+    def validators(self, full_path, changed_at):
+        """ETag and Last-Modified for the page at full_path whose data last changed at changed_at."""
+        if changed_at is None:
+            return {}
+        digest = hashlib.sha1(f'{full_path}|{changed_at.isoformat()}'.encode()).hexdigest()[:16]
+        return {'etag': digest, 'last_modified': changed_at}
+
+    def lookup(self, namespace, full_path):
+        """(cache key, cached (body, mimetype) or None, time the namespace's version was set)."""
+        version, version_set_at = self._version(namespace)
+        key = f'page:{namespace}:{version}:{full_path}'
+        return key, self.backend.get(key), version_set_at
+
+    @staticmethod
+    def _maybe_behind(version_set_at):
+        """Whether this request read from a replica that may not have replayed the version's change yet."""
+        if not db.session.info.get('db_replica'):
+            return False
+        router = current_app.extensions.get('replica_router')
+        return router is not None and time.time() - version_set_at < router.max_staleness()
+
+    @staticmethod
+    def not_modified(request, etag, last_modified):
+        """Whether request's conditional headers show the client already has this version."""
+        if request.if_none_match:
+            return request.if_none_match.contains_weak(etag)
+        if request.if_modified_since is not None:
+            # HTTP dates have one-second resolution
+            return last_modified.replace(microsecond=0) <= request.if_modified_since.replace(tzinfo=None)
+        return False
+
+    @staticmethod
+    def _with_validators(response, etag=None, last_modified=None):
+        if etag is not None:
+            response.set_etag(etag, weak=True)
+            response.last_modified = last_modified
+            response.headers['Cache-Control'] = 'no-cache'  # always revalidate
+        return response
+
+
+page_cache = PageCache()
+
+
+# --- Version bumps on commit ---
+
+@event.listens_for(db.session, 'before_flush')
+def _track_page_writes(session, flush_context, instances):
+    changed = page_cache._namespaces_in((*session.new, *session.dirty, *session.deleted))
+    if changed:
+        session.info.setdefault('page_cache_changed', set()).update(changed)
+
+
+@event.listens_for(db.session, 'do_orm_execute')
+def _track_bulk_writes(orm_execute_state):
+    # Bulk insert()/update()/delete() statements bypass the flush
+    if not (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and mapper.class_ in page_cache._watched:
+        orm_execute_state.session.info.setdefault('page_cache_changed', set()).add(
+            page_cache._watched[mapper.class_])
+
+
+@event.listens_for(db.session, 'after_commit')
+def _bump_on_commit(session):
+    for namespace in session.info.pop('page_cache_changed', ()):
+        page_cache.bump(namespace)
+
+
+@event.listens_for(db.session, 'after_rollback')
+def _forget_page_writes(session):
+    session.info.pop('page_cache_changed', None)
@@ -0,0 +1,125 @@
+# utils/pagination.py
+
+import base64
+import json
+from datetime import datetime
+from sqlalchemy import tuple_
+
+
+class Page:
+    """One page of a keyset-paginated query."""
+
+    streamed = False
+
+    def __init__(self, items, next_cursor, page_size):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.page_size = page_size
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def encode_cursor(created_at, row_id):
+    payload = json.dumps([created_at.isoformat(), row_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Returns (created_at, id) for a cursor string, or None if it is missing or malformed."""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, TypeError):
+        return None
+
+
+def page_size_from(args, config, default_key='PAGE_SIZE'):
+    """Reads ?limit= from the request args, clamped to PAGE_SIZE_MAX."""
+    default = config.get(default_key, config.get('PAGE_SIZE', 50))
+    maximum = config.get('PAGE_SIZE_MAX', 500)
+    try:
+        size = int(args.get('limit', default))
+    except (TypeError, ValueError):
+        size = default
+    return max(1, min(size, maximum))
+
+
+def keyset_page(query, created_col, id_col, cursor=None, page_size=50):
+    """
+    Returns the page of `query` that follows `cursor`, ordered by (created_at, id).
+
+    Seeking past the last row seen instead of using OFFSET keeps every page at
+    the cost of one index range scan, however deep the client has paged.
+    """
+    position = decode_cursor(cursor)
+    if position is not None:
+        query = query.filter(tuple_(created_col, id_col) > tuple_(*position))
+    rows = query.order_by(created_col, id_col).limit(page_size + 1).all()
+    return _page(rows, created_col, id_col, page_size)
+
+
+async def keyset_page_async(session, statement, created_col, id_col, cursor=None, page_size=50):
+    """keyset_page for an AsyncSession and a select() of one entity; the cursors are interchangeable."""
+    position = decode_cursor(cursor)
+    if position is not None:
+        statement = statement.where(tuple_(created_col, id_col) > tuple_(*position))
+    rows = (await session.scalars(statement.order_by(created_col, id_col).limit(page_size + 1))).all()
+    return _page(rows, created_col, id_col, page_size)
+
+
+def _page(rows, created_col, id_col, page_size):
+    """The Page for up to page_size + 1 rows; the extra row only says whether there is a next page."""
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, created_col.key), getattr(last, id_col.key))
+    return Page(rows, next_cursor, page_size)
+
+
+class StreamedPage(Page):
+    """
+    A keyset page whose rows are fetched while they are being rendered.
+
+    items is a one-shot iterator. next_cursor (and has_next) are only known
+    once it has been consumed, so templates must read them after the loop.
+    """
+
+    streamed = True
+
+    def __init__(self, rows, page_size, cursor_of):
+        super().__init__(self._take(rows, page_size, cursor_of), None, page_size)
+
+    def _take(self, rows, page_size, cursor_of):
+        rows, last = iter(rows), None
+        try:
+            for count, row in enumerate(rows):
+                if count == page_size:
+                    self.next_cursor = cursor_of(last)
+                    break
+                yield row
+                last = row
+        finally:
+            if hasattr(rows, 'close'):
+                rows.close()  # release the cursor even if rendering stopped early
+
+
+def keyset_stream(query, created_col, id_col, cursor=None, page_size=50, batch_size=100):
+    """
+    Like keyset_page, but returns a StreamedPage that fetches rows batch_size
+    at a time (yield_per) as the caller iterates, instead of loading the
+    whole page up front.
+    """
+    position = decode_cursor(cursor)
+    if position is not None:
+        query = query.filter(tuple_(created_col, id_col) > tuple_(*position))
+    rows = query.order_by(created_col, id_col).limit(page_size + 1).yield_per(batch_size)
+    return StreamedPage(
+        rows, page_size,
+        lambda last: encode_cursor(getattr(last, created_col.key), getattr(last, id_col.key)),
+    )
@@ -0,0 +1,110 @@
+# utils/rate_limit.py
+#
+# Token-bucket rate limiting on top of the cache backends in utils/cache.py.
+#
+# A limit like "5/hour" is a bucket of 5 tokens that refills at 5 per hour:
+# bursts of up to 5 go through, after which requests are admitted at the
+# refill rate. Bucket state is (tokens, timestamp) under one cache key and is
+# updated atomically, so with RATE_LIMIT_BACKEND=sqlite all workers on a
+# host draw from the same buckets; with 'memory' each worker enforces the
+# limit on its own (the effective limit is multiplied by the worker count).
+
+import math
+import re
+import time
+import uuid
+from flask import request
+from metrics.metrics_registry import Counter, registry
+from .cache import create_cache
+
+RATE_LIMITED = Counter(
+    registry, 'rate_limited_requests_total', 'Requests rejected by a rate limit', ('limit',))
+
+_PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+
+def parse_limit(value):
+    """Parses "<count>/<period>" (e.g. "5/hour", "30/minute") into (capacity, refill per second)."""
+    match = re.fullmatch(r'\s*(\d+)\s*/\s*(second|minute|hour|day)s?\s*', value or '')
+    if not match:
+        raise ValueError(f"Invalid rate limit {value!r}; expected e.g. '5/hour'")
+    count = int(match.group(1))
+    return count, count / _PERIODS[match.group(2)]
+
+
+def client_ip():
+    # Behind a proxy this is only the client's address if ProxyFix is enabled (TRUSTED_PROXY_COUNT)
+    return request.remote_addr or 'unknown'
+
+
+class RateLimiter:
+    def __init__(self, app=None):
+        self.backend = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('RATE_LIMIT_BACKEND', 'memory')
+        app.config.setdefault('RATE_LIMIT_MAX_ENTRIES', 10000)
+        app.config.setdefault('RATE_LIMIT_PATH', None)
+        self.backend = create_cache(
+            app.config['RATE_LIMIT_BACKEND'],
+            path=app.config['RATE_LIMIT_PATH'],
+            max_entries=app.config['RATE_LIMIT_MAX_ENTRIES'],
+        )
+        app.extensions['rate_limiter'] = self
+
+    def hit(self, name, key, limit, cost=1):
+        """
+        Takes cost tokens (default one) from the bucket for (name, key) under
+        limit ("5/hour"). Nothing is taken unless all of them are available.
+
+        Returns None if the request is allowed, or the number of seconds
+        until enough tokens are available (suitable for a Retry-After header).
+        Raises ValueError if cost is more than the bucket holds, since no wait
+        would ever be enough.
+        """
+        if self.backend is None or not limit:
+            return None
+        capacity, rate = parse_limit(limit)
+        if cost > capacity:
+            raise ValueError(f"A cost of {cost} can never fit in a rate limit of {limit}")
+        now = time.time()
+
+        def take(state):
+            tokens, stamp, _ = state or (capacity, now, None)
+            tokens = min(capacity, tokens + (now - stamp) * rate)
+            if tokens >= cost:
+                return tokens - cost, now, 0
+            return tokens, now, (cost - tokens) / rate
+
+        # Entries expire once the bucket would be full again anyway
+        _, _, wait = self.backend.update(f'ratelimit:{name}:{key}', take, ttl=math.ceil(capacity / rate))
+        if wait:
+            RATE_LIMITED.inc(limit=name)
+            return math.ceil(wait)
+        return None
+
+    def claim(self, name, key, seconds):
+        """
+        Marks (name, key) as taken for the given number of seconds. Returns
+        True for the first caller in that window and False for the rest, so
+        repeated requests can be coalesced into the first one.
+        """
+        if self.backend is None or seconds <= 0:
+            return True
+        token, now = uuid.uuid4().hex, time.time()
+
+        def take(claim):
+            # Keep the original claim time: repeated requests must not extend the window
+            if claim is not None and claim[1] + seconds > now:
+                return claim
+            return token, now
+
+        holder, _ = self.backend.update(f'claim:{name}:{key}', take, ttl=seconds)
+        return holder == token
+
+    def release(self, name, key):
+        """Gives up a claim early, e.g. because the work it stood for failed."""
+        if self.backend is not None:
+            self.backend.delete(f'claim:{name}:{key}')
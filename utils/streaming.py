@@ -0,0 +1,31 @@
+# utils/streaming.py
+#
+# Streamed HTML rendering for long listings. The page goes out while the
+# query is still being read (see keyset_stream in utils/pagination.py), so
+# the first byte doesn't wait for the last row and the rendered page is
+# never held in memory at once.
+#
+# Jinja yields a string for every text node and expression, so pieces are
+# joined into chunks of about STREAM_CHUNK_SIZE bytes before they are sent.
+# Headers are sent before the body is rendered, so an error part way
+# through can't become a 500; it is logged and the connection is closed.
+
+from flask import Response, current_app, stream_template
+
+
+def _coalesce(pieces, size):
+    buffer, buffered = [], 0
+    for piece in pieces:
+        buffer.append(piece)
+        buffered += len(piece)
+        if buffered >= size:
+            yield ''.join(buffer)
+            buffer, buffered = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def render_streamed(template_name, **context):
+    """Like render_template, but returns a Response that renders as it is sent."""
+    pieces = stream_template(template_name, **context)  # runs inside the request context
+    return Response(_coalesce(pieces, current_app.config['STREAM_CHUNK_SIZE']), mimetype='text/html')